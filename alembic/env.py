@@ -2,6 +2,7 @@ from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
+from sqlalchemy import text
 
 from alembic import context
 
@@ -30,6 +31,15 @@ target_metadata = Base.metadata # Set target_metadata to Base.metadata
 # my_important_option = config.get_main_option("my_important_option")
 # ... etc.
 
+def include_name(name, type_, parent_names):
+    # Tables maintained with raw DDL (FTS5 and its shadow tables) are not in the metadata
+    if type_ == "table" and name.startswith(("search_index", "search_documents")):
+        return False
+    # Per-year archive tables are created on demand by `python -m app.archive`
+    if type_ == "table" and "_archive_" in name:
+        return False
+    return True
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -46,6 +56,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_name=include_name,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -62,15 +73,23 @@ def run_migrations_online() -> None:
     """
     # Get database URL from app.config
     from app.config import settings
+    from app.database import tenant_database
+    # `alembic -x tenant=<id> upgrade head` migrates one school's database or schema
+    tenant = context.get_x_argument(as_dictionary=True).get("tenant")
+    url, schema = tenant_database(tenant) if tenant else (settings.DATABASE_URL, None)
     connectable = engine_from_config(
-        {"sqlalchemy.url": settings.DATABASE_URL}, # Use DATABASE_URL from settings
+        {"sqlalchemy.url": url}, # Use DATABASE_URL from settings
         prefix="sqlalchemy.",
         poolclass=pool.NullPool,
     )
 
     with connectable.connect() as connection:
+        if schema is not None:
+            connection.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{schema}"'))
+            connection.execute(text(f'SET search_path TO "{schema}"'))
+            connection.commit()
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_name=include_name
         )
 
         with context.begin_transaction():
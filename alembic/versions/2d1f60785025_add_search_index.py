@@ -0,0 +1,67 @@
+"""add search index
+
+Revision ID: 2d1f60785025
+Revises: e6b8a4352664
+Create Date: 2026-10-19 13:32:51.201607
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2d1f60785025'
+down_revision: Union[str, Sequence[str], None] = 'e6b8a4352664'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Kept in sync with app/search.py; not imported so this revision stays stable
+SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE search_index USING fts5("
+    "entity UNINDEXED, entity_id UNINDEXED, scope UNINDEXED, owner_id UNINDEXED, title, body, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    sqlite = op.get_bind().dialect.name != "postgresql"
+    if sqlite:
+        op.execute(SQLITE_DDL)
+    else:
+        op.execute(
+            "CREATE TABLE search_documents ("
+            "entity VARCHAR(16) NOT NULL, entity_id INTEGER NOT NULL, scope VARCHAR(16) NOT NULL, owner_id INTEGER, "
+            "title TEXT NOT NULL, body TEXT NOT NULL, "
+            "document tsvector GENERATED ALWAYS AS (setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')) STORED, "
+            "PRIMARY KEY (entity, entity_id))"
+        )
+        op.execute("CREATE INDEX ix_search_documents_document ON search_documents USING gin (document)")
+
+    # Backfill; FTS5 rows are keyed by rowid = id * 4 + entity code
+    target = "search_index (rowid, " if sqlite else "search_documents ("
+    def rowid(code):
+        return f"id * 4 + {code}, " if sqlite else ""
+    columns = "entity, entity_id, scope, owner_id, title, body)"
+    op.execute(
+        f"INSERT INTO {target}{columns} SELECT {rowid(1)}'student', id, 'staff', user_id, "
+        "TRIM(COALESCE(first_name, '') || ' ' || COALESCE(last_name, '')), COALESCE(roll_number, '') FROM students"
+    )
+    op.execute(
+        f"INSERT INTO {target}{columns} SELECT {rowid(2)}'user', id, 'staff', id, "
+        "COALESCE(name, ''), COALESCE(email, '') FROM users"
+    )
+    op.execute(
+        f"INSERT INTO {target}{columns} SELECT {rowid(3)}'announcement', id, "
+        "COALESCE(audience, 'all'), NULL, COALESCE(title, ''), COALESCE(message, '') FROM announcements"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP TABLE search_documents")
+    else:
+        op.execute("DROP TABLE search_index")
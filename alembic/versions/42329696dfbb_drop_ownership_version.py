@@ -0,0 +1,40 @@
+"""drop ownership version
+
+Revision ID: 42329696dfbb
+Revises: a0ded1d7a362
+Create Date: 2026-10-19 14:41:16.896193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '42329696dfbb'
+down_revision: Union[str, Sequence[str], None] = 'a0ded1d7a362'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Workers now poll ownership_changes by changed_at instead of comparing a shared counter
+    with op.batch_alter_table('ownership_changes') as batch_op:
+        batch_op.drop_index(batch_op.f('ix_ownership_changes_version'))
+        batch_op.drop_column('version')
+    op.drop_table('ownership_version')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_table('ownership_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO ownership_version (id, version) VALUES (1, 0)")
+    with op.batch_alter_table('ownership_changes') as batch_op:
+        batch_op.add_column(sa.Column('version', sa.BigInteger(), nullable=False, server_default='0'))
+        batch_op.create_index(batch_op.f('ix_ownership_changes_version'), ['version'], unique=False)
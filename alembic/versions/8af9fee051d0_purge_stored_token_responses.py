@@ -0,0 +1,38 @@
+"""purge stored token responses
+
+Revision ID: 8af9fee051d0
+Revises: 881ada1a13d1
+Create Date: 2026-10-19 14:22:16.103934
+
+"""
+from typing import Sequence, Union
+
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8af9fee051d0'
+down_revision: Union[str, Sequence[str], None] = '881ada1a13d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Responses of /token and /token/refresh were stored with live credentials in them
+    connection = op.get_bind()
+    leaked = []
+    for key_hash, body in connection.execute(sa.text("SELECT key_hash, body FROM idempotency_keys WHERE body IS NOT NULL")):
+        body = zlib.decompress(body)
+        if b'"access_token"' in body or b'"refresh_token"' in body:
+            leaked.append(key_hash)
+    for key_hash in leaked:
+        connection.execute(sa.text("DELETE FROM idempotency_keys WHERE key_hash = :key_hash"), {"key_hash": key_hash})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    pass
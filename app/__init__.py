@@ -1,3 +0,0 @@
-from fastapi import FastAPI
-
-app = FastAPI()
@@ -0,0 +1,174 @@
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Iterable, List
+
+from sqlalchemy import event, func, inspect, or_, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+from app.database import dialect_insert
+from app.outbox import enqueue_many
+
+# Per-student state instead of scanning history: a new attendance record later
+# than the student's last one shifts one bit into the window and bumps or
+# resets the streak. Back-dated, edited or deleted records recompute that
+# student from the (student_id, date) index: the last W records plus the count
+# since the last present day. `python -m app.backfill run attendance-states`
+# rebuilds every student the same way, e.g. after changing the thresholds.
+
+MAX_WINDOW = 62 # window_mask is a signed 64-bit column
+
+def window_size() -> int:
+    return max(1, min(settings.ATTENDANCE_WINDOW_DAYS, MAX_WINDOW))
+
+def flag_reason(streak: int, mask: int, length: int) -> str | None:
+    reasons = []
+    if streak >= settings.ATTENDANCE_ABSENCE_STREAK:
+        reasons.append("streak")
+    if length >= settings.ATTENDANCE_MIN_MARKED_DAYS and bin(mask).count("1") / length < settings.ATTENDANCE_MIN_RATE:
+        reasons.append("rate")
+    return ",".join(reasons) or None
+
+def _state(student_id: int, last_date, streak: int, mask: int, length: int, previous: dict | None) -> dict:
+    reason = flag_reason(streak, mask, length)
+    was_flagged = bool(previous and previous["flagged"])
+    return {
+        "student_id": student_id, "last_date": last_date, "streak": streak, "window_mask": mask, "window_len": length,
+        "flagged": reason is not None, "reason": reason,
+        # flagged_since marks the start of the current episode; it also keys the alert's dedupe
+        "flagged_since": (previous["flagged_since"] if was_flagged else last_date) if reason else None,
+        "updated_at": datetime.utcnow(),
+    }
+
+def advance(state: dict, record_date: date, present: bool) -> dict:
+    """The O(1) step for a record later than state["last_date"]."""
+    width = window_size()
+    mask = ((state["window_mask"] << 1) | int(bool(present))) & ((1 << width) - 1)
+    length = min(state["window_len"] + 1, width)
+    streak = 0 if present else state["streak"] + 1
+    return _state(state["student_id"], record_date, streak, mask, length, state)
+
+def recompute_states(connection, student_ids: Iterable[int], previous: Dict[int, dict] | None = None) -> Dict[int, dict]:
+    """Rebuild state for these students from history; students without records map to None."""
+    ids = list(student_ids)
+    if not ids:
+        return {}
+    previous = previous or {}
+    attendances = models.Attendance.__table__
+    width = window_size()
+    ranked = select(
+        attendances.c.student_id, attendances.c.date, attendances.c.present,
+        func.row_number().over(partition_by=attendances.c.student_id,
+                               order_by=(attendances.c.date.desc(), attendances.c.id.desc())).label("rn"),
+    ).where(attendances.c.student_id.in_(ids)).subquery()
+    windows = defaultdict(list)
+    for student_id, record_date, present in connection.execute(
+        select(ranked.c.student_id, ranked.c.date, ranked.c.present).where(ranked.c.rn <= width)
+        .order_by(ranked.c.student_id, ranked.c.rn)
+    ):
+        windows[student_id].append((record_date, present))
+
+    last_present = (
+        select(attendances.c.student_id, func.max(attendances.c.date).label("day"))
+        .where(attendances.c.student_id.in_(ids), attendances.c.present.is_(True))
+        .group_by(attendances.c.student_id).subquery()
+    )
+    streaks = dict(connection.execute(
+        select(attendances.c.student_id, func.count())
+        .select_from(attendances.outerjoin(last_present, last_present.c.student_id == attendances.c.student_id))
+        .where(attendances.c.student_id.in_(ids), or_(last_present.c.day.is_(None), attendances.c.date > last_present.c.day))
+        .group_by(attendances.c.student_id)
+    ).all())
+
+    states = {}
+    for student_id in ids:
+        records = windows.get(student_id)
+        if not records:
+            states[student_id] = None
+            continue
+        mask = sum(1 << i for i, (_, present) in enumerate(records) if present)
+        states[student_id] = _state(student_id, records[0][0], streaks.get(student_id, 0), mask, len(records), previous.get(student_id))
+    return states
+
+def load_states(connection, student_ids: Iterable[int]) -> Dict[int, dict]:
+    table = models.AttendanceState.__table__
+    query = select(table).where(table.c.student_id.in_(list(student_ids))).with_for_update()
+    return {row.student_id: dict(row._mapping) for row in connection.execute(query)}
+
+def write_states(connection, states: Dict[int, dict]):
+    table = models.AttendanceState.__table__
+    rows = [state for state in states.values() if state is not None]
+    if rows:
+        statement = dialect_insert(connection, table)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=["student_id"],
+            set_={name: statement.excluded[name] for name in rows[0] if name != "student_id"},
+        ), rows)
+    gone = [student_id for student_id, state in states.items() if state is None]
+    if gone:
+        connection.execute(table.delete().where(table.c.student_id.in_(gone)))
+
+def newly_flagged(previous: Dict[int, dict], states: Dict[int, dict]) -> List[dict]:
+    return [state for student_id, state in states.items()
+            if state and state["flagged"] and not (previous.get(student_id) or {}).get("flagged")]
+
+@event.listens_for(Session, "after_flush")
+def _track_attendance(session, flush_context):
+    added = defaultdict(list)
+    recompute = set()
+    for obj in session.new:
+        if isinstance(obj, models.Attendance) and obj.student_id is not None and obj.date is not None:
+            added[obj.student_id].append((obj.date, obj.id, obj.present))
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models.Attendance):
+            history = inspect(obj).attrs.student_id.history
+            recompute.update(i for i in [obj.student_id, *history.deleted] if i is not None)
+    if not added and not recompute:
+        return
+
+    connection = session.connection()
+    previous = load_states(connection, set(added) | recompute)
+    states = {}
+    for student_id, records in added.items():
+        state = previous.get(student_id)
+        records.sort()
+        if student_id in recompute or state is None or state["last_date"] is None or records[0][0] <= state["last_date"]:
+            recompute.add(student_id) # no state yet or out of order: the rows are flushed, rebuild from them
+            continue
+        for record_date, _, present in records:
+            state = advance(state, record_date, present)
+        states[student_id] = state
+    states.update(recompute_states(connection, recompute, previous))
+    write_states(connection, states)
+    if settings.ATTENDANCE_ALERT_EMAILS:
+        flagged = newly_flagged(previous, states)
+        if flagged:
+            session.info.setdefault("attendance_alerts", []).extend(flagged)
+
+@event.listens_for(Session, "after_flush_postexec")
+def _queue_alerts(session, flush_context):
+    # Outbox rows are added after the flush, so the commit's next flush writes them in the same transaction
+    flagged = session.info.pop("attendance_alerts", None)
+    if flagged:
+        enqueue_many(session, alert_messages(session, flagged))
+
+def alert_messages(db: Session, flagged: List[dict]) -> List[tuple]:
+    by_id = {state["student_id"]: state for state in flagged}
+    rows = db.execute(
+        select(models.Student.id, models.Student.first_name, models.Student.last_name, models.User.email)
+        .join(models.User, models.User.id == models.Student.user_id)
+        .where(models.Student.id.in_(list(by_id)))
+    )
+    messages = []
+    for student_id, first_name, last_name, email in rows:
+        state = by_id[student_id]
+        rate = bin(state["window_mask"]).count("1") / max(state["window_len"], 1)
+        messages.append((
+            email,
+            "Attendance alert",
+            f"{first_name} {last_name} has been absent for the last {state['streak']} marked day(s); "
+            f"attendance over the last {state['window_len']} day(s) is {rate:.0%}.\n",
+            f"attendance-alert:{student_id}:{state['flagged_since']}",
+        ))
+    return messages
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict
+
+from app import metrics
+from app.config import settings
+
+AUTH_PATHS = {"/token", "/register"}
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+# Never queued or shed: docs and the metrics endpoint used to observe overload
+EXEMPT_PATHS = {"/docs", "/openapi.json", "/metrics"}
+
+@dataclass
+class PriorityClass:
+    name: str
+    max_concurrency: int
+    max_queue: int
+    max_wait: float # seconds a request may wait for a slot before it is shed
+
+def default_classes() -> Dict[str, PriorityClass]:
+    factor, wait = settings.ADMISSION_QUEUE_FACTOR, settings.ADMISSION_MAX_WAIT_SECONDS
+    specs = [
+        # Logins wait longest: a shed login is retried with another bcrypt round
+        ("auth", settings.ADMISSION_AUTH_CONCURRENCY, wait * 2),
+        ("write", settings.ADMISSION_WRITE_CONCURRENCY, wait),
+        ("read", settings.ADMISSION_READ_CONCURRENCY, wait),
+        ("bulk_read", settings.ADMISSION_BULK_READ_CONCURRENCY, wait / 2),
+    ]
+    return {name: PriorityClass(name, limit, limit * factor, max_wait) for name, limit, max_wait in specs}
+
+def classify_request(scope) -> str | None:
+    path, method = scope["path"], scope["method"]
+    if path in EXEMPT_PATHS or path.startswith("/verify-email"):
+        return None
+    if path in AUTH_PATHS or path.startswith("/token/"):
+        return "auth"
+    if method in WRITE_METHODS:
+        return "write"
+    # Collection endpoints (/students/, /transactions, /search ...) return unbounded lists
+    last_segment = path.rstrip("/").rsplit("/", 1)[-1]
+    if path.endswith("/") or not last_segment.isdigit():
+        return "bulk_read"
+    return "read"
+
+class _ClassState:
+    def __init__(self, spec: PriorityClass):
+        self.spec = spec
+        self.inflight = 0
+        self.waiters: deque = deque()
+
+    async def acquire(self) -> str | None:
+        """Take a slot; returns None on success or the rejection reason."""
+        if self.inflight < self.spec.max_concurrency and not self.waiters:
+            self.inflight += 1
+            return None
+        if len(self.waiters) >= self.spec.max_queue:
+            return "queue_full"
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.spec.max_wait)
+        except asyncio.TimeoutError:
+            return "deadline"
+        except asyncio.CancelledError:
+            # Client went away; pass on a slot we may have been handed meanwhile
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+        return None # the slot was handed over by release()
+
+    def release(self):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True) # hand the slot to the oldest waiter
+                return
+        self.inflight -= 1
+
+class AdmissionControlMiddleware:
+    """Per-class concurrency limits with bounded FIFO queues; overflow gets a fast 503."""
+
+    def __init__(self, app, classes: Dict[str, PriorityClass] | None = None, classify: Callable = classify_request):
+        self.app = app
+        self.classify = classify
+        self.states = {name: _ClassState(spec) for name, spec in (classes or default_classes()).items()}
+        metrics.describe("admission_inflight", "gauge", "Requests currently executing per priority class")
+        metrics.describe("admission_queue_depth", "gauge", "Requests waiting for a slot per priority class")
+        metrics.describe("admission_admitted_total", "counter", "Requests admitted per priority class")
+        metrics.describe("admission_rejected_total", "counter", "Requests shed with 503 per priority class and reason")
+        metrics.describe("admission_wait_seconds_total", "counter", "Total time admitted requests spent queued")
+        metrics.gauge_callback("admission_inflight", lambda: {(("class", n),): s.inflight for n, s in self.states.items()})
+        metrics.gauge_callback("admission_queue_depth", lambda: {(("class", n),): len(s.waiters) for n, s in self.states.items()})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        name = self.classify(scope)
+        state = self.states.get(name)
+        if state is None:
+            return await self.app(scope, receive, send)
+
+        started = time.monotonic()
+        reason = await state.acquire()
+        if reason is not None:
+            metrics.inc("admission_rejected_total", **{"class": name, "reason": reason})
+            return await self._reject(state.spec, send)
+        metrics.inc("admission_admitted_total", **{"class": name})
+        metrics.inc("admission_wait_seconds_total", time.monotonic() - started, **{"class": name})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            state.release()
+
+    async def _reject(self, spec: PriorityClass, send):
+        body = json.dumps({"detail": "Server is busy, please retry"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(spec.max_wait))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
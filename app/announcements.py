@@ -0,0 +1,135 @@
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import event, func, inspect, or_, select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import dialect_insert
+
+# Unread badges without scanning announcements: announcement_counters holds
+# how many announcements each role can see, and every user has a read mark
+# (the last announcement id they've read and how many visible announcements
+# that covered). Unread is counters[role] - read_count: two primary-key reads.
+# Creating an announcement bumps one counter per role in its audience, however
+# many users hold the role. Deletes and audience changes also correct the read
+# counts of marks already past that announcement, with one UPDATE per role.
+
+ALL_ROLES = tuple(role.value for role in models.Role)
+AUDIENCE_ROLES = {
+    "all": ALL_ROLES,
+    "teachers": (models.Role.admin.value, models.Role.teacher.value),
+    "parents": (models.Role.parent.value,),
+}
+
+def audience_roles(audience: str | None) -> Tuple[str, ...]:
+    # Unknown or empty audiences are shown to everyone, as list_announcements does
+    return AUDIENCE_ROLES.get((audience or "").strip().lower(), ALL_ROLES)
+
+def visible_to(role: str):
+    """SQL condition matching announcements the role can see; mirrors audience_roles()."""
+    audience = func.lower(func.trim(models.Announcement.audience))
+    return or_(
+        audience.in_([name for name, roles in AUDIENCE_ROLES.items() if role in roles]),
+        audience.notin_(list(AUDIENCE_ROLES)),
+        audience.is_(None),
+    )
+
+def _bump_counters(connection, deltas: Dict[str, int]):
+    table = models.AnnouncementCounter.__table__
+    rows = [{"role": role, "total": delta} for role, delta in deltas.items() if delta]
+    if rows:
+        statement = dialect_insert(connection, table)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=["role"], set_={"total": table.c.total + statement.excluded.total}
+        ), rows)
+
+def _shift_marks(connection, announcement_id: int, roles: Iterable[str], delta: int):
+    # Marks already past the announcement counted it as read (or must now)
+    roles = list(roles)
+    if roles:
+        marks = models.AnnouncementReadMark.__table__
+        connection.execute(update(marks).where(marks.c.role.in_(roles), marks.c.last_read_id >= announcement_id)
+                           .values(read_count=marks.c.read_count + delta))
+
+@event.listens_for(Session, "after_flush")
+def _track_announcements(session, flush_context):
+    deltas = Counter()
+    shifts = [] # (announcement id, roles, +1/-1)
+    for obj in session.new:
+        if isinstance(obj, models.Announcement):
+            deltas.update(audience_roles(obj.audience))
+    for obj in session.deleted:
+        if isinstance(obj, models.Announcement):
+            history = inspect(obj).attrs.audience.history
+            roles = audience_roles(history.deleted[0] if history.deleted else obj.audience)
+            deltas.subtract(roles)
+            shifts.append((obj.id, roles, -1))
+    for obj in session.dirty:
+        if isinstance(obj, models.Announcement):
+            history = inspect(obj).attrs.audience.history
+            if not history.deleted:
+                continue
+            old, new = set(audience_roles(history.deleted[0])), set(audience_roles(obj.audience))
+            deltas.subtract(old - new)
+            deltas.update(new - old)
+            shifts += [(obj.id, old - new, -1), (obj.id, new - old, 1)]
+    if not deltas and not shifts:
+        return
+    connection = session.connection()
+    _bump_counters(connection, deltas)
+    for announcement_id, roles, delta in shifts:
+        _shift_marks(connection, announcement_id, roles, delta)
+
+def unread_count(db: Session, user: models.User) -> dict:
+    role = user.role.value
+    counter = db.get(models.AnnouncementCounter, role)
+    total = counter.total if counter else 0
+    mark = db.get(models.AnnouncementReadMark, user.id)
+    if mark is None:
+        return {"unread": total, "last_read_id": None}
+    read = mark.read_count
+    if mark.role != role: # role changed since the mark was written
+        read = db.scalar(select(func.count()).select_from(models.Announcement)
+                         .where(models.Announcement.id <= mark.last_read_id, visible_to(role)))
+    return {"unread": max(total - read, 0), "last_read_id": mark.last_read_id}
+
+def mark_read(db: Session, user: models.User, up_to: int | None = None) -> dict:
+    """Move the user's mark to up_to (default: the latest announcement); it never moves back."""
+    role = user.role.value
+    # One statement, so the counter and the latest id come from the same snapshot
+    total, latest = db.execute(select(
+        select(models.AnnouncementCounter.total).where(models.AnnouncementCounter.role == role).scalar_subquery(),
+        select(func.max(models.Announcement.id)).scalar_subquery(),
+    )).one()
+    if latest is None:
+        return unread_count(db, user)
+    if up_to is None or up_to >= latest:
+        up_to, read = latest, total or 0
+    else:
+        read = db.scalar(select(func.count()).select_from(models.Announcement)
+                         .where(models.Announcement.id <= up_to, visible_to(role)))
+    marks = models.AnnouncementReadMark.__table__
+    statement = dialect_insert(db.connection(), marks).values(
+        user_id=user.id, role=role, last_read_id=up_to, read_count=read, updated_at=datetime.utcnow()
+    )
+    db.execute(statement.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={name: statement.excluded[name] for name in ("role", "last_read_id", "read_count", "updated_at")},
+        where=or_(marks.c.last_read_id < statement.excluded.last_read_id, marks.c.role != statement.excluded.role),
+    ))
+    db.commit()
+    return unread_count(db, user)
+
+def rebuild_counters(connection):
+    """Recount announcement_counters from the announcements table."""
+    totals = Counter({role: 0 for role in ALL_ROLES})
+    for audience, count in connection.execute(
+        select(models.Announcement.audience, func.count()).group_by(models.Announcement.audience)
+    ):
+        for role in audience_roles(audience):
+            totals[role] += count
+    table = models.AnnouncementCounter.__table__
+    connection.execute(table.delete())
+    connection.execute(table.insert(), [{"role": role, "total": total} for role, total in totals.items()])
@@ -1,33 +1,126 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app import models, schemas
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session, joinedload, selectinload
+from app import announcements, archive, models, ownership, schemas
 from app.database import get_db
+from app.groupcommit import save_async
 from app.dependencies import get_current_user
 from app.middleware import role_required
+from app.search import remove_documents
+from app.serialization import FastJSONResponse, column_rows_response, parse_fields, rows_to_dicts, select_columns
+from datetime import date
 from typing import List
 
 api_router = APIRouter()
 
-# Student Endpoints
-@api_router.get("/students/", response_model=List[schemas.StudentRead], dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher]))])
-async def list_students(db: Session = Depends(get_db)):
-    students = db.query(models.Student).all()
-    return students
+# ?include= expansions: name -> (relationship, loader strategy, read schema).
+# joinedload for many-to-one, selectinload for collections, so a list costs
+# one query plus one per collection include regardless of row count.
+STUDENT_INCLUDES = {
+    "class": ("school_class", joinedload, schemas.SchoolClassRead),
+    "user": ("user", joinedload, schemas.User),
+}
+CLASS_INCLUDES = {
+    "students": ("students", selectinload, schemas.StudentRead),
+    "teacher": ("teacher", joinedload, schemas.User),
+    "subjects": ("subjects", selectinload, schemas.SubjectRead),
+}
+
+def _parse_includes(include: str | None, allowed: dict) -> List[str]:
+    if not include:
+        return []
+    names = [name.strip() for name in include.split(",") if name.strip()]
+    unknown = set(names) - set(allowed)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown include {sorted(unknown)}. Must be among {sorted(allowed)}")
+    return names
+
+def _with_includes(query, model, includes: List[str], allowed: dict):
+    for name in includes:
+        attr, loader, _ = allowed[name]
+        query = query.options(loader(getattr(model, attr)))
+    return query
+
+def _expand(obj, base_schema, expanded_schema, includes: List[str], allowed: dict):
+    data = base_schema.model_validate(obj).model_dump()
+    for name in includes:
+        attr, _, schema = allowed[name]
+        value = getattr(obj, attr)
+        if isinstance(value, list):
+            data[attr] = [schema.model_validate(item) for item in value]
+        else:
+            data[attr] = schema.model_validate(value) if value is not None else None
+    # Only explicitly set fields are serialised (response_model_exclude_unset)
+    return expanded_schema(**data)
+
+# Bulk endpoints run one UPDATE/DELETE ... WHERE instead of a load-modify-commit per row
+def _require_filter(clauses: list) -> list:
+    if not clauses:
+        raise HTTPException(status_code=400, detail="Bulk operations need at least one filter")
+    return clauses
+
+def _student_clauses(criteria: schemas.StudentFilter) -> list:
+    clauses = []
+    if criteria.ids is not None:
+        clauses.append(models.Student.id.in_(criteria.ids))
+    if criteria.class_id is not None:
+        clauses.append(models.Student.class_id == criteria.class_id)
+    return _require_filter(clauses)
+
+def _fee_payment_clauses(criteria: schemas.FeePaymentFilter) -> list:
+    clauses = []
+    if criteria.ids is not None:
+        clauses.append(models.FeePayment.id.in_(criteria.ids))
+    if criteria.student_ids is not None:
+        clauses.append(models.FeePayment.student_id.in_(criteria.student_ids))
+    if criteria.class_id is not None:
+        clauses.append(models.FeePayment.student_id.in_(ownership.current_index().roster(criteria.class_id)))
+    if criteria.month is not None:
+        clauses.append(models.FeePayment.month == criteria.month)
+    if criteria.status is not None:
+        clauses.append(models.FeePayment.status == criteria.status)
+    return _require_filter(clauses)
+
+def _bulk_execute(db: Session, model, clauses: list, statement, dry_run: bool) -> dict:
+    if dry_run:
+        return {"affected": db.query(func.count(model.id)).filter(*clauses).scalar(), "dry_run": True}
+    result = db.execute(statement.where(*clauses).execution_options(synchronize_session=False))
+    db.commit()
+    return {"affected": result.rowcount, "dry_run": False}
 
-@api_router.get("/students/{student_id}", response_model=schemas.StudentRead, dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher, models.Role.parent]))])
+# Student Endpoints
+@api_router.get("/students/", response_model=List[schemas.StudentExpanded], response_model_exclude_unset=True, dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher]))])
+async def list_students(
+    include: str | None = Query(None, description="Comma-separated: class,user"),
+    fields: str | None = Query(None, description="Comma-separated subset of StudentRead fields; applies to the student columns when combined with include"),
+    db: Session = Depends(get_db)
+):
+    includes = _parse_includes(include, STUDENT_INCLUDES)
+    field_names = parse_fields(fields, schemas.StudentRead)
+    if not includes:
+        return column_rows_response(db, select_columns(models.Student, field_names), field_names)
+    students = _with_includes(db.query(models.Student), models.Student, includes, STUDENT_INCLUDES).all()
+    expanded = [_expand(s, schemas.StudentRead, schemas.StudentExpanded, includes, STUDENT_INCLUDES) for s in students]
+    if fields:
+        # ?fields= trims the student's own columns; the trimmed rows no longer
+        # validate as StudentExpanded, so they bypass the response model
+        keep = set(field_names) | {STUDENT_INCLUDES[name][0] for name in includes}
+        return FastJSONResponse([s.model_dump(mode="json", include=keep, exclude_unset=True) for s in expanded])
+    return expanded
+
+@api_router.get("/students/{student_id}", response_model=schemas.StudentRead, dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher, models.Role.parent])), Depends(ownership.loaded_index)])
 async def get_student(
     student_id: int,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
+    # Parents can only view their own children; checked before loading, so other ids are 403 whether or not they exist
+    if current_user.role == models.Role.parent and not ownership.owns(current_user.id, student_id):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view this student")
+
     student = db.query(models.Student).filter(models.Student.id == student_id).first()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
-    
-    # Parents can only view their own children
-    if current_user.role == models.Role.parent and student.user_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view this student")
-
     return student
 
 @api_router.put("/students/{student_id}", response_model=schemas.StudentRead, dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher]))])
@@ -61,6 +154,33 @@ async def delete_student(
     db.commit()
     return
 
+@api_router.post("/students/bulk-update", response_model=schemas.BulkResult, dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher]))])
+async def bulk_update_students(
+    bulk: schemas.StudentBulkUpdate,
+    db: Session = Depends(get_db)
+):
+    values = bulk.values.dict(exclude_unset=True)
+    if not values:
+        raise HTTPException(status_code=400, detail="No values to update")
+    if values.get("class_id") is not None and db.get(models.SchoolClass, values["class_id"]) is None:
+        raise HTTPException(status_code=404, detail="Class not found")
+    # Only non-indexed columns are settable, so the search index needs no update
+    return _bulk_execute(db, models.Student, _student_clauses(bulk.filter), update(models.Student).values(**values), bulk.dry_run)
+
+@api_router.post("/students/bulk-delete", response_model=schemas.BulkResult, dependencies=[Depends(role_required([models.Role.admin]))])
+async def bulk_delete_students(
+    bulk: schemas.StudentBulkDelete,
+    db: Session = Depends(get_db)
+):
+    clauses = _student_clauses(bulk.filter)
+    if bulk.dry_run:
+        return _bulk_execute(db, models.Student, clauses, None, True)
+    # Ids are needed to drop the search documents in the same transaction
+    ids = list(db.scalars(select(models.Student.id).where(*clauses)))
+    if ids:
+        remove_documents(db.connection(), "student", ids)
+    return _bulk_execute(db, models.Student, [models.Student.id.in_(ids)], delete(models.Student), False)
+
 # SchoolClass Endpoints
 @api_router.post("/classes/", response_model=schemas.SchoolClassRead, dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher]))])
 async def create_class(
@@ -68,15 +188,16 @@ async def create_class(
     db: Session = Depends(get_db)
 ):
     db_class = models.SchoolClass(**school_class.dict())
-    db.add(db_class)
-    db.commit()
-    db.refresh(db_class)
-    return db_class
+    return await save_async(db, db_class)
 
-@api_router.get("/classes/", response_model=List[schemas.SchoolClassRead], dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher]))])
-async def list_classes(db: Session = Depends(get_db)):
-    classes = db.query(models.SchoolClass).all()
-    return classes
+@api_router.get("/classes/", response_model=List[schemas.SchoolClassExpanded], response_model_exclude_unset=True, dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher]))])
+async def list_classes(
+    include: str | None = Query(None, description="Comma-separated: students,teacher,subjects"),
+    db: Session = Depends(get_db)
+):
+    includes = _parse_includes(include, CLASS_INCLUDES)
+    classes = _with_includes(db.query(models.SchoolClass), models.SchoolClass, includes, CLASS_INCLUDES).all()
+    return [_expand(c, schemas.SchoolClassRead, schemas.SchoolClassExpanded, includes, CLASS_INCLUDES) for c in classes]
 
 @api_router.get("/classes/{class_id}", response_model=schemas.SchoolClassRead, dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher]))])
 async def get_class(
@@ -126,15 +247,62 @@ async def create_attendance(
     db: Session = Depends(get_db)
 ):
     db_attendance = models.Attendance(**attendance.dict())
-    db.add(db_attendance)
+    return await save_async(db, db_attendance)
+
+@api_router.post("/attendance/bulk", response_model=schemas.AttendanceBulkResult, dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher]))])
+async def mark_attendance_bulk(
+    bulk: schemas.AttendanceBulkCreate,
+    db: Session = Depends(get_db)
+):
+    # One transaction for the whole register; absence state is updated in the same flush
+    db.add_all(
+        models.Attendance(student_id=record.student_id, date=bulk.date, present=record.present, marked_by=bulk.marked_by)
+        for record in bulk.records
+    )
     db.commit()
-    db.refresh(db_attendance)
-    return db_attendance
+    return {"created": len(bulk.records)}
+
+@api_router.get("/attendance/alerts", response_model=List[schemas.AttendanceAlert], dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher]))])
+async def list_attendance_alerts(
+    class_id: int | None = Query(None),
+    reason: str | None = Query(None, pattern="^(streak|rate)$"),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+):
+    # Served from attendance_states (one row per student), never from attendance history
+    state = models.AttendanceState
+    query = (
+        select(state, models.Student.first_name, models.Student.last_name, models.Student.class_id)
+        .join(models.Student, models.Student.id == state.student_id)
+        .where(state.flagged.is_(True))
+    )
+    if class_id is not None:
+        query = query.where(models.Student.class_id == class_id)
+    if reason is not None:
+        query = query.where(state.reason.contains(reason))
+    query = query.order_by(state.streak.desc(), state.student_id).offset(offset).limit(limit)
+    alerts = []
+    for row, first_name, last_name, student_class in db.execute(query):
+        present = bin(row.window_mask).count("1")
+        alerts.append({
+            "student_id": row.student_id, "first_name": first_name, "last_name": last_name, "class_id": student_class,
+            "streak": row.streak, "window_days": row.window_len, "window_present": present,
+            "rate": present / row.window_len if row.window_len else 0.0, "reason": row.reason,
+            "flagged_since": row.flagged_since, "last_date": row.last_date,
+        })
+    return alerts
 
 @api_router.get("/attendance/", response_model=List[schemas.AttendanceRead], dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher]))])
-async def list_attendance(db: Session = Depends(get_db)):
-    attendance_records = db.query(models.Attendance).all()
-    return attendance_records
+async def list_attendance(
+    fields: str | None = Query(None, description="Comma-separated subset of AttendanceRead fields"),
+    date_from: date | None = Query(None, description="Inclusive; reaches archived academic years"),
+    date_to: date | None = Query(None, description="Inclusive"),
+    db: Session = Depends(get_db)
+):
+    field_names = parse_fields(fields, schemas.AttendanceRead)
+    statement = archive.ranged_select(db, models.Attendance, field_names, date_from, date_to)
+    return column_rows_response(db, statement, field_names)
 
 @api_router.get("/attendance/{attendance_id}", response_model=schemas.AttendanceRead, dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher]))])
 async def get_attendance(
@@ -184,27 +352,25 @@ async def create_fee_payment(
     db: Session = Depends(get_db)
 ):
     db_fee_payment = models.FeePayment(**fee_payment.dict())
-    db.add(db_fee_payment)
-    db.commit()
-    db.refresh(db_fee_payment)
-    return db_fee_payment
+    return await save_async(db, db_fee_payment)
 
-@api_router.get("/fee_payments/", response_model=List[schemas.FeePaymentRead], dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher, models.Role.parent]))])
+@api_router.get("/fee_payments/", response_model=List[schemas.FeePaymentRead], dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher, models.Role.parent])), Depends(ownership.loaded_index)])
 async def list_fee_payments(
+    date_from: date | None = Query(None, description="Inclusive; reaches archived academic years"),
+    date_to: date | None = Query(None, description="Inclusive"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
+    where = None
     if current_user.role == models.Role.parent:
-        # Parents can only see their children's fee payments
-        # This requires joining FeePayment with Student and User
-        # For simplicity, let's assume FeePayment has a direct link to user_id or student_id can be used to find user_id
-        # FeePayment has student_id, so we need to check if the student belongs to the current parent
-        fee_payments = db.query(models.FeePayment).join(models.Student).filter(models.Student.user_id == current_user.id).all()
-    else:
-        fee_payments = db.query(models.FeePayment).all()
-    return fee_payments
-
-@api_router.get("/fee_payments/{fee_payment_id}", response_model=schemas.FeePaymentRead, dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher, models.Role.parent]))])
+        # Parents can only see their children's fee payments, archived ones included
+        children = ownership.current_index().children_of(current_user.id)
+        where = lambda table: [table.c.student_id.in_(children)]
+    field_names = list(schemas.FeePaymentRead.model_fields)
+    statement = archive.ranged_select(db, models.FeePayment, field_names, date_from, date_to, where)
+    return rows_to_dicts(field_names, db.execute(statement))
+
+@api_router.get("/fee_payments/{fee_payment_id}", response_model=schemas.FeePaymentRead, dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher, models.Role.parent])), Depends(ownership.loaded_index)])
 async def get_fee_payment(
     fee_payment_id: int,
     db: Session = Depends(get_db),
@@ -216,8 +382,7 @@ async def get_fee_payment(
     
     if current_user.role == models.Role.parent:
         # Check if the fee payment belongs to the current parent's child
-        student = db.query(models.Student).filter(models.Student.id == fee_payment.student_id).first()
-        if not student or student.user_id != current_user.id:
+        if not ownership.owns(current_user.id, fee_payment.student_id):
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view this fee payment")
 
     return fee_payment
@@ -253,6 +418,23 @@ async def delete_fee_payment(
     db.commit()
     return
 
+@api_router.post("/fee_payments/bulk-status", response_model=schemas.BulkResult, dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher])), Depends(ownership.loaded_index)])
+async def bulk_update_fee_payment_status(
+    bulk: schemas.FeePaymentBulkStatus,
+    db: Session = Depends(get_db)
+):
+    values = {"status": bulk.status}
+    if bulk.remarks is not None:
+        values["remarks"] = bulk.remarks
+    return _bulk_execute(db, models.FeePayment, _fee_payment_clauses(bulk.filter), update(models.FeePayment).values(**values), bulk.dry_run)
+
+@api_router.post("/fee_payments/bulk-delete", response_model=schemas.BulkResult, dependencies=[Depends(role_required([models.Role.admin])), Depends(ownership.loaded_index)])
+async def bulk_delete_fee_payments(
+    bulk: schemas.FeePaymentBulkDelete,
+    db: Session = Depends(get_db)
+):
+    return _bulk_execute(db, models.FeePayment, _fee_payment_clauses(bulk.filter), delete(models.FeePayment), bulk.dry_run)
+
 # SchoolEvent Endpoints
 @api_router.post("/school_events/", response_model=schemas.SchoolEventRead, dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher]))])
 async def create_school_event(
@@ -260,10 +442,7 @@ async def create_school_event(
     db: Session = Depends(get_db)
 ):
     db_school_event = models.SchoolEvent(**school_event.dict())
-    db.add(db_school_event)
-    db.commit()
-    db.refresh(db_school_event)
-    return db_school_event
+    return await save_async(db, db_school_event)
 
 @api_router.get("/school_events/", response_model=List[schemas.SchoolEventRead], dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher, models.Role.parent, models.Role.student]))])
 async def list_school_events(db: Session = Depends(get_db)):
@@ -318,10 +497,7 @@ async def create_school_info(
     db: Session = Depends(get_db)
 ):
     db_school_info = models.SchoolInfo(**school_info.dict())
-    db.add(db_school_info)
-    db.commit()
-    db.refresh(db_school_info)
-    return db_school_info
+    return await save_async(db, db_school_info)
 
 @api_router.get("/school_info/", response_model=List[schemas.SchoolInfoRead], dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher, models.Role.parent, models.Role.student]))])
 async def list_school_info(db: Session = Depends(get_db)):
@@ -376,15 +552,17 @@ async def create_school_transaction(
     db: Session = Depends(get_db)
 ):
     db_school_transaction = models.SchoolTransaction(**school_transaction.dict())
-    db.add(db_school_transaction)
-    db.commit()
-    db.refresh(db_school_transaction)
-    return db_school_transaction
+    return await save_async(db, db_school_transaction)
 
 @api_router.get("/school_transactions/", response_model=List[schemas.SchoolTransactionRead], dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher]))])
-async def list_school_transactions(db: Session = Depends(get_db)):
-    school_transactions = db.query(models.SchoolTransaction).all()
-    return school_transactions
+async def list_school_transactions(
+    date_from: date | None = Query(None, description="Inclusive; reaches archived academic years"),
+    date_to: date | None = Query(None, description="Inclusive"),
+    db: Session = Depends(get_db)
+):
+    field_names = list(schemas.SchoolTransactionRead.model_fields)
+    statement = archive.ranged_select(db, models.SchoolTransaction, field_names, date_from, date_to)
+    return rows_to_dicts(field_names, db.execute(statement))
 
 @api_router.get("/school_transactions/{school_transaction_id}", response_model=schemas.SchoolTransactionRead, dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher]))])
 async def get_school_transaction(
@@ -434,16 +612,28 @@ async def create_announcement(
     db: Session = Depends(get_db)
 ):
     db_announcement = models.Announcement(**announcement.dict())
-    db.add(db_announcement)
-    db.commit()
-    db.refresh(db_announcement)
-    return db_announcement
+    return await save_async(db, db_announcement)
 
 @api_router.get("/announcements/", response_model=List[schemas.AnnouncementRead], dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher, models.Role.parent, models.Role.student]))])
 async def list_announcements(db: Session = Depends(get_db)):
     announcements = db.query(models.Announcement).all()
     return announcements
 
+@api_router.get("/announcements/unread-count", response_model=schemas.AnnouncementUnread, dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher, models.Role.parent, models.Role.student]))])
+async def get_unread_announcement_count(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    return announcements.unread_count(db, current_user)
+
+@api_router.post("/announcements/read-up-to", response_model=schemas.AnnouncementUnread, dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher, models.Role.parent, models.Role.student]))])
+async def mark_announcements_read(
+    body: schemas.AnnouncementReadUpTo,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    return announcements.mark_read(db, current_user, body.announcement_id)
+
 @api_router.get("/announcements/{announcement_id}", response_model=schemas.AnnouncementRead, dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher, models.Role.parent, models.Role.student]))])
 async def get_announcement(
     announcement_id: int,
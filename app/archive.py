@@ -0,0 +1,207 @@
+import re
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, time as dt_time
+from typing import Callable, Dict, List, Sequence
+
+from sqlalchemy import Column, DateTime, Index, MetaData, Table, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+
+# History tables and the column that decides which academic year a row belongs to
+ARCHIVED_MODELS = {
+    models.Attendance: "date",
+    models.FeePayment: "payment_date",
+    models.Transaction: "date_created",
+    models.SchoolTransaction: "date",
+}
+ARCHIVED_TABLES = {model.__tablename__: model for model in ARCHIVED_MODELS}
+
+# Archive tables live outside Base.metadata so alembic autogenerate and
+# create_all never see them; they are created when a year is archived.
+archive_metadata = MetaData()
+
+class ArchiveError(Exception):
+    pass
+
+@dataclass(frozen=True)
+class AcademicYear:
+    first: int # calendar year the academic year starts in
+
+    @property
+    def label(self) -> str:
+        return f"{self.first}-{self.first + 1}"
+
+    @property
+    def starts_on(self) -> date:
+        return date(self.first, settings.ACADEMIC_YEAR_START_MONTH, 1)
+
+    @property
+    def ends_on(self) -> date:
+        return date(self.first + 1, settings.ACADEMIC_YEAR_START_MONTH, 1)
+
+def parse_academic_year(value: str) -> AcademicYear:
+    # Accepts "2024-2025", "2024/25" and "2024"
+    match = re.fullmatch(r"\s*(\d{4})(?:\s*[-/]\s*(\d{2}|\d{4}))?\s*", value or "")
+    if not match:
+        raise ArchiveError(f"Unrecognised academic year {value!r}")
+    return AcademicYear(int(match.group(1)))
+
+def current_academic_year(db: Session) -> AcademicYear:
+    value = db.scalar(select(models.SchoolInfo.academic_year).order_by(models.SchoolInfo.id.desc()).limit(1))
+    if not value:
+        raise ArchiveError("Set school_info.academic_year before archiving")
+    return parse_academic_year(value)
+
+def archive_table(source_name: str, year: AcademicYear) -> Table:
+    name = f"{source_name}_archive_{year.first}_{year.first + 1}"
+    if name in archive_metadata.tables:
+        return archive_metadata.tables[name]
+    source = ARCHIVED_TABLES[source_name].__table__
+    # Same columns and ids, no foreign keys: archived history must not block user deletes
+    columns = [Column(c.name, c.type, primary_key=c.primary_key) for c in source.columns]
+    date_column = ARCHIVED_MODELS[ARCHIVED_TABLES[source_name]]
+    return Table(name, archive_metadata, *columns, Index(f"ix_{name}_{date_column}", date_column))
+
+def _bound(column, value: date):
+    return datetime.combine(value, dt_time.min) if isinstance(column.type, DateTime) else value
+
+def _range_clauses(table: Table, date_column: str, date_from: date | None, date_to: date | None) -> list:
+    # Half-open [date_from, date_to + 1 day) so a DateTime column includes all of date_to
+    column = table.c[date_column]
+    clauses = []
+    if date_from is not None:
+        clauses.append(column >= _bound(column, date_from))
+    if date_to is not None:
+        clauses.append(column < _bound(column, date.fromordinal(date_to.toordinal() + 1)))
+    return clauses
+
+def archive_tables_for(db: Session, model, date_from: date | None, date_to: date | None) -> List[Table]:
+    query = select(models.ArchivedYear.academic_year).where(models.ArchivedYear.source_table == model.__tablename__)
+    if date_from is not None:
+        query = query.where(models.ArchivedYear.ends_on > date_from)
+    if date_to is not None:
+        query = query.where(models.ArchivedYear.starts_on <= date_to)
+    return [archive_table(model.__tablename__, parse_academic_year(label)) for label in db.scalars(query)]
+
+def ranged_select(db: Session, model, field_names: Sequence[str], date_from: date | None = None,
+                  date_to: date | None = None, where: Callable[[Table], list] | None = None):
+    """SELECT field_names from the live table, plus archives only when a date range reaches them.
+
+    Without a range only live rows are read; archived years are opt-in via date_from/date_to.
+    `where(table)` adds filters that must apply to every part (e.g. an owner check).
+    Rows come ordered by (date, source table, id), so offset/limit pages are stable;
+    the source keeps the order total even if a live and an archived row share an id.
+    """
+    date_column = ARCHIVED_MODELS[model]
+    tables = [model.__table__]
+    if date_from is not None or date_to is not None:
+        tables += archive_tables_for(db, model, date_from, date_to)
+    if len(tables) == 1:
+        table = tables[0]
+        return (select(*[table.c[name] for name in field_names])
+                .where(*_range_clauses(table, date_column, date_from, date_to), *(where(table) if where else []))
+                .order_by(table.c[date_column], table.c.id))
+    parts = [
+        select(*[table.c[name] for name in field_names], table.c[date_column].label("sort_date"),
+               literal(source).label("sort_source"), table.c.id.label("sort_id"))
+        .where(*_range_clauses(table, date_column, date_from, date_to), *(where(table) if where else []))
+        for source, table in enumerate(tables)
+    ]
+    rows = union_all(*parts).subquery()
+    return select(*[rows.c[name] for name in field_names]).order_by(rows.c.sort_date, rows.c.sort_source, rows.c.sort_id)
+
+def _move(db: Session, source: Table, target: Table, clauses: list, chunk_size: int, pause: float, log) -> int:
+    """Copy-then-delete in short transactions keyed by id, so no write lock is held for long."""
+    names = [c.name for c in target.columns]
+    moved = 0
+    while True:
+        ids = list(db.scalars(select(source.c.id).where(*clauses).order_by(source.c.id).limit(chunk_size)))
+        if not ids:
+            return moved
+        db.execute(target.insert().from_select(names, select(*[source.c[n] for n in names]).where(source.c.id.in_(ids))))
+        db.execute(source.delete().where(source.c.id.in_(ids)))
+        db.commit()
+        moved += len(ids)
+        log(f"  {source.name} -> {target.name}: {moved} rows")
+        if pause:
+            time.sleep(pause)
+
+def _registry(db: Session, source_name: str, year: AcademicYear) -> models.ArchivedYear | None:
+    return db.query(models.ArchivedYear).filter(
+        models.ArchivedYear.source_table == source_name, models.ArchivedYear.academic_year == year.label
+    ).first()
+
+def archive_year(db: Session, label: str, tables: Sequence[str] | None = None, chunk_size: int | None = None,
+                 pause: float | None = None, log=print) -> Dict[str, int]:
+    year = parse_academic_year(label)
+    current = current_academic_year(db)
+    if year.ends_on > current.starts_on:
+        raise ArchiveError(f"{year.label} is not closed; the current academic year is {current.label}")
+    chunk_size = chunk_size or settings.ARCHIVE_CHUNK_SIZE
+    pause = settings.ARCHIVE_CHUNK_PAUSE_SECONDS if pause is None else pause
+    moved = {}
+    for source_name in tables or list(ARCHIVED_TABLES):
+        if source_name not in ARCHIVED_TABLES:
+            raise ArchiveError(f"{source_name} is not an archivable table")
+        model = ARCHIVED_TABLES[source_name]
+        target = archive_table(source_name, year)
+        target.create(db.connection(), checkfirst=True)
+        # Registered before any row moves, so reads union the archive from the first chunk on
+        entry = _registry(db, source_name, year) or models.ArchivedYear(
+            source_table=source_name, academic_year=year.label, starts_on=year.starts_on, ends_on=year.ends_on)
+        entry.status = "archiving"
+        db.add(entry)
+        db.commit()
+        source = model.__table__
+        clauses = _range_clauses(source, ARCHIVED_MODELS[model], year.starts_on, date.fromordinal(year.ends_on.toordinal() - 1))
+        moved[source_name] = _move(db, source, target, clauses, chunk_size, pause, log)
+        entry.rows += moved[source_name]
+        entry.status = "archived"
+        db.commit()
+    return moved
+
+def restore_year(db: Session, label: str, tables: Sequence[str] | None = None, chunk_size: int | None = None,
+                 pause: float | None = None, log=print) -> Dict[str, int]:
+    year = parse_academic_year(label)
+    chunk_size = chunk_size or settings.ARCHIVE_CHUNK_SIZE
+    pause = settings.ARCHIVE_CHUNK_PAUSE_SECONDS if pause is None else pause
+    restored = {}
+    for source_name in tables or list(ARCHIVED_TABLES):
+        entry = _registry(db, source_name, year)
+        if entry is None:
+            continue
+        entry.status = "restoring"
+        db.commit()
+        target = archive_table(source_name, year)
+        restored[source_name] = _move(db, target, ARCHIVED_TABLES[source_name].__table__, [], chunk_size, pause, log)
+        # Unregister first: once the row is gone no read path references the table
+        db.delete(entry)
+        db.commit()
+        target.drop(db.connection(), checkfirst=True)
+        db.commit()
+    return restored
+
+if __name__ == "__main__":
+    # `python -m app.archive archive 2023-2024 [table ...]`, `... restore 2023-2024 [table ...]`, `... list`
+    import sys
+    from app.database import SessionLocal, get_engine
+    args = sys.argv[1:]
+    if not args or args[0] not in ("archive", "restore", "list") or (args[0] != "list" and len(args) < 2):
+        sys.exit("usage: python -m app.archive archive|restore <academic-year> [table ...] | list")
+    get_engine()
+    session = SessionLocal()
+    try:
+        if args[0] == "list":
+            for entry in session.query(models.ArchivedYear).order_by(models.ArchivedYear.starts_on, models.ArchivedYear.source_table):
+                print(f"{entry.academic_year}  {entry.source_table:20} {entry.status:10} {entry.rows} rows")
+        else:
+            run = archive_year if args[0] == "archive" else restore_year
+            counts = run(session, args[1], args[2:] or None)
+            print(", ".join(f"{table}: {count}" for table, count in counts.items()) or "Nothing to do.")
+    except ArchiveError as exc:
+        sys.exit(str(exc))
+    finally:
+        session.close()
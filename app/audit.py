@@ -0,0 +1,258 @@
+import json
+import logging
+import queue
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import event, inspect, select, tuple_
+from sqlalchemy.orm import Session
+
+from app import metrics, models, schemas
+from app.config import settings
+from app.database import get_db, session_for
+from app.middleware import role_required
+
+logger = logging.getLogger(__name__)
+
+audit_router = APIRouter()
+
+# Mutations of the audited models are diffed in after_flush and held on the
+# session until it commits; a rollback drops them. Committed records go to a
+# bounded queue and a writer thread appends them to audit_log in batches, so
+# requests never wait on the audit insert. When the queue is full the
+# committing thread writes its own records (audit_queue_full_total): slower,
+# but nothing is lost. Bulk UPDATE/DELETE statements are audited per row from
+# a SELECT of the rows they match, bulk INSERTs from the rows they RETURN.
+
+AUDITED = {model.__tablename__: model for model in (models.Student, models.FeePayment, models.Attendance, models.SchoolTransaction)}
+
+# Who is acting: the token subject, set by auth_middleware
+current_actor: ContextVar[str | None] = ContextVar("current_actor", default=None)
+
+def _jsonable(values: dict) -> str:
+    return json.dumps(values, default=str, separators=(",", ":"))
+
+def _record(entity: str, entity_id, action: str, actor: str | None, before: dict | None, after: dict | None) -> dict:
+    changes = {}
+    if before is not None:
+        changes["before"] = before
+    if after is not None:
+        changes["after"] = after
+    return {"occurred_at": datetime.utcnow(), "entity": entity, "entity_id": entity_id, "action": action,
+            "actor": actor, "changes": _jsonable(changes)}
+
+def _columns(obj) -> List[str]:
+    return [attr.key for attr in inspect(obj).mapper.column_attrs]
+
+def _actor(obj) -> str | None:
+    # Group-committed inserts are flushed on the writer thread; they carry the actor from construction
+    return current_actor.get() or inspect(obj).info.get("actor")
+
+def _stamp_actor(target, args, kwargs):
+    actor = current_actor.get()
+    if actor is not None:
+        inspect(target).info["actor"] = actor
+
+for _model in AUDITED.values():
+    event.listen(_model, "init", _stamp_actor)
+
+@event.listens_for(Session, "after_flush")
+def _capture(session, flush_context):
+    if not settings.AUDIT_ENABLED:
+        return
+    records = []
+    for obj in session.new:
+        if type(obj).__tablename__ in AUDITED:
+            records.append(_record(obj.__tablename__, obj.id, "insert", _actor(obj), None,
+                                   {key: getattr(obj, key) for key in _columns(obj)}))
+    for obj in session.dirty:
+        if type(obj).__tablename__ not in AUDITED or not session.is_modified(obj, include_collections=False):
+            continue
+        state, before, after = inspect(obj), {}, {}
+        for key in _columns(obj):
+            history = state.attrs[key].history
+            if history.added or history.deleted:
+                before[key] = history.deleted[0] if history.deleted else None
+                after[key] = history.added[0] if history.added else None
+        if after:
+            records.append(_record(obj.__tablename__, obj.id, "update", _actor(obj), before, after))
+    for obj in session.deleted:
+        if type(obj).__tablename__ in AUDITED:
+            state = inspect(obj)
+            before = {}
+            for key in _columns(obj):
+                history = state.attrs[key].history
+                before[key] = history.deleted[0] if history.deleted else getattr(obj, key)
+            records.append(_record(obj.__tablename__, obj.id, "delete", _actor(obj), before, None))
+    if records:
+        session.info.setdefault("audit", []).extend(records)
+
+@event.listens_for(Session, "do_orm_execute")
+def _capture_bulk(orm_execute_state):
+    if not settings.AUDIT_ENABLED or not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    model = next((m.class_ for m in orm_execute_state.all_mappers if m.class_.__tablename__ in AUDITED), None)
+    if model is None:
+        return
+    table, session = model.__table__, orm_execute_state.session
+    if orm_execute_state.is_insert:
+        return _capture_insert(orm_execute_state, table)
+    matched = select(table)
+    if orm_execute_state.statement.whereclause is not None:
+        matched = matched.where(orm_execute_state.statement.whereclause)
+    before = {row.id: dict(row._mapping) for row in session.execute(matched)}
+    result = orm_execute_state.invoke_statement()
+    actor, records = current_actor.get(), []
+    if orm_execute_state.is_delete:
+        records = [_record(table.name, row_id, "delete", actor, row, None) for row_id, row in before.items()]
+    elif before:
+        for row in session.execute(select(table).where(table.c.id.in_(list(before)))):
+            old, new = before[row.id], dict(row._mapping)
+            changed = [key for key in new if new[key] != old.get(key)]
+            if changed:
+                records.append(_record(table.name, row.id, "update", actor,
+                                       {key: old.get(key) for key in changed}, {key: new[key] for key in changed}))
+    if records:
+        session.info.setdefault("audit", []).extend(records)
+    return result
+
+def _capture_insert(orm_execute_state, table):
+    # Our columns go after any the caller asked to RETURN and are cut off again
+    # before the result is handed back; rows skipped by ON CONFLICT return nothing
+    result = orm_execute_state.invoke_statement(statement=orm_execute_state.statement.returning(*table.c)).freeze()
+    own = len(result().keys()) - len(table.c)
+    actor = current_actor.get()
+    records = []
+    for row in result().all():
+        values = dict(zip(table.c.keys(), row[own:]))
+        records.append(_record(table.name, values["id"], "insert", actor, None, values))
+    if records:
+        orm_execute_state.session.info.setdefault("audit", []).extend(records)
+    return result().columns(*range(own)) if own else result()
+
+@event.listens_for(Session, "after_commit")
+def _committed(session):
+    records = session.info.pop("audit", None)
+    if records:
+        publish(session.info.get("tenant"), records)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard(session, previous_transaction):
+    if not session.in_transaction():
+        session.info.pop("audit", None)
+
+def write(tenant: str | None, records: List[dict]):
+    db = session_for(tenant)
+    try:
+        db.execute(models.AuditLog.__table__.insert(), records)
+        db.commit()
+    finally:
+        db.close()
+
+def publish(tenant: str | None, records: List[dict]):
+    metrics.inc("audit_records_total", len(records))
+    if writer is None: # scripts and tests without the lifespan
+        write(tenant, records)
+        return
+    try:
+        writer.queue.put_nowait((tenant, records))
+    except queue.Full:
+        metrics.inc("audit_queue_full_total")
+        write(tenant, records)
+
+class AuditWriter(threading.Thread):
+    """Drains the audit queue, appending up to AUDIT_BATCH_SIZE records per transaction."""
+
+    def __init__(self):
+        super().__init__(name="audit-writer", daemon=True)
+        self.queue: queue.Queue = queue.Queue(maxsize=settings.AUDIT_QUEUE_SIZE)
+        self.batch_size = settings.AUDIT_BATCH_SIZE
+        self.interval = settings.AUDIT_FLUSH_INTERVAL_SECONDS
+        self._stop_event = threading.Event()
+
+    def _collect(self) -> Dict[str | None, List[dict]]:
+        by_tenant, count = {}, 0
+        deadline = time.monotonic() + self.interval
+        while count < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                tenant, records = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            by_tenant.setdefault(tenant, []).extend(records)
+            count += len(records)
+        return by_tenant
+
+    def run(self):
+        # Keeps draining after stop() so committed records are not lost on shutdown
+        while not (self._stop_event.is_set() and self.queue.empty()):
+            for tenant, records in self._collect().items():
+                self._write(tenant, records)
+
+    def _write(self, tenant: str | None, records: List[dict]):
+        for attempt in range(3):
+            try:
+                write(tenant, records)
+            except Exception:
+                logger.exception("Writing %d audit records failed (attempt %d)", len(records), attempt + 1)
+                time.sleep(0.5 * 2 ** attempt)
+                continue
+            metrics.inc("audit_batches_total")
+            metrics.inc("audit_written_total", len(records))
+            metrics.set_gauge("audit_lag_seconds", (datetime.utcnow() - records[0]["occurred_at"]).total_seconds())
+            return
+        # Last resort: keep the trail in the application log
+        metrics.inc("audit_write_failures_total", len(records))
+        for record in records:
+            logger.error("Unwritten audit record: %s", _jsonable(record))
+
+    def stop(self, timeout: float = 10):
+        self._stop_event.set()
+        self.join(timeout)
+
+writer: AuditWriter | None = None
+
+metrics.describe("audit_records_total", "counter", "Audit records captured from committed transactions")
+metrics.describe("audit_written_total", "counter", "Audit records appended by the writer thread")
+metrics.describe("audit_batches_total", "counter", "Audit write transactions by the writer thread")
+metrics.describe("audit_queue_full_total", "counter", "Commits that wrote their audit records inline because the queue was full")
+metrics.describe("audit_write_failures_total", "counter", "Audit records the writer gave up on (logged instead)")
+metrics.describe("audit_lag_seconds", "gauge", "Age of the oldest record in the last written batch")
+metrics.gauge_callback("audit_queue_depth", lambda: {(): writer.queue.qsize() if writer is not None else 0})
+
+@audit_router.get("/audit", response_model=List[schemas.AuditEntry], dependencies=[Depends(role_required([models.Role.admin]))])
+async def list_audit_entries(
+    entity: str = Query(..., description="One of " + ", ".join(AUDITED)),
+    entity_id: int | None = Query(None),
+    since: datetime | None = Query(None),
+    until: datetime | None = Query(None, description="Exclusive"),
+    before_id: int | None = Query(None, description="Next page: the last id of the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    if entity not in AUDITED:
+        raise HTTPException(status_code=400, detail=f"Unknown entity. Must be among {sorted(AUDITED)}")
+    log = models.AuditLog
+    # Served by ix_audit_log_entity_time / ix_audit_log_entity_id_time, newest first
+    query = select(log).where(log.entity == entity)
+    if entity_id is not None:
+        query = query.where(log.entity_id == entity_id)
+    if since is not None:
+        query = query.where(log.occurred_at >= since)
+    if until is not None:
+        query = query.where(log.occurred_at < until)
+    if before_id is not None:
+        cursor = db.get(log, before_id)
+        if cursor is None:
+            raise HTTPException(status_code=400, detail="Unknown before_id")
+        query = query.where(tuple_(log.occurred_at, log.id) < tuple_(cursor.occurred_at, cursor.id))
+    entries = db.scalars(query.order_by(log.occurred_at.desc(), log.id.desc()).limit(limit)).all()
+    return [
+        {"id": e.id, "occurred_at": e.occurred_at, "entity": e.entity, "entity_id": e.entity_id,
+         "action": e.action, "actor": e.actor, "changes": json.loads(e.changes)}
+        for e in entries
+    ]
@@ -0,0 +1,153 @@
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.absence import load_states, recompute_states, write_states
+from app.config import settings
+from app.search import SEARCHABLE, _document, index_documents
+
+# Data changes on big tables run here, not inside alembic revisions: a
+# revision adds the nullable column (fast DDL), a registered backfill fills it
+# in primary-key chunks that each commit with their checkpoint, and a later
+# revision tightens constraints. `python -m app.backfill run <name>` resumes
+# from the last committed chunk after an interruption.
+
+class BackfillError(Exception):
+    pass
+
+@dataclass
+class Backfill:
+    name: str
+    model: type
+    apply: Callable[[Session, List[int]], None] # processes one chunk of primary keys
+    description: str = ""
+
+BACKFILLS: Dict[str, Backfill] = {}
+
+def backfill(name: str, model, description: str = ""):
+    def register(func: Callable[[Session, List[int]], None]):
+        BACKFILLS[name] = Backfill(name, model, func, description)
+        return func
+    return register
+
+def _checkpoint(db: Session, name: str, restart: bool) -> models.BackfillCheckpoint:
+    checkpoint = db.get(models.BackfillCheckpoint, name)
+    if checkpoint is None or restart:
+        if checkpoint is not None:
+            db.delete(checkpoint)
+            db.flush()
+        checkpoint = models.BackfillCheckpoint(name=name, last_id=0, rows_done=0, status="running")
+        db.add(checkpoint)
+        db.commit()
+    return checkpoint
+
+def run_backfill(db: Session, name: str, chunk_size: int | None = None, throttle: float | None = None,
+                 restart: bool = False, log=print) -> int:
+    """Run (or resume) a registered backfill; returns the rows processed by this run."""
+    if name not in BACKFILLS:
+        raise BackfillError(f"Unknown backfill {name!r}; known: {sorted(BACKFILLS)}")
+    job = BACKFILLS[name]
+    chunk_size = chunk_size or settings.BACKFILL_CHUNK_SIZE
+    throttle = settings.BACKFILL_THROTTLE_RATIO if throttle is None else throttle
+    checkpoint = _checkpoint(db, name, restart)
+    if checkpoint.status == "finished":
+        log(f"{name}: already finished ({checkpoint.rows_done} rows); use --restart to run again")
+        return 0
+
+    pk = job.model.__table__.primary_key.columns.values()[0]
+    remaining = db.scalar(select(func.count()).select_from(job.model).where(pk > checkpoint.last_id))
+    processed, started = 0, time.monotonic()
+    while True:
+        chunk_started = time.monotonic()
+        ids = list(db.scalars(select(pk).where(pk > checkpoint.last_id).order_by(pk).limit(chunk_size)))
+        if not ids:
+            break
+        job.apply(db, ids)
+        # The checkpoint commits with the chunk, so a crash never skips or repeats work
+        checkpoint.last_id = ids[-1]
+        checkpoint.rows_done += len(ids)
+        checkpoint.updated_at = datetime.utcnow()
+        db.commit()
+        processed += len(ids)
+
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed else 0
+        eta = (remaining - processed) / rate if rate and remaining > processed else 0
+        log(f"{name}: {processed}/{remaining} rows ({processed * 100 // max(remaining, 1)}%), {rate:,.0f} rows/s, eta {eta:.0f}s, last id {ids[-1]}")
+        # Give other writers a share of the database proportional to our own use
+        if throttle:
+            time.sleep((time.monotonic() - chunk_started) * throttle)
+
+    checkpoint.status, checkpoint.finished_at = "finished", datetime.utcnow()
+    db.commit()
+    log(f"{name}: finished, {checkpoint.rows_done} rows in total")
+    return processed
+
+def create_index_online(connection, index):
+    """Build an index without blocking writes where the database allows it.
+
+    Postgres uses CREATE INDEX CONCURRENTLY (outside a transaction); SQLite has
+    no online variant, so the index is built in one short-as-possible statement.
+    In an alembic revision: `with op.get_context().autocommit_block(): create_index_online(op.get_bind(), index)`.
+    """
+    if connection.dialect.name == "postgresql":
+        index.dialect_options["postgresql"]["concurrently"] = True
+    index.create(connection, checkfirst=True)
+
+# Search documents for rows that predate the index or were bulk-loaded around it
+def _search_backfill(model):
+    def apply(db: Session, ids: List[int]):
+        rows = db.query(model).filter(model.id.in_(ids)).all()
+        index_documents(db.connection(), [_document(row) for row in rows])
+    return apply
+
+for _model, _entity in SEARCHABLE.items():
+    backfill(f"search-index-{_entity}s", _model, f"Re-index {_model.__tablename__} into the search table")(_search_backfill(_model))
+
+@backfill("attendance-states", models.Student, "Recompute absence streaks and attendance windows from history")
+def _attendance_states(db: Session, ids: List[int]):
+    # Historical flags are recorded but not mailed
+    connection = db.connection()
+    write_states(connection, recompute_states(connection, ids, load_states(connection, ids)))
+
+if __name__ == "__main__":
+    # `python -m app.backfill list`, `... status`,
+    # `... run <name> [--chunk-size N] [--throttle R] [--restart] [--tenant ID]`
+    import argparse
+    import sys
+    from app.database import session_for
+
+    parser = argparse.ArgumentParser(prog="python -m app.backfill")
+    parser.add_argument("command", choices=["list", "status", "run"])
+    parser.add_argument("name", nargs="?")
+    parser.add_argument("--chunk-size", type=int)
+    parser.add_argument("--throttle", type=float, help="sleep this fraction of each chunk's run time")
+    parser.add_argument("--restart", action="store_true", help="ignore the saved checkpoint")
+    parser.add_argument("--tenant", help="school database to run against when tenancy is enabled")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for item in BACKFILLS.values():
+            print(f"{item.name:28} {item.description}")
+        sys.exit(0)
+    session = session_for(args.tenant)
+    try:
+        if args.command == "status":
+            for checkpoint in session.query(models.BackfillCheckpoint).order_by(models.BackfillCheckpoint.name):
+                print(f"{checkpoint.name:28} {checkpoint.status:9} {checkpoint.rows_done} rows, last id {checkpoint.last_id}, updated {checkpoint.updated_at:%Y-%m-%d %H:%M:%S}")
+        elif not args.name:
+            parser.error("run needs a backfill name")
+        else:
+            run_backfill(session, args.name, args.chunk_size, args.throttle, args.restart)
+    except BackfillError as exc:
+        sys.exit(str(exc))
+    except KeyboardInterrupt:
+        session.rollback()
+        sys.exit("Interrupted; the next run resumes from the last committed chunk")
+    finally:
+        session.close()
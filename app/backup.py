@@ -0,0 +1,243 @@
+import glob
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from sqlalchemy.engine import make_url
+
+from app.config import settings
+from app.database import tenant_database
+from app.jobs import JobContext, job_kind
+
+# Hot backups of SQLite databases with the online backup API. The copy runs
+# BACKUP_PAGES_PER_STEP pages at a time and sleeps in between. Each step holds
+# a shared lock, so writers only wait for one step, not the whole copy. A
+# commit from another connection restarts the copy; each restart quadruples
+# the step, and after BACKUP_MAX_RESTARTS the database is copied in a single
+# step, so a busy database still gets its snapshot. Every snapshot gets a manifest with its checksum, schema
+# revision and per-table row counts. verify() checks a (restored) snapshot
+# against that manifest.
+
+class BackupError(Exception):
+    pass
+
+def database_path(tenant: str | None = None) -> str:
+    url = make_url(tenant_database(tenant)[0] if tenant else settings.DATABASE_URL)
+    if url.get_backend_name() != "sqlite" or not url.database or url.database == ":memory:":
+        raise BackupError("Online backup supports SQLite file databases only; use pg_dump for Postgres")
+    return os.path.abspath(url.database)
+
+def _prefix(tenant: str | None) -> str:
+    return f"{tenant or 'default'}-"
+
+def _pattern(tenant: str | None) -> str:
+    # The timestamp digits keep tenant "a" from matching tenant "a-b"'s snapshots
+    return glob.escape(_prefix(tenant)) + "[0-9]" * 8 + "T*.db"
+
+def _copy(source: str, target: str, pages: int, pause: float, max_restarts: int) -> dict:
+    stats = {"steps": 0, "restarts": 0, "longest_step_seconds": 0.0, "pages": 0}
+    last = {"remaining": None, "at": time.perf_counter()}
+
+    def progress(status, remaining, total):
+        # Called between steps, with no lock held on the source
+        stats["longest_step_seconds"] = max(stats["longest_step_seconds"], time.perf_counter() - last["at"])
+        stats["steps"] += 1
+        stats["pages"] = total
+        restarted = last["remaining"] is not None and remaining > last["remaining"]
+        last["remaining"] = remaining
+        if restarted: # another connection committed; the copy starts over
+            stats["restarts"] += 1
+            raise _Restarted()
+        if remaining:
+            time.sleep(pause) # sqlite3's own sleep= only applies when a step is busy
+        last["at"] = time.perf_counter()
+
+    src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    try:
+        dst = sqlite3.connect(target)
+        try:
+            while True:
+                # Each restart quadruples the step so busy databases converge; the last attempt is one step
+                step = pages if stats["restarts"] < max_restarts and pages > 0 else -1
+                last["remaining"], last["at"] = None, time.perf_counter()
+                try:
+                    src.backup(dst, pages=step, progress=progress)
+                    break
+                except _Restarted:
+                    pages *= 4
+            stats["final_pages_per_step"] = step
+        finally:
+            dst.close()
+    finally:
+        src.close()
+    return stats
+
+class _Restarted(Exception):
+    pass
+
+def _inspect(path: str) -> dict:
+    """Integrity check, schema revision and row counts of a plain (uncompressed) snapshot."""
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        integrity = [row[0] for row in connection.execute("PRAGMA integrity_check")]
+        tables = [row[0] for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )]
+        counts = {table: connection.execute(f'SELECT count(*) FROM "{table}"').fetchone()[0] for table in tables}
+        revision = connection.execute("SELECT version_num FROM alembic_version").fetchone() if "alembic_version" in tables else None
+        return {"integrity": integrity[:20], "ok": integrity == ["ok"], "revision": revision[0] if revision else None, "row_counts": counts}
+    finally:
+        connection.close()
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _compress(path: str, level: int) -> str:
+    target = path + ".gz"
+    with open(path, "rb") as src, gzip.open(target + ".partial", "wb", compresslevel=level) as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+    os.replace(target + ".partial", target)
+    os.remove(path)
+    return target
+
+def backup(tenant: str | None = None, directory: str | None = None, compress: bool | None = None,
+           verify_copy: bool = True, phase: Callable[[float], None] | None = None) -> dict:
+    """Snapshot the database into directory; returns the manifest (also written next to the snapshot)."""
+    phase = phase or (lambda fraction: None)
+    source = database_path(tenant)
+    directory = os.path.abspath(directory or settings.BACKUP_DIR)
+    compress = settings.BACKUP_COMPRESS if compress is None else compress
+    os.makedirs(directory, exist_ok=True)
+    name = _prefix(tenant) + datetime.utcnow().strftime("%Y%m%dT%H%M%S%fZ") + ".db"
+    path = os.path.join(directory, name)
+
+    started = time.perf_counter()
+    try:
+        copy = _copy(source, path + ".partial", settings.BACKUP_PAGES_PER_STEP,
+                     settings.BACKUP_STEP_PAUSE_SECONDS, settings.BACKUP_MAX_RESTARTS)
+        os.replace(path + ".partial", path)
+        copied = time.perf_counter()
+        phase(0.6)
+        report = _inspect(path)
+        if verify_copy and not report["ok"]:
+            raise BackupError(f"Snapshot failed its integrity check: {report['integrity']}")
+        phase(0.7)
+        if compress:
+            path = _compress(path, settings.BACKUP_COMPRESS_LEVEL)
+    except BaseException:
+        for leftover in (path, path + ".partial", path + ".gz.partial"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+    manifest = {
+        "snapshot": os.path.basename(path),
+        "tenant": tenant,
+        "source": source,
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "compressed": compress,
+        "size_bytes": os.path.getsize(path),
+        "sha256": _sha256(path),
+        "revision": report["revision"],
+        "row_counts": report["row_counts"],
+        "copy_seconds": round(copied - started, 3),
+        "total_seconds": round(time.perf_counter() - started, 3),
+        **{key: round(value, 4) if isinstance(value, float) else value for key, value in copy.items()},
+    }
+    with open(path + ".json", "w") as f:
+        json.dump(manifest, f, indent=2)
+    phase(0.9)
+    manifest["pruned"] = prune(tenant, directory)
+    return manifest
+
+def snapshots(tenant: str | None = None, directory: str | None = None) -> List[str]:
+    """Completed snapshots for the tenant, newest first."""
+    directory = os.path.abspath(directory or settings.BACKUP_DIR)
+    pattern = os.path.join(glob.escape(directory), _pattern(tenant))
+    return sorted(glob.glob(pattern) + glob.glob(pattern + ".gz"), reverse=True)
+
+def prune(tenant: str | None = None, directory: str | None = None, keep: int | None = None) -> List[str]:
+    keep = settings.BACKUP_KEEP if keep is None else keep
+    removed = []
+    for path in snapshots(tenant, directory)[max(keep, 1):]:
+        for leftover in (path, path + ".json"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        removed.append(os.path.basename(path))
+    return removed
+
+def verify(path: str) -> dict:
+    """Restore a snapshot to a scratch file and check it against its manifest."""
+    manifest_path = path + ".json"
+    manifest = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    problems = []
+    if manifest and _sha256(path) != manifest["sha256"]:
+        problems.append("checksum differs from the manifest")
+    scratch = None
+    try:
+        if path.endswith(".gz"):
+            scratch = path[:-3] + ".verify"
+            with gzip.open(path, "rb") as src, open(scratch, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+        report = _inspect(scratch or path)
+    finally:
+        if scratch and os.path.exists(scratch):
+            os.remove(scratch)
+    if not report["ok"]:
+        problems.append(f"integrity check: {report['integrity']}")
+    if manifest:
+        if report["revision"] != manifest["revision"]:
+            problems.append(f"schema revision {report['revision']} != {manifest['revision']}")
+        differing = {table: [expected, report["row_counts"].get(table)] for table, expected in manifest["row_counts"].items()
+                     if report["row_counts"].get(table) != expected}
+        if differing:
+            problems.append(f"row counts differ (manifest, restored): {differing}")
+    return {"snapshot": os.path.basename(path), "ok": not problems, "problems": problems,
+            "has_manifest": manifest is not None, "revision": report["revision"], "row_counts": report["row_counts"]}
+
+@job_kind("database_backup")
+def database_backup(ctx: JobContext, params: dict) -> str:
+    """Hot backup of this school's database. Params: optional ``compress`` (bool)."""
+    # Progress is only written between phases: a write to this database during the copy would restart it
+    manifest = backup(ctx.db.info.get("tenant"), compress=params.get("compress"),
+                      phase=lambda fraction: ctx.progress(fraction, force=True))
+    path = ctx.result_path("json")
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return path
+
+if __name__ == "__main__":
+    # `python -m app.backup create [--tenant ID] [--dir DIR] [--no-compress]`, `verify PATH`, `list`
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m app.backup")
+    parser.add_argument("command", choices=["create", "verify", "list"])
+    parser.add_argument("path", nargs="?", help="snapshot to verify (default: the newest)")
+    parser.add_argument("--tenant")
+    parser.add_argument("--dir")
+    parser.add_argument("--no-compress", action="store_true")
+    args = parser.parse_args()
+    if args.command == "create":
+        result: Dict | List = backup(args.tenant, args.dir, compress=False if args.no_compress else None)
+    elif args.command == "list":
+        result = [os.path.basename(path) for path in snapshots(args.tenant, args.dir)]
+    else:
+        target = args.path or next(iter(snapshots(args.tenant, args.dir)), None)
+        if target is None:
+            parser.error("no snapshots to verify")
+        result = verify(target)
+    print(json.dumps(result, indent=2))
+    if isinstance(result, dict) and result.get("ok") is False:
+        raise SystemExit(1)
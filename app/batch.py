@@ -0,0 +1,137 @@
+import json
+import time
+from contextlib import AsyncExitStack
+from typing import List
+from urllib.parse import urlsplit
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.config import settings
+from app.database import batch_session, get_db
+from app.dependencies import batch_user, get_current_user
+
+batch_router = APIRouter()
+
+ALLOWED_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE"}
+
+class AtomicBatchSession(Session):
+    """Session for all-or-nothing batches: endpoint commits only flush, the batch commits once."""
+
+    def commit(self):
+        self.flush()
+
+    def commit_batch(self):
+        super().commit()
+
+async def _dispatch(request: Request, operation: schemas.BatchOperation) -> schemas.BatchResult:
+    url = urlsplit(operation.path)
+    body = b"" if operation.body is None else json.dumps(operation.body).encode()
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    if "authorization" in request.headers:
+        headers.append((b"authorization", request.headers["authorization"].encode()))
+    scope = {
+        "type": "http",
+        "asgi": request.scope.get("asgi", {"version": "3.0"}),
+        "http_version": request.scope.get("http_version", "1.1"),
+        "method": operation.method.upper(),
+        "scheme": request.scope.get("scheme", "http"),
+        "server": request.scope.get("server"),
+        "client": request.scope.get("client"),
+        "root_path": request.scope.get("root_path", ""),
+        "path": url.path,
+        "raw_path": url.path.encode(),
+        "query_string": url.query.encode(),
+        "headers": headers,
+        "app": request.app,
+        "state": request.scope.get("state", {}),
+        # HTTPException & co. are rendered by the app's handlers, as for a normal request
+        "starlette.exception_handlers": request.scope.get("starlette.exception_handlers"),
+    }
+    received = False
+    async def receive():
+        nonlocal received
+        if received:
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    status_code, chunks, content_type = 500, [], ""
+    async def send(message):
+        nonlocal status_code, content_type
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+            content_type = dict(message.get("headers", [])).get(b"content-type", b"").decode()
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    # Sub-requests go straight to the router: the batch already passed
+    # admission and auth_middleware, so those run once per batch.
+    try:
+        async with AsyncExitStack() as stack:
+            scope["fastapi_middleware_astack"] = stack
+            scope["fastapi_astack"] = stack
+            await request.app.router(scope, receive, send)
+    except Exception:
+        return schemas.BatchResult(id=operation.id, status=500, body={"detail": "Internal Server Error"})
+    raw = b"".join(chunks)
+    if content_type.startswith("application/json") and raw:
+        result_body = json.loads(raw)
+    else:
+        result_body = raw.decode(errors="replace") or None
+    return schemas.BatchResult(id=operation.id, status=status_code, body=result_body)
+
+def _skipped(operation: schemas.BatchOperation, status_code: int, detail: str) -> schemas.BatchResult:
+    return schemas.BatchResult(id=operation.id, status=status_code, body={"detail": detail})
+
+@batch_router.post("/batch", response_model=schemas.BatchResponse)
+async def run_batch(
+    batch: schemas.BatchRequest,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    if not batch.operations:
+        raise HTTPException(status_code=400, detail="Batch has no operations")
+    if len(batch.operations) > settings.BATCH_MAX_OPERATIONS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.BATCH_MAX_OPERATIONS} operations per batch")
+    for operation in batch.operations:
+        if operation.method.upper() not in ALLOWED_METHODS:
+            raise HTTPException(status_code=400, detail=f"Unsupported method {operation.method}")
+        if not operation.path.startswith("/") or urlsplit(operation.path).path.rstrip("/") == "/batch":
+            raise HTTPException(status_code=400, detail=f"Invalid batch path {operation.path}")
+
+    session = AtomicBatchSession(bind=db.get_bind(), autoflush=False, info=dict(db.info)) if batch.atomic else db
+    deadline = time.monotonic() + settings.BATCH_TIMEOUT_SECONDS
+    results: List[schemas.BatchResult] = []
+    failed = False
+    session_token, user_token = batch_session.set(session), batch_user.set(current_user)
+    try:
+        for operation in batch.operations:
+            if failed and batch.atomic:
+                results.append(_skipped(operation, 424, "Skipped: an earlier operation failed"))
+                continue
+            if time.monotonic() > deadline:
+                failed = True
+                results.append(_skipped(operation, 504, "Skipped: batch time limit exceeded"))
+                continue
+            result = await _dispatch(request, operation)
+            results.append(result)
+            if result.status >= 400:
+                failed = True
+                # Drop whatever the failed operation left pending; earlier commits stand
+                if not batch.atomic:
+                    session.rollback()
+        committed = not (batch.atomic and failed)
+        if batch.atomic:
+            if committed:
+                session.commit_batch()
+            else:
+                session.rollback()
+    finally:
+        batch_session.reset(session_token)
+        batch_user.reset(user_token)
+        if batch.atomic:
+            session.close()
+    return {"results": results, "committed": committed}
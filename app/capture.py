@@ -0,0 +1,183 @@
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode
+
+from app import metrics
+from app.config import settings
+from app.dependencies import capture_caller
+
+logger = logging.getLogger(__name__)
+
+# Opt-in production traffic capture (TRAFFIC_CAPTURE_ENABLED) for
+# benchmarks/replay.py. Each sampled request becomes one JSON line with its
+# arrival time, duration, route, status, the caller's role, a pseudonym for
+# the caller, and the sanitised query and body. Authorization and cookies are
+# never recorded. Passwords, tokens and secrets in bodies and query strings are
+# masked. A writer thread appends the lines to gzip files under
+# TRAFFIC_CAPTURE_DIR and rotates them by size and age. Requests only pay for
+# a queue put; when the queue is full the record is dropped and counted.
+
+SENSITIVE = ("password", "token", "secret", "authorization")
+MASK = "***"
+KEPT_HEADERS = (b"content-type", b"accept", b"accept-encoding", b"host")
+SKIPPED_PATHS = ("/docs", "/openapi.json", "/metrics")
+
+def pseudonym(subject: str) -> str:
+    # Stable per user within a deployment, so replays can keep one session per caller
+    return hashlib.sha256(f"{settings.SECRET_KEY}:{subject}".encode()).hexdigest()[:12]
+
+def _sensitive(key: str) -> bool:
+    key = key.lower()
+    return any(word in key for word in SENSITIVE)
+
+def sanitise(value):
+    if isinstance(value, dict):
+        return {k: MASK if _sensitive(str(k)) else sanitise(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [sanitise(v) for v in value]
+    return value
+
+def _sanitise_pairs(raw: str) -> str:
+    return urlencode([(k, MASK if _sensitive(k) else v) for k, v in parse_qsl(raw, keep_blank_values=True)])
+
+def sanitise_body(content_type: str, body: bytes):
+    """(kind, value) for the record: "json", "form", or "omitted" with the size."""
+    if not body:
+        return None, None
+    if len(body) > settings.TRAFFIC_CAPTURE_MAX_BODY_BYTES:
+        return "omitted", len(body)
+    if content_type.startswith("application/json"):
+        try:
+            return "json", sanitise(json.loads(body))
+        except ValueError:
+            return "omitted", len(body)
+    if content_type.startswith("application/x-www-form-urlencoded"):
+        return "form", _sanitise_pairs(body.decode("latin-1"))
+    return "omitted", len(body) # multipart uploads and the like
+
+class CaptureWriter(threading.Thread):
+    """Appends records to <dir>/traffic-<pid>-<start>-<n>.jsonl.gz, rotating by size and age."""
+
+    def __init__(self, directory: str | None = None):
+        super().__init__(name="traffic-capture", daemon=True)
+        self.directory = os.path.abspath(directory or settings.TRAFFIC_CAPTURE_DIR)
+        self.queue: queue.Queue = queue.Queue(maxsize=settings.TRAFFIC_CAPTURE_QUEUE_SIZE)
+        self._stop_event = threading.Event()
+        self._file = None
+        self._path = None
+        self._written = 0
+        self._opened_at = 0.0
+        self._sequence = 0
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._sequence += 1 # two rotations within a second must not share a name
+        name = f"traffic-{os.getpid()}-{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{self._sequence}.jsonl.gz"
+        self._path = os.path.join(self.directory, name)
+        # Written as .partial and renamed on rotation, so readers only see complete files
+        self._file = gzip.open(self._path + ".partial", "wt", compresslevel=6)
+        self._written, self._opened_at = 0, time.monotonic()
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            os.replace(self._path + ".partial", self._path)
+            self._file = None
+            self._prune()
+
+    def _prune(self):
+        files = sorted(glob.glob(os.path.join(glob.escape(self.directory), "traffic-*.jsonl.gz")), key=os.path.getmtime)
+        for path in files[:-settings.TRAFFIC_CAPTURE_KEEP_FILES or None]:
+            os.remove(path)
+
+    def run(self):
+        while not (self._stop_event.is_set() and self.queue.empty()):
+            try:
+                record = self.queue.get(timeout=1)
+            except queue.Empty:
+                record = None
+            try:
+                if record is not None:
+                    if self._file is None:
+                        self._open()
+                    line = json.dumps(record, separators=(",", ":"), default=str) + "\n"
+                    self._file.write(line)
+                    self._written += len(line)
+                if self._file is not None and (
+                    self._written >= settings.TRAFFIC_CAPTURE_ROTATE_MB * 1_000_000
+                    or time.monotonic() - self._opened_at >= settings.TRAFFIC_CAPTURE_ROTATE_SECONDS
+                ):
+                    self._close()
+            except Exception:
+                logger.exception("Traffic capture write failed")
+        self._close()
+
+    def stop(self, timeout: float = 10):
+        self._stop_event.set()
+        self.join(timeout)
+
+writer: CaptureWriter | None = None
+
+metrics.describe("traffic_capture_records_total", "counter", "Requests recorded for replay")
+metrics.describe("traffic_capture_dropped_total", "counter", "Sampled requests dropped because the capture queue was full")
+
+class TrafficCaptureMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or writer is None or scope["path"] in SKIPPED_PATHS
+                or random.random() >= settings.TRAFFIC_CAPTURE_SAMPLE_RATE):
+            return await self.app(scope, receive, send)
+        started_at, started = time.time(), time.perf_counter()
+        chunks, status = [], {"code": None}
+        caller = {}
+        capture_caller.set(caller) # get_current_user fills in the role
+
+        async def recording_receive():
+            message = await receive()
+            if message["type"] == "http.request" and settings.TRAFFIC_CAPTURE_BODIES:
+                chunks.append(message.get("body", b""))
+            return message
+
+        async def recording_send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, recording_receive, recording_send)
+        finally:
+            headers = {name.decode("latin-1"): value.decode("latin-1")
+                       for name, value in scope["headers"] if name in KEPT_HEADERS}
+            body_kind, body = sanitise_body(headers.get("content-type", ""), b"".join(chunks))
+            route = scope.get("route")
+            claims = scope.get("state", {}).get("claims") # set by auth_middleware
+            record = {
+                "t": round(started_at, 6),
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(route, "path", None),
+                "query": _sanitise_pairs(scope.get("query_string", b"").decode("latin-1")),
+                "headers": headers,
+                "status": status["code"],
+                "role": caller.get("role"),
+                "authenticated": bool(claims),
+                "actor": pseudonym(claims["sub"]) if claims and claims.get("sub") else None,
+                "body_kind": body_kind,
+                "body": body,
+            }
+            try:
+                writer.queue.put_nowait(record)
+                metrics.inc("traffic_capture_records_total")
+            except queue.Full:
+                metrics.inc("traffic_capture_dropped_total")
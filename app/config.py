@@ -1,19 +1,124 @@
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     SECRET_KEY: str
     DATABASE_URL: str = "sqlite:///./sql_app.db"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+    REFRESH_REVOCATION_SYNC_SECONDS: float = 30.0
     EMAIL_HOST: str = 'smtp.gmail.com'
     EMAIL_PORT: int = 587
     EMAIL_USERNAME: str
     EMAIL_PASSWORD: str
     EMAIL_FROM: str
+    EMAIL_USE_SSL: bool = True
+    EMAIL_STARTTLS: bool = False
+    EMAIL_USE_CREDENTIALS: bool = True
     USE_EMAIL_VERIFICATION: bool = True
+    APP_BASE_URL: str = "http://localhost:8000"
+    OUTBOX_WORKER_ENABLED: bool = True
+    OUTBOX_BATCH_SIZE: int = 50
+    OUTBOX_POLL_INTERVAL_SECONDS: float = 2.0
+    OUTBOX_MAX_ATTEMPTS: int = 6
+    OUTBOX_RETRY_BASE_SECONDS: int = 30
+    GZIP_MINIMUM_SIZE: int = 1024 # bytes; smaller responses are sent uncompressed
+    TENANCY_ENABLED: bool = False
+    # "{tenant}" is replaced by the school id, e.g. sqlite:///./tenants/{tenant}.db; when
+    # empty each school is a tenant_<id> schema in DATABASE_URL (Postgres)
+    TENANT_DATABASE_URL: str = ""
+    TENANT_IDS: str = "" # comma-separated; only needed when tenants can't be discovered
+    TENANT_HOST_SUFFIX: str = "" # e.g. ".schools.example.com" -> greenfield.schools.example.com
+    TENANT_ENGINE_CACHE_SIZE: int = 32
+    TENANT_POOL_SIZE: int = 2
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_MONITOR_INTERVAL_SECONDS: float = 0.05
+    LOOP_STALL_THRESHOLD_SECONDS: float = 0.1
+    LOOP_BLOCKING_STRICT: bool = False # tests: a request that blocks the loop raises
+    ADMISSION_CONTROL_ENABLED: bool = True
+    ADMISSION_AUTH_CONCURRENCY: int = 4
+    ADMISSION_WRITE_CONCURRENCY: int = 16
+    ADMISSION_READ_CONCURRENCY: int = 32
+    ADMISSION_BULK_READ_CONCURRENCY: int = 4
+    ADMISSION_QUEUE_FACTOR: int = 4 # queue length per class = factor * concurrency
+    ADMISSION_MAX_WAIT_SECONDS: float = 2.0
+    OWNERSHIP_SYNC_SECONDS: float = 2.0 # how often each worker reads other workers' ownership changes; bounds their staleness
+    OWNERSHIP_SYNC_OVERLAP_SECONDS: float = 10.0 # each read re-covers this much of the previous one (commit lag, clock skew)
+    OWNERSHIP_REFRESH_SECONDS: float = 600.0 # full reload interval, a safety net
+    OWNERSHIP_CHANGE_RETENTION_SECONDS: int = 3600 # ownership_changes rows kept; workers further behind reload
+    ATTENDANCE_ABSENCE_STREAK: int = 3 # flag after this many consecutive absences
+    ATTENDANCE_WINDOW_DAYS: int = 20 # rolling window of marked days, at most 62
+    ATTENDANCE_MIN_RATE: float = 0.75 # flag below this share of present days in the window
+    ATTENDANCE_MIN_MARKED_DAYS: int = 10 # the rate only applies once the window has this many days
+    ATTENDANCE_ALERT_EMAILS: bool = False # queue a mail to the student's account when a flag is raised
+    FINANCE_VERIFY_WORKERS: int = 4
+    FINANCE_VERIFY_CHUNK_ROWS: int = 20000 # ids per verifier chunk
+    AUDIT_ENABLED: bool = True
+    AUDIT_QUEUE_SIZE: int = 10000 # commits waiting for the writer; when full, commits write their own records
+    AUDIT_BATCH_SIZE: int = 500 # records per writer transaction
+    AUDIT_FLUSH_INTERVAL_SECONDS: float = 1.0 # how long the writer gathers a batch
+    IDEMPOTENCY_ENABLED: bool = True
+    IDEMPOTENCY_TTL_HOURS: float = 24.0 # how long a stored response is replayed
+    IDEMPOTENCY_CACHE_SIZE: int = 5000 # stored responses kept in memory per worker
+    IDEMPOTENCY_MAX_BODY_BYTES: int = 1_000_000 # larger responses are not stored; retries run again
+    IDEMPOTENCY_WAIT_SECONDS: float = 10.0 # a duplicate waits this long for another worker's run before a 409
+    IDEMPOTENCY_LOCK_SECONDS: float = 120.0 # claims older than this are taken over (their worker died)
+    IDEMPOTENCY_PURGE_INTERVAL_SECONDS: float = 600.0
+    GROUP_COMMIT_ENABLED: bool = False
+    GROUP_COMMIT_WINDOW_MS: float = 2.0 # how long the writer waits for more rows after the first
+    GROUP_COMMIT_MAX_BATCH: int = 200
+    BATCH_MAX_OPERATIONS: int = 50
+    BATCH_TIMEOUT_SECONDS: float = 10.0 # checked between operations
+    ACADEMIC_YEAR_START_MONTH: int = 4 # academic years run from the 1st of this month
+    ARCHIVE_CHUNK_SIZE: int = 2000
+    ARCHIVE_CHUNK_PAUSE_SECONDS: float = 0.05 # lets other writers in between chunks
+    BACKFILL_CHUNK_SIZE: int = 1000
+    BACKFILL_THROTTLE_RATIO: float = 0.5 # sleep this fraction of each chunk's run time
+    JOB_DISPATCHER_ENABLED: bool = True
+    JOB_WORKERS: int = 2
+    JOB_POLL_INTERVAL_SECONDS: float = 1.0
+    JOB_RESULTS_DIR: str = "./job_results"
+    JOB_LEASE_SECONDS: int = 120 # running jobs without a heartbeat for this long are failed
+    BACKUP_DIR: str = "./backups"
+    BACKUP_PAGES_PER_STEP: int = 1024 # pages copied while holding the read lock; -1 copies in one step
+    BACKUP_STEP_PAUSE_SECONDS: float = 0.01 # writers get the database between steps
+    BACKUP_MAX_RESTARTS: int = 3 # then copy in one step
+    BACKUP_COMPRESS: bool = True
+    BACKUP_COMPRESS_LEVEL: int = 6
+    BACKUP_KEEP: int = 7 # snapshots kept per database
+    TRAFFIC_CAPTURE_ENABLED: bool = False # records sanitised requests for benchmarks/replay.py
+    TRAFFIC_CAPTURE_DIR: str = "./traffic"
+    TRAFFIC_CAPTURE_SAMPLE_RATE: float = 1.0 # fraction of requests recorded
+    TRAFFIC_CAPTURE_BODIES: bool = True
+    TRAFFIC_CAPTURE_MAX_BODY_BYTES: int = 65536 # larger bodies are recorded as their size only
+    TRAFFIC_CAPTURE_ROTATE_MB: int = 64 # uncompressed
+    TRAFFIC_CAPTURE_ROTATE_SECONDS: int = 3600
+    TRAFFIC_CAPTURE_KEEP_FILES: int = 48
+    TRAFFIC_CAPTURE_QUEUE_SIZE: int = 10000 # when full, records are dropped
+    SERVE_BIND: str = "0.0.0.0:8000"
+    SERVE_WORKERS: int = 0 # 0: one per available core
+    SERVE_THREADS: int = 0 # threadpool per worker for sync endpoints; 0: 4 per core, at least 8
+    SERVE_MAX_REQUESTS: int = 10000 # recycle a worker after this many requests; 0 disables
+    SERVE_MAX_REQUESTS_JITTER: int = 1000
+    SERVE_GRACEFUL_TIMEOUT_SECONDS: int = 30
+    SERVE_WORKER_TIMEOUT_SECONDS: int = 60
+    SERVE_KEEPALIVE_SECONDS: int = 5
+    SERVE_FORWARDED_ALLOW_IPS: str = "127.0.0.1"
+    SERVE_ACCESS_LOG: bool = False
     ALGORITHM: str = "HS256"
     BACKEND_CORS_ORIGINS: str
 
     class Config:
         env_file = ".env"
 
-settings = Settings()
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
+
+class _LazySettings:
+    # Defers reading the environment / .env until a setting is first used,
+    # so importing app modules (tests, CLI scripts, alembic) stays cheap.
+    def __getattr__(self, name):
+        return getattr(get_settings(), name)
+
+settings = _LazySettings()
@@ -1,15 +1,176 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+import glob
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import List, Tuple
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
 from app.config import settings
 
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+_listeners_lock = threading.Lock()
+_listeners_loaded = False
+
+class AppSession(Session):
+    """Loads app.listeners before the first session is used, in every process (web, job workers, scripts)."""
+
+    def __init__(self, *args, **kwargs):
+        global _listeners_loaded
+        if not _listeners_loaded:
+            # Not at import time: the listener modules import the models, routers and each other
+            with _listeners_lock:
+                if not _listeners_loaded:
+                    import app.listeners # noqa: F401
+                    _listeners_loaded = True
+        super().__init__(*args, **kwargs)
+
+SessionLocal = sessionmaker(class_=AppSession, autocommit=False, autoflush=False)
 
 Base = declarative_base()
 
+# Set by POST /batch so every sub-request shares the batch's session
+batch_session: ContextVar = ContextVar("batch_session", default=None)
+# School the current request belongs to; None means the default (control) database
+current_tenant: ContextVar = ContextVar("current_tenant", default=None)
+
+TENANT_ID = re.compile(r"[a-z0-9][a-z0-9_-]{0,62}")
+TENANT_SCHEMA_PREFIX = "tenant_"
+
+def _connect_args(url: str) -> dict:
+    # Sync dependencies and handlers run on different threadpool threads
+    return {"check_same_thread": False} if url.startswith("sqlite") else {}
+
+@lru_cache
+def get_engine():
+    engine = create_engine(settings.DATABASE_URL, connect_args=_connect_args(settings.DATABASE_URL))
+    SessionLocal.configure(bind=engine)
+    return engine
+
+def tenant_database(tenant: str) -> Tuple[str, str | None]:
+    """(url, schema) for a tenant: its own URL from the template, or a schema in DATABASE_URL."""
+    if not TENANT_ID.fullmatch(tenant):
+        raise ValueError(f"Invalid tenant id {tenant!r}")
+    if "{tenant}" in settings.TENANT_DATABASE_URL:
+        return settings.TENANT_DATABASE_URL.format(tenant=tenant), None
+    return settings.DATABASE_URL, TENANT_SCHEMA_PREFIX + tenant.replace("-", "_")
+
+def _create_tenant_engine(tenant: str):
+    url, schema = tenant_database(tenant)
+    options = {"connect_args": _connect_args(url)}
+    if not url.startswith("sqlite"):
+        # Many small pools instead of one big one; the LRU bounds how many exist
+        options.update(pool_size=settings.TENANT_POOL_SIZE, max_overflow=2)
+    engine = create_engine(url, **options)
+    if schema is not None:
+        @event.listens_for(engine, "connect")
+        def _set_search_path(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f'SET search_path TO "{schema}"')
+            cursor.close()
+            dbapi_connection.commit()
+    return engine
+
+class TenantEngines:
+    """Bounded LRU of per-tenant engines; the least recently used one is disposed when full."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._sessionmakers: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def sessionmaker(self, tenant: str) -> sessionmaker:
+        with self._lock:
+            factory = self._sessionmakers.get(tenant)
+            if factory is not None:
+                self._sessionmakers.move_to_end(tenant)
+                return factory
+        engine = _create_tenant_engine(tenant) # outside the lock: may connect
+        with self._lock:
+            if tenant in self._sessionmakers: # lost a race; keep the first engine
+                engine.dispose()
+                self._sessionmakers.move_to_end(tenant)
+                return self._sessionmakers[tenant]
+            self._sessionmakers[tenant] = sessionmaker(class_=AppSession, autocommit=False, autoflush=False, bind=engine)
+            evicted = self._sessionmakers.popitem(last=False)[1] if len(self._sessionmakers) > self.size else None
+        if evicted is not None:
+            # Checked-out connections stay usable; only the idle pool is closed
+            evicted.kw["bind"].dispose()
+        return self._sessionmakers[tenant]
+
+    def dispose(self):
+        with self._lock:
+            factories, self._sessionmakers = list(self._sessionmakers.values()), OrderedDict()
+        for factory in factories:
+            factory.kw["bind"].dispose()
+
+@lru_cache
+def get_tenant_engines() -> TenantEngines:
+    return TenantEngines(settings.TENANT_ENGINE_CACHE_SIZE)
+
+def list_tenants() -> List[str]:
+    if settings.TENANT_IDS:
+        return [t.strip() for t in settings.TENANT_IDS.split(",") if t.strip()]
+    template = settings.TENANT_DATABASE_URL
+    if "{tenant}" in template:
+        if not template.startswith("sqlite:///"):
+            return [] # per-tenant server databases can't be discovered; set TENANT_IDS
+        prefix, suffix = template[len("sqlite:///"):].split("{tenant}", 1)
+        paths = glob.glob(glob.escape(prefix) + "*" + glob.escape(suffix))
+        return sorted(p[len(prefix):len(p) - len(suffix)] for p in paths)
+    with get_engine().connect() as connection:
+        if connection.dialect.name != "postgresql":
+            return []
+        rows = connection.execute(text(
+            "SELECT schema_name FROM information_schema.schemata WHERE schema_name LIKE :prefix"
+        ), {"prefix": TENANT_SCHEMA_PREFIX.replace("_", "\\_") + "%"})
+        return sorted(name[len(TENANT_SCHEMA_PREFIX):] for (name,) in rows)
+
+_known = {"tenants": frozenset(), "listed_at": 0.0}
+
+def _relist_due(tenant: str) -> bool:
+    # Re-list at most every few seconds so unknown hosts can't force a scan per request
+    return tenant not in _known["tenants"] and time.monotonic() - _known["listed_at"] > 5
+
+def tenant_exists(tenant: str) -> bool:
+    if _relist_due(tenant):
+        _known["tenants"], _known["listed_at"] = frozenset(list_tenants()), time.monotonic()
+    return tenant in _known["tenants"]
+
+async def tenant_exists_async(tenant: str) -> bool:
+    """tenant_exists for the event loop: the re-list (a directory glob or a query) runs in the threadpool."""
+    if not _relist_due(tenant):
+        return tenant in _known["tenants"]
+    return await run_in_threadpool(tenant_exists, tenant)
+
+def tenants() -> List[str | None]:
+    """Databases background workers should visit: every tenant, or just the default one."""
+    return [None] + list_tenants() if settings.TENANCY_ENABLED else [None]
+
+def dialect_insert(connection, table):
+    """INSERT with the dialect's ON CONFLICT support (Postgres or SQLite)."""
+    if connection.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+def session_for(tenant: str | None = None):
+    if tenant is None or not settings.TENANCY_ENABLED:
+        get_engine()
+        return SessionLocal()
+    session = get_tenant_engines().sessionmaker(tenant)()
+    session.info["tenant"] = tenant # lets session events find the school's in-memory state
+    return session
+
 def get_db():
-    db = SessionLocal()
+    shared = batch_session.get()
+    if shared is not None:
+        yield shared # owned and closed by the batch
+        return
+    db = session_for(current_tenant.get())
     try:
         yield db
     finally:
@@ -1,3 +1,4 @@
+from contextvars import ContextVar
 from fastapi import Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from app import models
@@ -6,26 +7,38 @@ from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from fastapi.security import OAuth2PasswordBearer
 from app.config import settings # Import settings
+from app.tokens import revocations
 
-SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = "HS256"
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Set by POST /batch: sub-requests reuse the user authenticated for the batch
+batch_user: ContextVar = ContextVar("batch_user", default=None)
+
+# Set by app.capture for requests it records: the caller's role goes into the capture
+capture_caller: ContextVar = ContextVar("capture_caller", default=None)
+
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    user = batch_user.get()
+    if user is not None:
+        return user
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
-        if email is None:
+        if email is None or revocations.is_revoked(payload.get("fam")):
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     user = db.query(models.User).filter(models.User.email == email).first()
     if user is None:
         raise credentials_exception
+    caller = capture_caller.get()
+    if caller is not None:
+        caller["role"] = user.role.value
     return user
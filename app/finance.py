@@ -0,0 +1,281 @@
+import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Dict, List, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.orm import Session
+
+from app import archive, models, schemas
+from app.config import settings
+from app.database import current_tenant, dialect_insert, get_db, session_for
+from app.middleware import role_required
+
+finance_router = APIRouter()
+
+# How each normalised type moves the cash balance; other types are totalled but unclassified
+SIGNS = {"income": 1, "credit": 1, "expense": -1, "debit": -1}
+MONTH = re.compile(r"\d{4}-(0[1-9]|1[0-2])")
+TOLERANCE = 0.005 # snapshots accumulate float deltas; compare to the cent
+
+Totals = Dict[Tuple[str, str], List[float]] # (month, kind) -> [total, entries]
+
+def kind_of(value: str | None) -> str:
+    return (value or "").strip().lower()[:32] or "unspecified"
+
+def month_of(value: date) -> str:
+    return value.strftime("%Y-%m")
+
+def apply_deltas(connection, deltas: Totals):
+    """Add (month, kind) deltas to the snapshots and shift closing balances from each month on."""
+    snapshots, balances = models.FinanceSnapshot.__table__, models.FinanceBalance.__table__
+    net_by_month = defaultdict(float)
+    for (month, kind), (amount, entries) in deltas.items():
+        if not amount and not entries:
+            continue
+        statement = dialect_insert(connection, snapshots).values(month=month, kind=kind, total=amount, entries=entries)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=["month", "kind"],
+            set_={"total": snapshots.c.total + statement.excluded.total, "entries": snapshots.c.entries + statement.excluded.entries},
+        ))
+        net_by_month[month] += SIGNS.get(kind, 0) * amount
+    for month, net in net_by_month.items():
+        if not net:
+            continue
+        # A month's first row opens at the previous month's closing balance
+        previous = (select(balances.c.closing_balance).where(balances.c.month < month)
+                    .order_by(balances.c.month.desc()).limit(1).scalar_subquery())
+        connection.execute(dialect_insert(connection, balances)
+                           .values(month=month, net=0.0, closing_balance=func.coalesce(previous, 0.0))
+                           .on_conflict_do_nothing(index_elements=["month"]))
+        connection.execute(update(balances).where(balances.c.month == month).values(net=balances.c.net + net))
+        connection.execute(update(balances).where(balances.c.month >= month).values(closing_balance=balances.c.closing_balance + net))
+
+def _previous(state, name: str):
+    history = state.attrs[name].history
+    return history.deleted[0] if history.deleted else getattr(state.obj(), name)
+
+@event.listens_for(Session, "before_flush")
+def _track_school_transactions(session, flush_context, instances):
+    # Before the flush, so old values of updated and deleted rows can still be read;
+    # the deltas are written in the same transaction as the rows themselves
+    deltas: Totals = defaultdict(lambda: [0.0, 0])
+
+    def add(month_date, kind, amount, entries):
+        if month_date is None:
+            return
+        delta = deltas[(month_of(month_date), kind_of(kind))]
+        delta[0] += amount or 0.0
+        delta[1] += entries
+
+    for obj in session.new:
+        if isinstance(obj, models.SchoolTransaction):
+            add(obj.date, obj.type, obj.amount, 1)
+    for obj in session.dirty:
+        if isinstance(obj, models.SchoolTransaction) and session.is_modified(obj):
+            state = inspect(obj)
+            add(_previous(state, "date"), _previous(state, "type"), -(_previous(state, "amount") or 0.0), -1)
+            add(obj.date, obj.type, obj.amount, 1)
+    for obj in session.deleted:
+        if isinstance(obj, models.SchoolTransaction):
+            add(obj.date, obj.type, -(obj.amount or 0.0), -1)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+def _parse_month(value: str, name: str) -> str:
+    if not MONTH.fullmatch(value):
+        raise HTTPException(status_code=400, detail=f"{name} must be a month like 2024-05")
+    return value
+
+def _closing_before(db: Session, month: str) -> float:
+    return db.scalar(
+        select(models.FinanceBalance.closing_balance).where(models.FinanceBalance.month < month)
+        .order_by(models.FinanceBalance.month.desc()).limit(1)
+    ) or 0.0
+
+def _split(totals: Dict[str, float]) -> Tuple[float, float]:
+    income = sum(v for k, v in totals.items() if SIGNS.get(k, 0) > 0)
+    expense = sum(v for k, v in totals.items() if SIGNS.get(k, 0) < 0)
+    return income, expense
+
+def build_statement(db: Session, start: str, end: str) -> dict:
+    by_month: Dict[str, Dict[str, float]] = defaultdict(dict)
+    rows = db.execute(
+        select(models.FinanceSnapshot.month, models.FinanceSnapshot.kind, models.FinanceSnapshot.total)
+        .where(models.FinanceSnapshot.month >= start, models.FinanceSnapshot.month <= end)
+    )
+    for month, kind, total in rows:
+        if total:
+            by_month[month][kind] = total
+    closing = dict(db.execute(
+        select(models.FinanceBalance.month, models.FinanceBalance.closing_balance)
+        .where(models.FinanceBalance.month >= start, models.FinanceBalance.month <= end)
+    ).all())
+    opening = balance = _closing_before(db, start)
+    months, overall = [], defaultdict(float)
+    for month in sorted(set(by_month) | set(closing)):
+        totals = by_month.get(month, {})
+        income, expense = _split(totals)
+        balance = closing.get(month, balance)
+        months.append({"month": month, "totals": totals, "income": income, "expense": expense,
+                       "net": income - expense, "closing_balance": balance})
+        for kind, total in totals.items():
+            overall[kind] += total
+    income, expense = _split(overall)
+    return {"start": start, "end": end, "opening_balance": opening, "months": months, "totals": dict(overall),
+            "income": income, "expense": expense, "net": income - expense, "closing_balance": balance}
+
+def build_balance_sheet(db: Session, as_of: str | None) -> dict:
+    if as_of is None:
+        as_of = db.scalar(select(func.max(models.FinanceSnapshot.month))) or month_of(date.today())
+    totals = dict(db.execute(
+        select(models.FinanceSnapshot.kind, func.sum(models.FinanceSnapshot.total))
+        .where(models.FinanceSnapshot.month <= as_of).group_by(models.FinanceSnapshot.kind)
+    ).all())
+    totals = {kind: total for kind, total in totals.items() if total}
+    income, expense = _split(totals)
+    # The last month with movement on or before as_of carries the balance
+    cash = db.scalar(
+        select(models.FinanceBalance.closing_balance).where(models.FinanceBalance.month <= as_of)
+        .order_by(models.FinanceBalance.month.desc()).limit(1)
+    ) or 0.0
+    return {"as_of": as_of, "cash_balance": cash, "income_to_date": income, "expense_to_date": expense,
+            "totals_to_date": totals, "unclassified_types": sorted(k for k in totals if k not in SIGNS)}
+
+# Verifier: recomputes the snapshots from the rows (archived years included) in
+# id-range chunks on a thread pool, then compares or replaces them.
+
+def _chunk_totals(tenant: str | None, table, low: int, high: int) -> Tuple[Totals, int]:
+    db = session_for(tenant)
+    try:
+        totals: Totals = defaultdict(lambda: [0.0, 0])
+        scanned = 0
+        rows = db.execute(
+            select(table.c.date, table.c.type, func.sum(table.c.amount), func.count())
+            .where(table.c.id >= low, table.c.id < high)
+            .group_by(table.c.date, table.c.type)
+        )
+        for day, kind, amount, count in rows:
+            scanned += count
+            if day is None:
+                continue
+            entry = totals[(month_of(day), kind_of(kind))]
+            entry[0] += amount or 0.0
+            entry[1] += count
+        return totals, scanned
+    finally:
+        db.close()
+
+def recompute(db: Session, tenant: str | None = None, workers: int | None = None, chunk_rows: int | None = None) -> Tuple[Totals, int, int]:
+    """(totals, rows scanned, chunks) computed from the live and archived rows."""
+    workers = workers or settings.FINANCE_VERIFY_WORKERS
+    chunk_rows = chunk_rows or settings.FINANCE_VERIFY_CHUNK_ROWS
+    tables = [models.SchoolTransaction.__table__] + archive.archive_tables_for(db, models.SchoolTransaction, None, None)
+    chunks = []
+    for table in tables:
+        low, high = db.execute(select(func.min(table.c.id), func.max(table.c.id))).one()
+        if low is None:
+            continue
+        chunks += [(table, start, start + chunk_rows) for start in range(low, high + 1, chunk_rows)]
+    db.rollback()
+    totals: Totals = defaultdict(lambda: [0.0, 0])
+    scanned = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for part, count in pool.map(lambda chunk: _chunk_totals(tenant, *chunk), chunks):
+            scanned += count
+            for key, (amount, entries) in part.items():
+                totals[key][0] += amount
+                totals[key][1] += entries
+    return totals, scanned, len(chunks)
+
+def _balances(totals: Totals) -> Dict[str, Tuple[float, float]]:
+    net_by_month = defaultdict(float)
+    for (month, kind), (amount, _) in totals.items():
+        net_by_month[month] += SIGNS.get(kind, 0) * amount
+    balances, running = {}, 0.0
+    for month in sorted(net_by_month):
+        if net_by_month[month]:
+            running += net_by_month[month]
+            balances[month] = (net_by_month[month], running)
+    return balances
+
+def verify(db: Session, tenant: str | None = None, repair: bool = False, workers: int | None = None) -> dict:
+    totals, scanned, chunks = recompute(db, tenant, workers)
+    expected_balances = _balances(totals)
+    stored = {(s.month, s.kind): (s.total, s.entries) for s in db.query(models.FinanceSnapshot)}
+    stored_balances = {b.month: (b.net, b.closing_balance) for b in db.query(models.FinanceBalance)}
+
+    snapshot_mismatches = []
+    for key in sorted(set(totals) | set(stored)):
+        want = totals.get(key, (0.0, 0))
+        have = stored.get(key, (0.0, 0))
+        if abs(want[0] - have[0]) > TOLERANCE or want[1] != have[1]:
+            snapshot_mismatches.append({"month": key[0], "kind": key[1], "expected": list(want), "stored": list(have)})
+    balance_mismatches = []
+    for month in sorted(set(expected_balances) | set(stored_balances)):
+        want = expected_balances.get(month)
+        have = stored_balances.get(month)
+        # A zero-net month may or may not have a row; only its closing balance matters
+        if want is None and have is not None and abs(have[0]) <= TOLERANCE:
+            continue
+        if want is None or have is None or any(abs(w - h) > TOLERANCE for w, h in zip(want, have)):
+            balance_mismatches.append({"month": month, "expected": list(want) if want else None, "stored": list(have) if have else None})
+    report = {"rows_scanned": scanned, "chunks": chunks, "months": len({month for month, _ in totals}),
+              "snapshot_mismatches": snapshot_mismatches[:100], "balance_mismatches": balance_mismatches[:100],
+              "consistent": not snapshot_mismatches and not balance_mismatches, "repaired": False}
+    if repair and not report["consistent"]:
+        # Writes that commit during a repair can be lost; verify again afterwards
+        db.query(models.FinanceSnapshot).delete()
+        db.query(models.FinanceBalance).delete()
+        db.add_all(models.FinanceSnapshot(month=month, kind=kind, total=amount, entries=entries)
+                   for (month, kind), (amount, entries) in totals.items() if amount or entries)
+        db.add_all(models.FinanceBalance(month=month, net=net, closing_balance=closing)
+                   for month, (net, closing) in expected_balances.items())
+        db.commit()
+        report["repaired"] = True
+    return report
+
+@finance_router.get("/school_transactions/statement", response_model=schemas.FinanceStatement, dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher]))])
+async def school_statement(
+    start: str = Query(..., alias="from", description="First month, e.g. 2024-04"),
+    end: str = Query(..., alias="to", description="Last month, inclusive"),
+    db: Session = Depends(get_db)
+):
+    start, end = _parse_month(start, "from"), _parse_month(end, "to")
+    if start > end:
+        raise HTTPException(status_code=400, detail="from must not be after to")
+    return build_statement(db, start, end)
+
+@finance_router.get("/balance-sheet", response_model=schemas.BalanceSheet, dependencies=[Depends(role_required([models.Role.admin]))])
+async def balance_sheet(
+    as_of: str | None = Query(None, description="Month, e.g. 2024-05; defaults to the latest with activity"),
+    db: Session = Depends(get_db)
+):
+    return build_balance_sheet(db, _parse_month(as_of, "as_of") if as_of else None)
+
+@finance_router.post("/finance/verify", response_model=schemas.FinanceVerifyReport, dependencies=[Depends(role_required([models.Role.admin]))])
+async def verify_snapshots(
+    repair: bool = Query(False, description="Replace the snapshots with the recomputed totals if they differ"),
+    db: Session = Depends(get_db)
+):
+    return await run_in_threadpool(verify, db, current_tenant.get(), repair)
+
+if __name__ == "__main__":
+    # `python -m app.finance verify [--repair] [--workers N] [--tenant ID]`
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(prog="python -m app.finance")
+    parser.add_argument("command", choices=["verify"])
+    parser.add_argument("--repair", action="store_true", help="rebuild the snapshots when they differ")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--tenant", help="school database to check when tenancy is enabled")
+    args = parser.parse_args()
+    session = session_for(args.tenant)
+    try:
+        print(json.dumps(verify(session, args.tenant, args.repair, args.workers), indent=2))
+    finally:
+        session.close()
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from typing import List, Tuple
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+
+from app import metrics
+from app.config import settings
+from app.database import batch_session, current_tenant, session_for
+
+logger = logging.getLogger(__name__)
+
+class GroupCommitter(threading.Thread):
+    """Coalesces single-row inserts from concurrent requests into one transaction.
+
+    Callers hand over a transient ORM object and wait on a future. The writer
+    takes everything queued within the window (up to the batch cap), flushes it
+    in one transaction and commits once. The ORM batches same-table INSERTs and
+    reads ids and defaults back with RETURNING where the database supports it;
+    its sessions don't expire on commit, so callers get the row without a
+    refresh SELECT. A failed batch is retried one row per transaction, so only
+    the callers whose rows are bad see an error.
+    """
+
+    def __init__(self, window_ms: float | None = None, max_batch: int | None = None):
+        super().__init__(name="group-commit", daemon=True)
+        self.window = (settings.GROUP_COMMIT_WINDOW_MS if window_ms is None else window_ms) / 1000
+        self.max_batch = max_batch or settings.GROUP_COMMIT_MAX_BATCH
+        self._queue: queue.Queue = queue.Queue()
+        self._stop_event = threading.Event()
+        metrics.describe("group_commit_batches_total", "counter", "Transactions committed by the group-commit writer")
+        metrics.describe("group_commit_rows_total", "counter", "Rows inserted through group commit")
+        metrics.describe("group_commit_fallbacks_total", "counter", "Batches retried row by row after a failure")
+
+    def submit(self, obj, tenant: str | None = None) -> Future:
+        if self._stop_event.is_set():
+            raise RuntimeError("Group commit writer is stopped")
+        future = Future()
+        self._queue.put((tenant, obj, future))
+        return future
+
+    def _collect(self) -> List[tuple]:
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        # The window starts with the first row; whatever is already queued joins regardless
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        # Keeps draining after stop() so every accepted row gets an answer
+        while not (self._stop_event.is_set() and self._queue.empty()):
+            by_tenant = defaultdict(list)
+            for item in self._collect():
+                if item is None: # stop() wake-up
+                    continue
+                tenant, obj, future = item
+                if future.set_running_or_notify_cancel(): # skip rows whose request went away
+                    by_tenant[tenant].append((obj, future))
+            for tenant, items in by_tenant.items():
+                try:
+                    self._commit(tenant, items)
+                except Exception as exc: # e.g. no connection: fail the callers, keep the writer
+                    logger.exception("Group commit failed")
+                    for _, future in items:
+                        if not future.done():
+                            future.set_exception(exc)
+
+    def _commit(self, tenant: str | None, items: List[Tuple[object, Future]]):
+        db = session_for(tenant)
+        db.expire_on_commit = False # callers read ids and defaults straight off the objects
+        try:
+            try:
+                db.add_all(obj for obj, _ in items)
+                db.commit()
+            except Exception:
+                db.rollback()
+                metrics.inc("group_commit_fallbacks_total")
+                self._commit_each(db, items)
+                return
+            metrics.inc("group_commit_batches_total")
+            metrics.inc("group_commit_rows_total", len(items))
+            for obj, future in items:
+                future.set_result(obj)
+        finally:
+            db.close()
+
+    def _commit_each(self, db: Session, items: List[Tuple[object, Future]]):
+        for obj, future in items:
+            _clear_primary_key(obj) # the id handed out by the failed flush may be taken by now
+            try:
+                db.add(obj)
+                db.commit()
+            except Exception as exc:
+                db.rollback()
+                future.set_exception(exc)
+            else:
+                metrics.inc("group_commit_batches_total")
+                metrics.inc("group_commit_rows_total")
+                future.set_result(obj)
+
+    def stop(self, timeout: float = 10):
+        self._stop_event.set()
+        self._queue.put(None)
+        self.join(timeout)
+
+def _clear_primary_key(obj):
+    mapper = inspect(obj).mapper
+    for column in mapper.primary_key:
+        if column.autoincrement:
+            setattr(obj, mapper.get_property_by_column(column).key, None)
+
+committer: GroupCommitter | None = None
+
+def _grouped() -> bool:
+    # POST /batch shares one session across operations; its inserts commit with the batch
+    return committer is not None and batch_session.get() is None
+
+def _save_directly(db: Session, obj):
+    db.add(obj)
+    db.commit()
+    db.refresh(obj)
+    return obj
+
+def save(db: Session, obj):
+    """INSERT a new object and return it with its id; group-committed when enabled."""
+    if not _grouped():
+        return _save_directly(db, obj)
+    return committer.submit(obj, current_tenant.get()).result()
+
+async def save_async(db: Session, obj):
+    if not _grouped():
+        return _save_directly(db, obj)
+    return await asyncio.wrap_future(committer.submit(obj, current_tenant.get()))
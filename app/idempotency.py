@@ -0,0 +1,311 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+import anyio
+from sqlalchemy import delete, select, update
+
+from app import metrics, models
+from app.config import settings
+from app.database import current_tenant, dialect_insert, session_for, tenants
+
+logger = logging.getLogger(__name__)
+
+# POST requests carrying an Idempotency-Key header run once per (user, path,
+# key). The first request claims the key with a row in idempotency_keys and
+# stores its response there when it finishes; a retry gets that response back
+# (Idempotent-Replayed: true) without touching the endpoint. Duplicates that
+# arrive while the first is still running wait for it: in this process on its
+# future, across processes by polling the row. 5xx responses and failures
+# release the key so the client can retry for real. Only authenticated
+# requests are keyed: public paths have no caller to scope keys to, and the
+# /token endpoints answer with credentials that must not be stored.
+
+HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+PURGE_CHUNK = 1000
+POLL_SECONDS = 0.1 # between checks on a key another worker is executing
+NOT_STORED = {429, 503} # "try again later" answers shouldn't be replayed
+CREDENTIAL_PATHS = ("/token", "/token/refresh", "/token/revoke") # never stored, even if a caller is known
+
+@dataclass
+class StoredResponse:
+    fingerprint: str
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    expires_at: datetime
+
+def key_hash(principal: str, path: str, key: str) -> str:
+    return hashlib.sha256(f"{principal}\n{path}\n{key}".encode()).hexdigest()
+
+def fingerprint(query_string: bytes, body: bytes) -> str:
+    return hashlib.sha256(query_string + b"\n" + body).hexdigest()
+
+def _principal(scope) -> str | None:
+    # Set by auth_middleware; None on public paths such as /register, which it doesn't decode
+    claims = scope.get("state", {}).get("claims") or {}
+    return claims.get("sub")
+
+def _from_row(row: models.IdempotencyKey) -> StoredResponse:
+    return StoredResponse(
+        fingerprint=row.fingerprint,
+        status=row.status_code,
+        headers=[(name.encode("latin-1"), value.encode("latin-1")) for name, value in json.loads(row.headers)],
+        body=zlib.decompress(row.body),
+        expires_at=row.expires_at,
+    )
+
+def claim(tenant: str | None, digest: str, request_fingerprint: str) -> Tuple[str, StoredResponse | None]:
+    """("claimed", None), ("stored", response) or ("busy", None) while another worker runs it."""
+    now = datetime.utcnow()
+    table = models.IdempotencyKey.__table__
+    db = session_for(tenant)
+    try:
+        connection = db.connection()
+        inserted = connection.execute(dialect_insert(connection, table).values(
+            key_hash=digest, fingerprint=request_fingerprint, created_at=now,
+            locked_until=now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS),
+            expires_at=now + timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS),
+        ).on_conflict_do_nothing(index_elements=["key_hash"]))
+        if inserted.rowcount == 1:
+            db.commit()
+            return "claimed", None
+        row = db.get(models.IdempotencyKey, digest)
+        if row is None: # purged in between
+            db.rollback()
+            return claim(tenant, digest, request_fingerprint)
+        if row.status_code is not None and row.expires_at > now:
+            stored = _from_row(row)
+            db.rollback()
+            return "stored", stored
+        if row.status_code is None and row.locked_until > now:
+            db.rollback()
+            return "busy", None
+        # Expired, or claimed by a worker that died before answering: take it over
+        taken = connection.execute(
+            update(table)
+            .where(table.c.key_hash == digest, table.c.locked_until == row.locked_until, table.c.expires_at == row.expires_at)
+            .values(fingerprint=request_fingerprint, status_code=None, headers=None, body=None, created_at=now,
+                    locked_until=now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS),
+                    expires_at=now + timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS))
+        )
+        db.commit()
+        return ("claimed", None) if taken.rowcount == 1 else ("busy", None)
+    finally:
+        db.close()
+
+def store(tenant: str | None, digest: str, response: StoredResponse):
+    db = session_for(tenant)
+    try:
+        db.execute(
+            update(models.IdempotencyKey)
+            .where(models.IdempotencyKey.key_hash == digest, models.IdempotencyKey.status_code.is_(None))
+            .values(status_code=response.status, body=zlib.compress(response.body),
+                    headers=json.dumps([(name.decode("latin-1"), value.decode("latin-1")) for name, value in response.headers]),
+                    expires_at=response.expires_at)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+def release(tenant: str | None, digest: str):
+    db = session_for(tenant)
+    try:
+        db.execute(delete(models.IdempotencyKey).where(
+            models.IdempotencyKey.key_hash == digest, models.IdempotencyKey.status_code.is_(None)
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+def purge_expired(tenant: str | None = None) -> int:
+    """Delete expired keys in short transactions; returns the number removed."""
+    removed = 0
+    db = session_for(tenant)
+    try:
+        while True:
+            expired = select(models.IdempotencyKey.key_hash).where(
+                models.IdempotencyKey.expires_at < datetime.utcnow()
+            ).limit(PURGE_CHUNK)
+            result = db.execute(delete(models.IdempotencyKey).where(models.IdempotencyKey.key_hash.in_(expired.scalar_subquery())))
+            db.commit()
+            removed += result.rowcount
+            if result.rowcount < PURGE_CHUNK:
+                return removed
+    finally:
+        db.close()
+
+def purge_all() -> int:
+    removed = 0
+    for tenant in tenants():
+        try:
+            removed += purge_expired(tenant)
+        except Exception:
+            logger.exception("Purging idempotency keys failed for %s", tenant or "the default database")
+    return removed
+
+async def run():
+    while True:
+        await asyncio.sleep(settings.IDEMPOTENCY_PURGE_INTERVAL_SECONDS)
+        removed = await anyio.to_thread.run_sync(purge_all)
+        metrics.inc("idempotency_keys_purged_total", removed)
+
+class ResponseCache:
+    """Most recently used stored responses, so hot retries skip the database."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key) -> StoredResponse | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= datetime.utcnow():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, response: StoredResponse):
+        self._entries[key] = response
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+class IdempotencyMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.cache = ResponseCache(settings.IDEMPOTENCY_CACHE_SIZE)
+        self.inflight: dict = {} # (tenant, key hash) -> future resolved when the leader finishes
+        metrics.describe("idempotency_requests_total", "counter", "POSTs with an Idempotency-Key by outcome")
+        metrics.describe("idempotency_keys_purged_total", "counter", "Expired idempotency keys deleted")
+        metrics.gauge_callback("idempotency_cache_entries", lambda: {(): len(self.cache)})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] in CREDENTIAL_PATHS:
+            return await self.app(scope, receive, send)
+        key = dict(scope["headers"]).get(HEADER)
+        principal = _principal(scope)
+        if key is None or principal is None:
+            return await self.app(scope, receive, send)
+        key = key.decode("latin-1").strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return await _send_json(send, 400, {"detail": f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters"})
+
+        body, disconnected = await _read_body(receive)
+        if disconnected:
+            return
+        tenant = current_tenant.get()
+        digest = key_hash(principal, scope["path"], key)
+        request_fingerprint = fingerprint(scope.get("query_string", b""), body)
+        slot = (tenant, digest)
+
+        while True:
+            stored = self.cache.get(slot)
+            if stored is not None:
+                return await self._replay(stored, request_fingerprint, send)
+            leader = self.inflight.get(slot)
+            if leader is None:
+                break
+            metrics.inc("idempotency_requests_total", outcome="waited")
+            await asyncio.shield(leader) # then either cached or released; look again
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[slot] = future
+        try:
+            deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+            while True:
+                outcome, stored = await anyio.to_thread.run_sync(claim, tenant, digest, request_fingerprint)
+                if outcome == "stored":
+                    self.cache.put(slot, stored)
+                    return await self._replay(stored, request_fingerprint, send)
+                if outcome == "claimed":
+                    break
+                if time.monotonic() > deadline:
+                    metrics.inc("idempotency_requests_total", outcome="busy")
+                    return await _send_json(send, 409, {"detail": "A request with this Idempotency-Key is still in progress"})
+                await asyncio.sleep(POLL_SECONDS)
+            metrics.inc("idempotency_requests_total", outcome="executed")
+            await self._execute(scope, receive, send, body, tenant, digest, request_fingerprint, slot)
+        finally:
+            del self.inflight[slot]
+            future.set_result(None)
+
+    async def _execute(self, scope, receive, send, body, tenant, digest, request_fingerprint, slot):
+        replayed = False
+
+        async def replay_receive():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        start, chunks, size = None, [], 0
+        async def capture(message):
+            nonlocal start, size
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body" and size <= settings.IDEMPOTENCY_MAX_BODY_BYTES:
+                chunks.append(message.get("body", b""))
+                size += len(chunks[-1])
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture)
+        except BaseException:
+            await anyio.to_thread.run_sync(release, tenant, digest)
+            raise
+        status = start["status"] if start else 500
+        if status >= 500 or status in NOT_STORED or size > settings.IDEMPOTENCY_MAX_BODY_BYTES:
+            await anyio.to_thread.run_sync(release, tenant, digest)
+            return
+        stored = StoredResponse(
+            fingerprint=request_fingerprint, status=status, headers=list(start.get("headers", [])), body=b"".join(chunks),
+            expires_at=datetime.utcnow() + timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS),
+        )
+        try:
+            await anyio.to_thread.run_sync(store, tenant, digest, stored)
+        except Exception:
+            # The response already went out; a retry will find the claim expired and run again
+            logger.exception("Storing the idempotent response failed")
+            return
+        self.cache.put(slot, stored)
+
+    async def _replay(self, stored: StoredResponse, request_fingerprint: str, send):
+        if stored.fingerprint != request_fingerprint:
+            metrics.inc("idempotency_requests_total", outcome="mismatch")
+            return await _send_json(send, 422, {"detail": "Idempotency-Key was already used with a different request"})
+        metrics.inc("idempotency_requests_total", outcome="replayed")
+        await send({"type": "http.response.start", "status": stored.status,
+                    "headers": stored.headers + [(b"idempotent-replayed", b"true")]})
+        await send({"type": "http.response.body", "body": stored.body})
+
+async def _read_body(receive) -> Tuple[bytes, bool]:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return b"", True
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks), False
+
+async def _send_json(send, status: int, content: dict):
+    body = json.dumps(content).encode()
+    await send({"type": "http.response.start", "status": status, "headers": [
+        (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+    ]})
+    await send({"type": "http.response.body", "body": body})
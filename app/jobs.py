@@ -0,0 +1,327 @@
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+import uuid
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from fastapi import APIRouter, Body, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.config import settings
+from app.database import get_db, session_for, tenants
+from app.dependencies import get_current_user
+
+logger = logging.getLogger(__name__)
+
+jobs_router = APIRouter()
+
+class JobCancelled(Exception):
+    pass
+
+@dataclass
+class JobKind:
+    name: str
+    func: Callable
+    max_concurrency: int = 1
+    roles: List[models.Role] = field(default_factory=lambda: [models.Role.admin])
+
+JOB_KINDS: Dict[str, JobKind] = {}
+
+def job_kind(name: str, max_concurrency: int = 1, roles: List[models.Role] | None = None):
+    """Register ``func(ctx, params)`` as a job kind runnable via ``POST /jobs/{name}``."""
+    def decorator(func):
+        JOB_KINDS[name] = JobKind(name, func, max_concurrency, roles or [models.Role.admin])
+        return func
+    return decorator
+
+def get_job_kinds() -> Dict[str, JobKind]:
+    # Job implementations register themselves on import; this also runs in worker processes
+    import app.backup # noqa: F401
+    import app.reports # noqa: F401
+    return JOB_KINDS
+
+class JobContext:
+    """Handed to job functions running in a worker process."""
+
+    PROGRESS_INTERVAL = 0.5 # seconds between progress writes / cancellation checks
+
+    def __init__(self, db: Session, job: models.Job):
+        self.db = db
+        self.job_id = job.id
+        self._last_report = 0.0
+
+    def progress(self, fraction: float, force: bool = False):
+        """Record progress (0..1) and raise JobCancelled if a cancel was requested."""
+        now = time.monotonic()
+        if not force and now - self._last_report < self.PROGRESS_INTERVAL:
+            return
+        self._last_report = now
+        self.db.execute(
+            update(models.Job).where(models.Job.id == self.job_id)
+            .values(progress=max(0.0, min(fraction, 1.0)), heartbeat_at=datetime.utcnow())
+        )
+        self.db.commit()
+        cancelled = self.db.query(models.Job.cancel_requested).filter(models.Job.id == self.job_id).scalar()
+        if cancelled:
+            raise JobCancelled()
+
+    def result_path(self, extension: str) -> str:
+        os.makedirs(settings.JOB_RESULTS_DIR, exist_ok=True)
+        return os.path.join(os.path.abspath(settings.JOB_RESULTS_DIR), f"{self.job_id}.{extension}")
+
+def _finish(db: Session, job_id: str, **values):
+    db.execute(update(models.Job).where(models.Job.id == job_id).values(finished_at=datetime.utcnow(), **values))
+    db.commit()
+
+def run_job(job_id: str, tenant: str | None = None):
+    """Entry point executed inside a pool process."""
+    db = session_for(tenant)
+    try:
+        job = db.query(models.Job).filter(models.Job.id == job_id).first()
+        if job is None:
+            return
+        kind = get_job_kinds()[job.kind]
+        ctx = JobContext(db, job)
+        try:
+            result_path = kind.func(ctx, json.loads(job.params))
+        except JobCancelled:
+            db.rollback()
+            _finish(db, job_id, status="cancelled")
+        except Exception:
+            db.rollback()
+            _finish(db, job_id, status="failed", error=traceback.format_exc(limit=5)[-2000:])
+        else:
+            _finish(db, job_id, status="succeeded", progress=1.0, result_path=result_path)
+    finally:
+        db.close()
+
+class JobDispatcher(threading.Thread):
+    """Claims queued jobs within per-kind concurrency limits and runs them in a process pool.
+
+    Running jobs hold a lease: the dispatcher renews heartbeat_at for the jobs in
+    its pool, and any dispatcher fails running jobs whose lease has expired (their
+    process was killed or recycled), so they stop counting against kind limits.
+    """
+
+    def __init__(self, max_workers: int | None = None, poll_interval: float | None = None):
+        super().__init__(name="job-dispatcher", daemon=True)
+        self.max_workers = max_workers or settings.JOB_WORKERS
+        self.poll_interval = poll_interval if poll_interval is not None else settings.JOB_POLL_INTERVAL_SECONDS
+        self._stop_event = threading.Event()
+        self._wakeup = threading.Event()
+        self._running: Dict[str, str | None] = {} # job id -> tenant
+        self._heartbeats: Dict[str | None, float] = {} # tenant -> last lease renewal
+        # spawn keeps children independent of this process's threads and open connections
+        self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def wakeup(self):
+        self._wakeup.set()
+
+    def _heartbeat(self, db: Session, tenant: str | None):
+        now = time.monotonic()
+        if now - self._heartbeats.get(tenant, 0.0) < settings.JOB_LEASE_SECONDS / 4:
+            return
+        self._heartbeats[tenant] = now
+        job_ids = [job_id for job_id, job_tenant in list(self._running.items()) if job_tenant == tenant]
+        if job_ids:
+            db.execute(update(models.Job).where(models.Job.id.in_(job_ids), models.Job.status == "running")
+                       .values(heartbeat_at=datetime.utcnow()))
+            db.commit()
+
+    def _reap(self, db: Session):
+        expired = datetime.utcnow() - timedelta(seconds=settings.JOB_LEASE_SECONDS)
+        stale = update(models.Job).where(
+            models.Job.status == "running",
+            func.coalesce(models.Job.heartbeat_at, models.Job.started_at) < expired,
+        )
+        if self._running:
+            stale = stale.where(models.Job.id.notin_(list(self._running)))
+        result = db.execute(stale.values(
+            status=case((models.Job.cancel_requested, "cancelled"), else_="failed"),
+            error="The process running this job stopped (lease expired)",
+            finished_at=datetime.utcnow(),
+        ))
+        db.commit()
+        if result.rowcount:
+            logger.warning("Failed %d job(s) whose lease expired", result.rowcount)
+
+    def _claim_one(self, db: Session, job_id: str, kind: str, limit: int) -> bool:
+        job = models.Job
+        if db.get_bind().dialect.name == "postgresql":
+            # Other dispatchers claiming this kind wait until we commit, so the
+            # count below sees their claims (SQLite serialises writers anyway)
+            db.execute(select(func.pg_advisory_xact_lock(zlib.crc32(f"jobs:{kind}".encode()))))
+        running = select(func.count(job.id)).where(job.kind == kind, job.status == "running").scalar_subquery()
+        result = db.execute(
+            update(job)
+            .where(job.id == job_id, job.status == "queued", running < limit)
+            .values(status="running", started_at=datetime.utcnow(), heartbeat_at=datetime.utcnow())
+        )
+        db.commit()
+        return bool(result.rowcount)
+
+    def _claim(self, db: Session) -> List[str]:
+        kinds = get_job_kinds()
+        self._reap(db)
+        # Only skips kinds that are plainly full; the limit is enforced by the claiming UPDATE
+        running = dict(
+            db.query(models.Job.kind, func.count(models.Job.id))
+            .filter(models.Job.status == "running")
+            .group_by(models.Job.kind)
+        )
+        free_slots = self.max_workers - len(self._running)
+        claimed = []
+        queued = (
+            db.query(models.Job.id, models.Job.kind)
+            .filter(models.Job.status == "queued")
+            .order_by(models.Job.created_at)
+            .limit(self.max_workers * 4)
+        )
+        for job_id, kind in queued.all():
+            if free_slots <= 0:
+                break
+            if kind not in kinds:
+                result = db.execute(update(models.Job).where(models.Job.id == job_id, models.Job.status == "queued")
+                                    .values(status="failed", error=f"Unknown job kind {kind!r}", finished_at=datetime.utcnow()))
+                db.commit()
+                if result.rowcount:
+                    logger.error("Failed job %s: unknown kind %r", job_id, kind)
+                continue
+            limit = kinds[kind].max_concurrency
+            if running.get(kind, 0) >= limit:
+                continue
+            if self._claim_one(db, job_id, kind, limit):
+                running[kind] = running.get(kind, 0) + 1
+                free_slots -= 1
+                claimed.append(job_id)
+        return claimed
+
+    def _on_done(self, job_id: str, tenant: str | None, future):
+        self._running.pop(job_id, None)
+        db = session_for(tenant)
+        try:
+            if future.cancelled():
+                # Dropped from the pool by stop() before it started; the next dispatcher runs it
+                db.execute(update(models.Job).where(models.Job.id == job_id, models.Job.status == "running")
+                           .values(status="queued", started_at=None, heartbeat_at=None))
+                db.commit()
+            elif future.exception() is not None:
+                # The child died before it could record an outcome (e.g. killed by the OOM killer)
+                _finish(db, job_id, status="failed", error=repr(future.exception()))
+        except Exception:
+            logger.exception("Recording the outcome of job %s failed", job_id)
+        finally:
+            db.close()
+        self.wakeup()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            # Each school's jobs table is polled in turn; kind limits apply per school
+            for tenant in tenants():
+                db = session_for(tenant)
+                try:
+                    self._heartbeat(db, tenant)
+                    for job_id in self._claim(db):
+                        future = self._pool.submit(run_job, job_id, tenant)
+                        self._running[job_id] = tenant
+                        future.add_done_callback(lambda f, job_id=job_id, tenant=tenant: self._on_done(job_id, tenant, f))
+                except BrokenProcessPool:
+                    logger.exception("Job pool broke; recreating it")
+                    self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+                except Exception:
+                    logger.exception("Job dispatch failed")
+                finally:
+                    db.close()
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def stop(self, timeout: float = 10):
+        self._stop_event.set()
+        self._wakeup.set()
+        self.join(timeout)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+def _job_read(job: models.Job) -> schemas.JobRead:
+    result = schemas.JobRead.model_validate(job)
+    if job.status == "succeeded" and job.result_path:
+        result.result_url = f"/jobs/{job.id}/result"
+    return result
+
+def _get_visible_job(db: Session, job_id: str, current_user: models.User) -> models.Job:
+    job = db.query(models.Job).filter(models.Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if current_user.role != models.Role.admin and job.created_by != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view this job")
+    return job
+
+@jobs_router.post("/jobs/{kind}", response_model=schemas.JobRead, status_code=status.HTTP_202_ACCEPTED)
+def create_job(
+    kind: str,
+    params: dict = Body(default={}),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    job_kind = get_job_kinds().get(kind)
+    if job_kind is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job kind. Must be one of {sorted(JOB_KINDS)}")
+    if current_user.role not in job_kind.roles:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+
+    job = models.Job(id=uuid.uuid4().hex, kind=kind, params=json.dumps(params), created_by=current_user.id)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    if dispatcher is not None:
+        dispatcher.wakeup()
+    return _job_read(job)
+
+@jobs_router.get("/jobs/{job_id}", response_model=schemas.JobRead)
+def get_job(job_id: str, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    return _job_read(_get_visible_job(db, job_id, current_user))
+
+@jobs_router.post("/jobs/{job_id}/cancel", response_model=schemas.JobRead)
+def cancel_job(job_id: str, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    job = _get_visible_job(db, job_id, current_user)
+    if job.status == "queued":
+        job.status = "cancelled"
+        job.finished_at = datetime.utcnow()
+    elif job.status == "running":
+        # Picked up by the worker at its next progress report
+        job.cancel_requested = True
+    db.commit()
+    db.refresh(job)
+    return _job_read(job)
+
+@jobs_router.get("/jobs/{job_id}/result")
+def get_job_result(job_id: str, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    job = _get_visible_job(db, job_id, current_user)
+    if job.status != "succeeded" or not job.result_path or not os.path.exists(job.result_path):
+        raise HTTPException(status_code=404, detail="Job result not available")
+    return FileResponse(job.result_path, filename=os.path.basename(job.result_path))
+
+# Set by the application lifespan when this process dispatches jobs
+dispatcher: JobDispatcher | None = None
+
+if __name__ == "__main__":
+    # Standalone dispatcher for deployments that disable it in web workers: `python -m app.jobs`
+    logging.basicConfig(level=logging.INFO)
+    standalone = JobDispatcher()
+    standalone.start()
+    try:
+        while standalone.is_alive():
+            standalone.join(1)
+    except KeyboardInterrupt:
+        standalone.stop()
@@ -0,0 +1,7 @@
+# Session event listeners that keep derived state in step with the tables:
+# search index, audit log, finance snapshots, attendance states, ownership
+# index and announcement counters. app.database.AppSession imports this
+# before the first session is created, so every process that uses the
+# database registers them: web workers, job workers and scripts such as
+# create_admin.py, not only processes that import main.
+from app import absence, announcements, audit, finance, ownership, search # noqa: F401
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Dict
+
+from fastapi import APIRouter, Depends
+
+from app import metrics, models
+from app.config import settings
+from app.middleware import role_required
+
+logger = logging.getLogger(__name__)
+
+loop_monitor_router = APIRouter()
+
+STACK_INNERMOST = 6 # frames kept below the last application frame
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class BlockingCallError(RuntimeError):
+    """Raised in strict mode when a request blocked the event loop."""
+
+def _route_name(scope: dict | None) -> str:
+    if scope is None:
+        return "none" # lifespan tasks, background coroutines
+    route = scope.get("route")
+    path = getattr(route, "path", None) or scope.get("path", "?")
+    return f"{scope.get('method', '')} {path}".strip()
+
+def _format_stack(frame) -> str:
+    # Application frames show which handler blocked; the innermost library frames show on what
+    entries = traceback.extract_stack(frame)
+    own = [e for e in entries if e.filename.startswith(PROJECT_ROOT) and "site-packages" not in e.filename]
+    innermost = entries[-STACK_INNERMOST:]
+    kept = own + [e for e in innermost if e not in own]
+    return "".join(traceback.format_list(kept))
+
+class LoopMonitor:
+    """Measures event-loop lag with a ticking coroutine; a watchdog thread captures stalls.
+
+    The coroutine records a heartbeat every interval. When the heartbeat is
+    older than the stall threshold the loop is blocked, so the watchdog grabs
+    the loop thread's stack and the running task's route.
+    """
+
+    def __init__(self):
+        self.stalls: deque = deque(maxlen=50)
+        self._active: Dict[asyncio.Task, dict] = {} # request task -> ASGI scope
+        self._stalled: Dict[asyncio.Task, dict] = {} # strict mode: task -> first stall
+        self._heartbeat = time.monotonic()
+        self._reported: float | None = None
+        self._loop = None
+        self._loop_thread_id = None
+        self._task = None
+        self._stop_event = threading.Event()
+        metrics.describe("event_loop_lag_seconds", "gauge", "Scheduling delay of the last loop monitor tick")
+        metrics.describe("event_loop_lag_seconds_total", "counter", "Accumulated event loop scheduling delay")
+        metrics.describe("event_loop_stalls_total", "counter", "Event loop stalls over the threshold, by route")
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stop_event = threading.Event() # a fresh one, so a previous watchdog can't be revived
+        self._heartbeat = time.monotonic()
+        if settings.LOOP_BLOCKING_STRICT:
+            # asyncio's own slow-callback logging on top of the watchdog
+            self._loop.set_debug(True)
+            self._loop.slow_callback_duration = settings.LOOP_STALL_THRESHOLD_SECONDS
+        self._task = asyncio.create_task(self._tick())
+        threading.Thread(target=self._watch, args=(self._stop_event,), name="loop-watchdog", daemon=True).start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _tick(self):
+        interval = settings.LOOP_MONITOR_INTERVAL_SECONDS
+        while True:
+            started = time.monotonic()
+            self._heartbeat = started
+            await asyncio.sleep(interval)
+            lag = max(0.0, time.monotonic() - started - interval)
+            metrics.set_gauge("event_loop_lag_seconds", lag)
+            if lag:
+                metrics.inc("event_loop_lag_seconds_total", lag)
+
+    def _watch(self, stop_event: threading.Event):
+        threshold = settings.LOOP_STALL_THRESHOLD_SECONDS
+        while not stop_event.wait(min(threshold / 2, settings.LOOP_MONITOR_INTERVAL_SECONDS)):
+            heartbeat = self._heartbeat
+            if time.monotonic() - heartbeat < threshold + settings.LOOP_MONITOR_INTERVAL_SECONDS or self._reported == heartbeat:
+                continue
+            self._reported = heartbeat # one report per stall
+            self._capture(time.monotonic() - heartbeat - settings.LOOP_MONITOR_INTERVAL_SECONDS)
+
+    def _capture(self, blocked_for: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        task = asyncio.current_task(self._loop)
+        route = _route_name(self._active.get(task))
+        stack = _format_stack(frame) if frame is not None else ""
+        record = {"route": route, "blocked_for": round(blocked_for, 3), "at": time.time(), "stack": stack}
+        self.stalls.append(record)
+        metrics.inc("event_loop_stalls_total", route=route)
+        logger.warning("Event loop blocked for at least %.0f ms in %s\n%s", blocked_for * 1000, route, stack)
+        if task is not None and task in self._active:
+            self._stalled.setdefault(task, record)
+
+    def track(self, scope: dict):
+        task = asyncio.current_task()
+        self._active[task] = scope
+        return task
+
+    def untrack(self, task) -> dict | None:
+        self._active.pop(task, None)
+        return self._stalled.pop(task, None)
+
+loop_monitor = LoopMonitor()
+
+class LoopMonitorMiddleware:
+    """Maps the task serving each request to its route so stalls can be attributed."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        task = loop_monitor.track(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            stall = loop_monitor.untrack(task)
+        if stall is not None and settings.LOOP_BLOCKING_STRICT:
+            raise BlockingCallError(f"{stall['route']} blocked the event loop for {stall['blocked_for'] * 1000:.0f} ms\n{stall['stack']}")
+
+@loop_monitor_router.get("/metrics/stalls", dependencies=[Depends(role_required([models.Role.admin]))])
+async def recent_stalls():
+    return list(loop_monitor.stalls)
@@ -0,0 +1,62 @@
+import threading
+from typing import Callable, Dict, Tuple
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from app import models
+from app.middleware import role_required
+
+metrics_router = APIRouter()
+
+# In-process counters and gauges rendered in Prometheus text format. Each
+# worker process reports its own values; scrape every worker or sum them.
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Tuple], float] = {}
+_gauges: Dict[Tuple[str, Tuple], float] = {}
+_callbacks: Dict[str, Callable[[], Dict[Tuple, float]]] = {}
+_help: Dict[str, Tuple[str, str]] = {}
+
+def _key(name: str, labels: dict) -> Tuple[str, Tuple]:
+    return name, tuple(sorted(labels.items()))
+
+def describe(name: str, kind: str, help_text: str):
+    _help[name] = (kind, help_text)
+
+def inc(name: str, value: float = 1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def set_gauge(name: str, value: float, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+def gauge_callback(name: str, callback: Callable[[], Dict[Tuple, float]]):
+    """Register a gauge computed at scrape time; callback returns {label_items_tuple: value}."""
+    _callbacks[name] = callback
+
+def snapshot() -> Dict[Tuple[str, Tuple], float]:
+    with _lock:
+        values = dict(_counters)
+        values.update(_gauges)
+    for name, callback in list(_callbacks.items()):
+        for labels, value in callback().items():
+            values[(name, labels)] = value
+    return values
+
+def render() -> str:
+    lines, seen = [], set()
+    for (name, labels), value in sorted(snapshot().items()):
+        if name not in seen and name in _help:
+            kind, help_text = _help[name]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+        seen.add(name)
+        label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(role_required([models.Role.admin]))])
+async def get_metrics():
+    return render()
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from sqlalchemy import Boolean, Column, Integer, String, Float, DateTime, ForeignKey, Enum, Date, Table
+from sqlalchemy import BigInteger, Boolean, LargeBinary, Column, Integer, String, Float, DateTime, ForeignKey, Enum, Date, Table, Index, Text, UniqueConstraint
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from passlib.context import CryptContext
 from datetime import datetime
@@ -76,7 +76,7 @@ class SchoolClass(Base):
 
     students = relationship("Student", back_populates="school_class")
     teacher = relationship("User")
-    subjects = relationship("Subject", secondary=class_subject_association, back_populates="classes")
+    subjects = relationship("Subject", secondary="class_subject_association", back_populates="classes")
 
 class Attendance(Base):
     __tablename__ = "attendances"
@@ -90,6 +90,8 @@ class Attendance(Base):
     student = relationship("Student")
     marker = relationship("User")
 
+    __table_args__ = (Index("ix_attendances_student_date", "student_id", "date"),)
+
 class FeePayment(Base):
     __tablename__ = "fee_payments"
 
@@ -100,6 +102,8 @@ class FeePayment(Base):
     payment_date = Column(Date)
     status = Column(String) # pending/paid/failed
     remarks = Column(String)
+    # Set for rows ingested from bank statements; makes re-uploads idempotent
+    statement_key = Column(String(64), unique=True, index=True, nullable=True)
 
     student = relationship("Student")
 
@@ -153,6 +157,23 @@ class Announcement(Base):
 
     creator = relationship("User")
 
+class AnnouncementCounter(Base):
+    """Announcements visible to each role, maintained by app/announcements.py."""
+    __tablename__ = "announcement_counters"
+
+    role = Column(String(16), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+
+class AnnouncementReadMark(Base):
+    """How far a user has read: the last announcement id and the visible announcements up to it."""
+    __tablename__ = "announcement_read_marks"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    role = Column(String(16), nullable=False) # the role read_count was counted for
+    last_read_id = Column(Integer, nullable=False, default=0)
+    read_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
 # Association table for SchoolClass and Subject
 class_subject_association = Table(
     "class_subject_association",
@@ -167,4 +188,150 @@ class Subject(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, nullable=False)
 
-    classes = relationship("SchoolClass", secondary=class_subject_association, back_populates="subjects")
\ No newline at end of file
+    classes = relationship("SchoolClass", secondary=class_subject_association, back_populates="subjects")
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    __table_args__ = (Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    dedupe_key = Column(String, unique=True, nullable=False)
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(String, nullable=False)
+    status = Column(String, default="pending", nullable=False) # pending/sending/sent/failed
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    claim_token = Column(String, nullable=True, index=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (Index("ix_jobs_kind_status", "kind", "status"),)
+
+    id = Column(String(32), primary_key=True)
+    kind = Column(String, nullable=False)
+    status = Column(String, default="queued", nullable=False) # queued/running/succeeded/failed/cancelled
+    progress = Column(Float, default=0.0, nullable=False)
+    params = Column(Text, nullable=False, default="{}") # JSON
+    result_path = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+    cancel_requested = Column(Boolean, default=False, nullable=False)
+    created_by = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True) # renewed by the dispatcher running it; stale means it was lost
+    finished_at = Column(DateTime, nullable=True)
+
+    creator = relationship("User")
+
+class RefreshToken(Base):
+    # One row per login session ("family"); rotation overwrites token_hash in place
+    __tablename__ = "refresh_tokens"
+
+    family_id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    token_hash = Column(String(64), nullable=False) # sha256 of the current secret
+    rotated_hashes = Column(Text, nullable=True) # sha256 of the last few rotated-away secrets, newest first
+    generation = Column(Integer, default=0, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, nullable=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class ArchivedYear(Base):
+    """One row per (table, academic year) moved into a <table>_archive_<year> table."""
+    __tablename__ = "archived_years"
+    __table_args__ = (UniqueConstraint("source_table", "academic_year", name="uq_archived_years_table_year"),)
+
+    id = Column(Integer, primary_key=True)
+    source_table = Column(String(64), nullable=False)
+    academic_year = Column(String(16), nullable=False) # e.g. "2024-2025"
+    starts_on = Column(Date, nullable=False)
+    ends_on = Column(Date, nullable=False) # exclusive
+    status = Column(String(16), nullable=False, default="archiving") # archiving/archived/restoring
+    rows = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class BackfillCheckpoint(Base):
+    """Progress of a chunked backfill (app/backfill.py), committed with every chunk."""
+    __tablename__ = "backfill_checkpoints"
+
+    name = Column(String(64), primary_key=True)
+    last_id = Column(Integer, nullable=False, default=0) # highest primary key processed
+    rows_done = Column(Integer, nullable=False, default=0)
+    status = Column(String(16), nullable=False, default="running") # running/finished
+    started_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class FinanceSnapshot(Base):
+    """Per-month, per-type totals of school_transactions, maintained by app/finance.py."""
+    __tablename__ = "finance_snapshots"
+    __table_args__ = (UniqueConstraint("month", "kind", name="uq_finance_snapshots_month_kind"),)
+
+    id = Column(Integer, primary_key=True)
+    month = Column(String(7), nullable=False, index=True) # "2024-05"
+    kind = Column(String(32), nullable=False) # normalised school_transactions.type
+    total = Column(Float, nullable=False, default=0.0)
+    entries = Column(Integer, nullable=False, default=0)
+
+class FinanceBalance(Base):
+    """Net movement and closing cash balance per month; months without movement have no row."""
+    __tablename__ = "finance_balances"
+
+    month = Column(String(7), primary_key=True)
+    net = Column(Float, nullable=False, default=0.0)
+    closing_balance = Column(Float, nullable=False, default=0.0)
+
+class AttendanceState(Base):
+    """Absence streak and rolling window per student, maintained by app/absence.py."""
+    __tablename__ = "attendance_states"
+
+    student_id = Column(Integer, primary_key=True) # no FK: state for a deleted student is simply never joined
+    last_date = Column(Date, nullable=True)
+    streak = Column(Integer, nullable=False, default=0) # consecutive absent records up to last_date
+    window_mask = Column(BigInteger, nullable=False, default=0) # bit i set = present on the i-th most recent record
+    window_len = Column(Integer, nullable=False, default=0)
+    flagged = Column(Boolean, nullable=False, default=False, index=True)
+    reason = Column(String(16), nullable=True) # streak, rate or streak,rate
+    flagged_since = Column(Date, nullable=True)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+class OwnershipChange(Base):
+    """Students whose parent or class changed, by commit time (app/ownership.py); student_id NULL means reload everything."""
+    __tablename__ = "ownership_changes"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    student_id = Column(Integer, nullable=True)
+    changed_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+class IdempotencyKey(Base):
+    """A POST's Idempotency-Key and, once it has finished, its response (app/idempotency.py)."""
+    __tablename__ = "idempotency_keys"
+
+    key_hash = Column(String(64), primary_key=True) # sha256 of user, path and key
+    fingerprint = Column(String(64), nullable=False) # sha256 of the query string and body
+    status_code = Column(Integer, nullable=True) # NULL while the first request is running
+    headers = Column(Text, nullable=True) # JSON [[name, value], ...]
+    body = Column(LargeBinary, nullable=True) # zlib-compressed
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = Column(DateTime, nullable=False) # a running claim older than this is presumed dead
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class AuditLog(Base):
+    """Append-only trail of changes to audited rows, written by app/audit.py."""
+    __tablename__ = "audit_log"
+    __table_args__ = (
+        Index("ix_audit_log_entity_time", "entity", "occurred_at"),
+        Index("ix_audit_log_entity_id_time", "entity", "entity_id", "occurred_at"),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    occurred_at = Column(DateTime, nullable=False) # when the change was flushed
+    entity = Column(String(32), nullable=False) # table name
+    entity_id = Column(Integer, nullable=True)
+    action = Column(String(8), nullable=False) # insert/update/delete
+    actor = Column(String, nullable=True) # token subject; NULL for scripts and public endpoints
+    changes = Column(Text, nullable=False) # JSON {"before": {...}, "after": {...}}
@@ -0,0 +1,230 @@
+import logging
+import smtplib
+import ssl
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from functools import lru_cache
+from typing import Iterable, List, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+from app.database import session_for, tenants
+
+logger = logging.getLogger(__name__)
+
+# How long a claimed batch is leased to a worker before another worker may retry it
+CLAIM_LEASE = timedelta(minutes=5)
+# Reconnect instead of reusing an SMTP connection idle for longer than this
+SMTP_IDLE_SECONDS = 30
+
+@lru_cache
+def get_mail_config():
+    from fastapi_mail import ConnectionConfig
+    return ConnectionConfig(
+        MAIL_USERNAME=settings.EMAIL_USERNAME,
+        MAIL_PASSWORD=settings.EMAIL_PASSWORD,
+        MAIL_FROM=settings.EMAIL_FROM,
+        MAIL_PORT=settings.EMAIL_PORT,
+        MAIL_SERVER=settings.EMAIL_HOST,
+        MAIL_STARTTLS=settings.EMAIL_STARTTLS,
+        MAIL_SSL_TLS=settings.EMAIL_USE_SSL,
+        USE_CREDENTIALS=settings.EMAIL_USE_CREDENTIALS,
+        VALIDATE_CERTS=True
+    )
+
+def enqueue_email(db: Session, recipient: str, subject: str, body: str, dedupe_key: str) -> bool:
+    """Stage an email in the caller's transaction; it is sent only if that transaction commits."""
+    return enqueue_many(db, [(recipient, subject, body, dedupe_key)]) == 1
+
+def enqueue_many(db: Session, messages: Iterable[Tuple[str, str, str, str]]) -> int:
+    """Stage (recipient, subject, body, dedupe_key) tuples, skipping keys already queued."""
+    messages = {key: (recipient, subject, body) for recipient, subject, body, key in messages}
+    if not messages:
+        return 0
+    existing = {
+        key for (key,) in db.query(models.EmailOutbox.dedupe_key)
+        .filter(models.EmailOutbox.dedupe_key.in_(list(messages)))
+    }
+    new = [key for key in messages if key not in existing]
+    db.add_all(
+        models.EmailOutbox(dedupe_key=key, recipient=messages[key][0], subject=messages[key][1], body=messages[key][2])
+        for key in new
+    )
+    return len(new)
+
+class SMTPConnection:
+    """A single SMTP connection reused across messages and batches."""
+
+    def __init__(self, config=None):
+        self.config = config or get_mail_config()
+        self._smtp = None
+        self._last_used = 0.0
+
+    def _connect(self):
+        config = self.config
+        if config.MAIL_SSL_TLS:
+            smtp = smtplib.SMTP_SSL(config.MAIL_SERVER, config.MAIL_PORT, context=ssl.create_default_context(), timeout=30)
+        else:
+            smtp = smtplib.SMTP(config.MAIL_SERVER, config.MAIL_PORT, timeout=30)
+            if config.MAIL_STARTTLS:
+                smtp.starttls(context=ssl.create_default_context())
+        if config.USE_CREDENTIALS:
+            smtp.login(config.MAIL_USERNAME, config.MAIL_PASSWORD.get_secret_value())
+        return smtp
+
+    def _connection(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > SMTP_IDLE_SECONDS:
+            try:
+                if self._smtp.noop()[0] != 250:
+                    self.close()
+            except (smtplib.SMTPException, OSError):
+                self.close()
+        if self._smtp is None:
+            self._smtp = self._connect()
+        return self._smtp
+
+    def send(self, message: EmailMessage):
+        try:
+            self._connection().send_message(message)
+        except (smtplib.SMTPServerDisconnected, OSError):
+            # Connection went stale between batches; reconnect once
+            self.close()
+            self._connection().send_message(message)
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+def _build_message(row: models.EmailOutbox, sender: str) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = row.recipient
+    message["Subject"] = row.subject
+    message.set_content(row.body)
+    return message
+
+def _claim_batch(db: Session, batch_size: int) -> List[models.EmailOutbox]:
+    now = datetime.utcnow()
+    token = uuid.uuid4().hex
+    due = (
+        db.query(models.EmailOutbox.id)
+        .filter(models.EmailOutbox.status.in_(["pending", "sending"]), models.EmailOutbox.next_attempt_at <= now)
+        .order_by(models.EmailOutbox.next_attempt_at, models.EmailOutbox.id)
+        .limit(batch_size)
+        .subquery()
+    )
+    # The status/time predicates are repeated so two workers can't claim the same row
+    db.execute(
+        update(models.EmailOutbox)
+        .where(
+            models.EmailOutbox.id.in_(select(due.c.id)),
+            models.EmailOutbox.status.in_(["pending", "sending"]),
+            models.EmailOutbox.next_attempt_at <= now,
+        )
+        .values(status="sending", claim_token=token, next_attempt_at=now + CLAIM_LEASE)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return db.query(models.EmailOutbox).filter(models.EmailOutbox.claim_token == token).order_by(models.EmailOutbox.id).all()
+
+def deliver_batch(db: Session, smtp: SMTPConnection, batch_size: int | None = None) -> Tuple[int, int]:
+    """Send one batch of due messages. Returns (sent, failed_or_deferred)."""
+    rows = _claim_batch(db, batch_size or settings.OUTBOX_BATCH_SIZE)
+    if not rows:
+        return 0, 0
+
+    sender = smtp.config.MAIL_FROM
+    now = datetime.utcnow()
+    seen = set()
+    sent = failed = 0
+    # Each outcome is committed right after its send, so a later row that fails
+    # can't roll back (and re-send) the messages before it
+    for row in rows:
+        fingerprint = (row.recipient, row.subject, row.body)
+        if fingerprint in seen:
+            # Same message queued twice under different keys within a batch
+            row.status, row.sent_at, row.last_error = "sent", now, "deduplicated"
+            db.commit()
+            continue
+        try:
+            smtp.send(_build_message(row, sender))
+        except Exception as exc:
+            failed += 1
+            row.attempts += 1
+            row.last_error = str(exc)[:500] or repr(exc)[:500]
+            # Anything but an SMTP or network error (bad address, encoding) won't go away on retry
+            permanent = (
+                not isinstance(exc, (smtplib.SMTPException, OSError))
+                or isinstance(exc, smtplib.SMTPRecipientsRefused)
+                or (isinstance(exc, smtplib.SMTPResponseException) and 500 <= exc.smtp_code < 600)
+            )
+            if permanent or row.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                row.status = "failed"
+            else:
+                row.status = "pending"
+                row.next_attempt_at = now + timedelta(seconds=settings.OUTBOX_RETRY_BASE_SECONDS * 2 ** (row.attempts - 1))
+            if isinstance(exc, (smtplib.SMTPServerDisconnected, OSError)):
+                smtp.close()
+            db.commit()
+            continue
+        seen.add(fingerprint)
+        sent += 1
+        row.status, row.sent_at, row.last_error = "sent", now, None
+        row.claim_token = None
+        db.commit()
+    return sent, failed
+
+class OutboxWorker(threading.Thread):
+    """Background thread draining the outbox with one pooled SMTP connection."""
+
+    def __init__(self, poll_interval: float | None = None):
+        super().__init__(name="outbox-worker", daemon=True)
+        self.poll_interval = poll_interval if poll_interval is not None else settings.OUTBOX_POLL_INTERVAL_SECONDS
+        self._stop_event = threading.Event()
+
+    def run(self):
+        smtp = SMTPConnection()
+        try:
+            while not self._stop_event.is_set():
+                delivered = 0
+                # One pass over every school's outbox (just the default database without tenancy)
+                for tenant in tenants():
+                    db = session_for(tenant)
+                    try:
+                        sent, failed = deliver_batch(db, smtp)
+                        delivered += sent + failed
+                    except Exception:
+                        logger.exception("Outbox delivery batch failed")
+                        db.rollback()
+                    finally:
+                        db.close()
+                if delivered == 0:
+                    self._stop_event.wait(self.poll_interval)
+        finally:
+            smtp.close()
+
+    def stop(self, timeout: float = 10):
+        self._stop_event.set()
+        self.join(timeout)
+
+if __name__ == "__main__":
+    # Standalone delivery process: `python -m app.outbox`
+    logging.basicConfig(level=logging.INFO)
+    worker = OutboxWorker()
+    worker.start()
+    try:
+        while worker.is_alive():
+            worker.join(1)
+    except KeyboardInterrupt:
+        worker.stop()
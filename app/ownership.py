@@ -0,0 +1,360 @@
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Set, Tuple
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, event, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from app import metrics, models
+from app.config import settings
+from app.database import current_tenant, get_db, session_for
+from app.middleware import role_required
+
+logger = logging.getLogger(__name__)
+
+ownership_router = APIRouter()
+
+STREAM_CHUNK = 5000 # rows fetched per round trip when (re)building from the students table
+
+class OwnershipIndex:
+    """Parent user -> children and class -> roster, mirrored in memory from the students table.
+
+    Flushes record the student rows they touch; the changes are applied when
+    the session commits and dropped when it rolls back. Bulk statements on
+    students trigger a reload instead. Commits that link, unlink, move, add or
+    delete a student also log its id in ownership_changes, and every
+    OWNERSHIP_SYNC_SECONDS run() has each worker re-read the students logged
+    since its last pass (catch_up). Checks never query the database; another
+    worker's change reaches this one within that window.
+    """
+
+    def __init__(self):
+        self._students: Dict[int, Tuple[int | None, int | None]] = {} # student id -> (user_id, class_id)
+        self._children: Dict[int, Set[int]] = {}
+        self._roster: Dict[int, Set[int]] = {}
+        self._lock = threading.RLock()
+        self._replay: List[tuple] | None = None # commits that land while a reload reads the table
+        self._sync_lock = threading.Lock() # one catch-up at a time
+        self._reloads_seen: Set[int] = set() # bulk-statement change rows already reloaded for
+        self.ready = threading.Event()
+        self.loaded = False
+        self.synced_at: datetime | None = None # changes logged before this are reflected
+
+    def _put(self, student_id: int, user_id: int | None, class_id: int | None):
+        self._drop(student_id)
+        self._students[student_id] = (user_id, class_id)
+        if user_id is not None:
+            self._children.setdefault(user_id, set()).add(student_id)
+        if class_id is not None:
+            self._roster.setdefault(class_id, set()).add(student_id)
+
+    def _drop(self, student_id: int):
+        old = self._students.pop(student_id, None)
+        if old is None:
+            return
+        for mapping, key in ((self._children, old[0]), (self._roster, old[1])):
+            members = mapping.get(key)
+            if members is not None:
+                members.discard(student_id)
+                if not members:
+                    del mapping[key]
+
+    def apply(self, changes: List[tuple]):
+        """(student_id, (user_id, class_id)) upserts and (student_id, None) deletes, in commit order."""
+        with self._lock:
+            if self._replay is not None:
+                self._replay.extend(changes)
+            for student_id, values in changes:
+                if values is None:
+                    self._drop(student_id)
+                else:
+                    self._put(student_id, *values)
+
+    def load(self, db: Session):
+        with self._lock:
+            self._replay = []
+        fresh = OwnershipIndex()
+        try:
+            # Taken first: changes committed during the stream are re-read by the next catch-up
+            started = datetime.utcnow()
+            rows = db.execute(
+                select(models.Student.id, models.Student.user_id, models.Student.class_id)
+                .execution_options(yield_per=STREAM_CHUNK)
+            )
+            for student_id, user_id, class_id in rows:
+                fresh._put(student_id, user_id, class_id)
+            db.rollback() # end the read transaction
+        except Exception:
+            with self._lock:
+                self._replay = None
+            raise
+        with self._lock:
+            replay, self._replay = self._replay, None
+            self._students, self._children, self._roster = fresh._students, fresh._children, fresh._roster
+            # Replays are committed values in commit order, so re-applying ones the read already saw is harmless
+            self.apply(replay)
+            self.synced_at = started
+            self.loaded = True
+
+    def catch_up(self, db: Session):
+        """Re-read the students logged in ownership_changes since the last pass."""
+        with self._sync_lock:
+            started = datetime.utcnow()
+            # Overlaps the previous pass: a change logged just before it may have committed
+            # just after, and app servers' clocks differ a little
+            since = self.synced_at - timedelta(seconds=settings.OWNERSHIP_SYNC_OVERLAP_SECONDS)
+            if since < started - timedelta(seconds=settings.OWNERSHIP_CHANGE_RETENTION_SECONDS):
+                self.load(db) # fell behind the retained changes
+                return
+            changes = models.OwnershipChange
+            logged = db.execute(select(changes.id, changes.student_id).where(changes.changed_at >= since)).all()
+            reloads = {change_id for change_id, student_id in logged if student_id is None}
+            if reloads - self._reloads_seen:
+                # A bulk statement on students; reload once, not on every pass that overlaps it
+                self._reloads_seen = reloads
+                self.load(db)
+                return
+            self._reloads_seen = reloads
+            student_ids = {student_id for _, student_id in logged if student_id is not None}
+            rows = {}
+            if student_ids:
+                rows = {
+                    student_id: (user_id, class_id) for student_id, user_id, class_id in db.execute(
+                        select(models.Student.id, models.Student.user_id, models.Student.class_id)
+                        .where(models.Student.id.in_(student_ids))
+                    )
+                }
+            db.rollback()
+            self.apply([(student_id, rows.get(student_id)) for student_id in sorted(student_ids)])
+            self.synced_at = started
+
+    def owner_of(self, student_id: int) -> int | None:
+        return self._students.get(student_id, (None, None))[0]
+
+    def has_student(self, student_id: int) -> bool:
+        return student_id in self._students
+
+    def children_of(self, user_id: int) -> List[int]:
+        with self._lock:
+            return sorted(self._children.get(user_id, ()))
+
+    def roster(self, class_id: int) -> List[int]:
+        with self._lock:
+            return sorted(self._roster.get(class_id, ()))
+
+    def check(self, db: Session) -> dict:
+        """Compare against the students table and the index's own derived maps.
+
+        A write committed while the check runs can show up as a mismatch; run it
+        again before repairing.
+        """
+        with self._lock:
+            expected = dict(self._students)
+            children = {user_id: set(ids) for user_id, ids in self._children.items()}
+            roster = {class_id: set(ids) for class_id, ids in self._roster.items()}
+        mismatches, seen = [], set()
+        rows = db.execute(
+            select(models.Student.id, models.Student.user_id, models.Student.class_id)
+            .execution_options(yield_per=STREAM_CHUNK)
+        )
+        for student_id, user_id, class_id in rows:
+            seen.add(student_id)
+            if expected.get(student_id) != (user_id, class_id):
+                mismatches.append({"student_id": student_id, "database": [user_id, class_id], "index": expected.get(student_id)})
+        db.rollback()
+        for student_id in expected.keys() - seen:
+            mismatches.append({"student_id": student_id, "database": None, "index": expected[student_id]})
+
+        derived_children, derived_roster = {}, {}
+        for student_id, (user_id, class_id) in expected.items():
+            if user_id is not None:
+                derived_children.setdefault(user_id, set()).add(student_id)
+            if class_id is not None:
+                derived_roster.setdefault(class_id, set()).add(student_id)
+        return {
+            "students": len(expected),
+            "parents": len(children),
+            "classes": len(roster),
+            "mismatches": mismatches[:100],
+            "mismatch_count": len(mismatches),
+            "maps_consistent": children == derived_children and roster == derived_roster,
+            "consistent": not mismatches and children == derived_children and roster == derived_roster,
+        }
+
+# One index per database: None is the default database, otherwise a school id
+_indexes: Dict[str | None, OwnershipIndex] = {}
+_registry_lock = threading.Lock()
+
+def _reload(index: OwnershipIndex, tenant: str | None):
+    db = session_for(tenant)
+    try:
+        index.load(db)
+    finally:
+        db.close()
+
+def get_index(tenant: str | None = None) -> OwnershipIndex:
+    """The tenant's index, built with one streaming pass on first use."""
+    index = _indexes.get(tenant)
+    if index is None:
+        with _registry_lock:
+            index = _indexes.get(tenant)
+            created = index is None
+            if created:
+                # Registered before loading so commits during the first read are replayed
+                index = _indexes[tenant] = OwnershipIndex()
+        if created:
+            try:
+                _reload(index, tenant)
+            except Exception:
+                with _registry_lock:
+                    _indexes.pop(tenant, None)
+                raise
+            finally:
+                index.ready.set()
+    index.ready.wait()
+    if not index.loaded:
+        raise RuntimeError(f"Ownership index for {tenant or 'the default database'} failed to load")
+    return index
+
+def current_index() -> OwnershipIndex:
+    return get_index(current_tenant.get())
+
+async def loaded_index() -> OwnershipIndex:
+    """Route dependency: the current school's index, loaded in the threadpool on first use.
+
+    Routes that call owns(), children_of() or roster() declare it so a first
+    load never blocks the event loop; afterwards it is a dict lookup.
+    """
+    tenant = current_tenant.get()
+    index = _indexes.get(tenant)
+    if index is not None and index.loaded:
+        return index
+    return await run_in_threadpool(get_index, tenant)
+
+def owns(user_id: int, student_id: int) -> bool:
+    """Whether student_id is user_id's child, answered from memory.
+
+    As fresh as this worker's own commits and its last catch_up() of the others'.
+    """
+    return current_index().owner_of(student_id) == user_id
+
+def catch_up_all():
+    for tenant, index in list(_indexes.items()):
+        if not index.loaded:
+            continue
+        db = session_for(tenant)
+        try:
+            index.catch_up(db)
+        finally:
+            db.close()
+
+def refresh_all():
+    for tenant in list(_indexes):
+        _reload(_indexes[tenant], tenant)
+        _prune_changes(tenant)
+
+def _prune_changes(tenant: str | None):
+    db = session_for(tenant)
+    try:
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.OWNERSHIP_CHANGE_RETENTION_SECONDS)
+        db.execute(delete(models.OwnershipChange).where(models.OwnershipChange.changed_at < cutoff))
+        db.commit()
+    finally:
+        db.close()
+
+async def run():
+    # Other workers' changes every OWNERSHIP_SYNC_SECONDS, and a full reload every
+    # OWNERSHIP_REFRESH_SECONDS as a safety net; 0 turns either off
+    sync, refresh = settings.OWNERSHIP_SYNC_SECONDS, settings.OWNERSHIP_REFRESH_SECONDS
+    if sync <= 0 and refresh <= 0:
+        return
+    refreshed_at = time.monotonic()
+    while True:
+        await asyncio.sleep(sync if sync > 0 else refresh)
+        try:
+            if refresh > 0 and time.monotonic() - refreshed_at >= refresh:
+                await asyncio.to_thread(refresh_all)
+                refreshed_at = time.monotonic()
+            elif sync > 0:
+                await asyncio.to_thread(catch_up_all)
+        except Exception:
+            logger.exception("Ownership index sync failed")
+
+metrics.gauge_callback("ownership_index_students", lambda: {
+    (("tenant", tenant or ""),): len(index._students) for tenant, index in list(_indexes.items())
+})
+
+@event.listens_for(Session, "after_flush")
+def _record_student_changes(session, flush_context):
+    changes = [
+        (obj.id, (obj.user_id, obj.class_id)) for obj in list(session.new) + list(session.dirty)
+        if isinstance(obj, models.Student)
+    ] + [(obj.id, None) for obj in session.deleted if isinstance(obj, models.Student)]
+    if changes:
+        session.info.setdefault("ownership_changes", []).extend(changes)
+        # Other workers only need to hear about links that moved (not e.g. name edits)
+        moved = {obj.id for obj in list(session.new) + list(session.deleted) if isinstance(obj, models.Student)} | {
+            obj.id for obj in session.dirty if isinstance(obj, models.Student)
+            and (inspect(obj).attrs.user_id.history.has_changes() or inspect(obj).attrs.class_id.history.has_changes())
+        }
+        if moved:
+            session.info.setdefault("ownership_moved", set()).update(moved)
+
+@event.listens_for(Session, "do_orm_execute")
+def _note_bulk_student_writes(orm_execute_state):
+    # UPDATE/DELETE ... WHERE and bulk INSERTs bypass flush; reload after they commit
+    if orm_execute_state.is_select:
+        return
+    if any(mapper.class_ is models.Student for mapper in orm_execute_state.all_mappers):
+        orm_execute_state.session.info["ownership_reload"] = True
+        orm_execute_state.session.info.setdefault("ownership_moved", set()).add(None) # other workers reload too
+
+@event.listens_for(Session, "before_commit")
+def _log_moved_students(session):
+    # Flushed here rather than by commit() itself, so every move is known before
+    # the log is written; stamped as late as possible for the readers' overlap
+    session.flush()
+    moved = session.info.pop("ownership_moved", None)
+    if moved:
+        now = datetime.utcnow()
+        session.connection().execute(insert(models.OwnershipChange.__table__),
+                                     [{"student_id": student_id, "changed_at": now} for student_id in moved])
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed(session):
+    changes = session.info.pop("ownership_changes", None)
+    reload = session.info.pop("ownership_reload", False)
+    tenant = session.info.get("tenant")
+    index = _indexes.get(tenant)
+    if index is None or not (changes or reload):
+        return
+    if reload:
+        _reload(index, tenant)
+    else:
+        index.apply(changes)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard(session, previous_transaction):
+    if not session.in_transaction(): # the outermost transaction ended
+        session.info.pop("ownership_changes", None)
+        session.info.pop("ownership_moved", None)
+        session.info.pop("ownership_reload", None)
+
+@ownership_router.get("/ownership/check", dependencies=[Depends(role_required([models.Role.admin]))])
+async def check_ownership_index(
+    repair: bool = Query(False, description="Reload the index from the database if it is inconsistent"),
+    db: Session = Depends(get_db)
+):
+    tenant = current_tenant.get()
+    index = await run_in_threadpool(get_index, tenant)
+    report = await run_in_threadpool(index.check, db)
+    if repair and not report["consistent"]:
+        await run_in_threadpool(_reload, index, tenant)
+        report = await run_in_threadpool(index.check, db)
+        report["repaired"] = True
+    return report
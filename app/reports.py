@@ -0,0 +1,103 @@
+import csv
+import json
+from datetime import date
+
+from pydantic import ValidationError
+from sqlalchemy import case, func
+
+from app import models, schemas
+from app.jobs import JobContext, job_kind
+
+CHUNK_SIZE = 500
+
+def _parse_date(value, default=None):
+    return date.fromisoformat(value) if value else default
+
+@job_kind("attendance_report", max_concurrency=2, roles=[models.Role.admin, models.Role.teacher])
+def attendance_report(ctx: JobContext, params: dict) -> str:
+    """Per-student present/absent totals. Params: ``from``, ``to``, optional ``class_id``."""
+    date_from = _parse_date(params.get("from"), date.min)
+    date_to = _parse_date(params.get("to"), date.max)
+    students = ctx.db.query(models.Student.id, models.Student.roll_number, models.Student.first_name, models.Student.last_name, models.Student.class_id)
+    if params.get("class_id") is not None:
+        students = students.filter(models.Student.class_id == int(params["class_id"]))
+    students = students.order_by(models.Student.id).all()
+
+    path = ctx.result_path("csv")
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["student_id", "roll_number", "first_name", "last_name", "class_id", "present", "absent", "attendance_rate"])
+        for start in range(0, len(students), CHUNK_SIZE):
+            chunk = students[start:start + CHUNK_SIZE]
+            totals = dict(
+                (student_id, (present, total)) for student_id, present, total in ctx.db.query(
+                    models.Attendance.student_id,
+                    func.sum(case((models.Attendance.present.is_(True), 1), else_=0)),
+                    func.count(models.Attendance.id),
+                )
+                .filter(
+                    models.Attendance.student_id.in_([s.id for s in chunk]),
+                    models.Attendance.date >= date_from,
+                    models.Attendance.date <= date_to,
+                )
+                .group_by(models.Attendance.student_id)
+            )
+            for s in chunk:
+                present, total = totals.get(s.id, (0, 0))
+                rate = round(present / total, 4) if total else None
+                writer.writerow([s.id, s.roll_number, s.first_name, s.last_name, s.class_id, present, total - present, rate])
+            ctx.progress((start + len(chunk)) / len(students))
+    return path
+
+@job_kind("fee_dues_report", max_concurrency=2, roles=[models.Role.admin, models.Role.teacher])
+def fee_dues_report(ctx: JobContext, params: dict) -> str:
+    """Students without a paid fee for ``month``; optional ``expected_amount`` flags partial payments."""
+    month = params.get("month")
+    if not month:
+        raise ValueError("'month' is required")
+    expected = float(params["expected_amount"]) if params.get("expected_amount") is not None else None
+
+    paid = dict(
+        ctx.db.query(models.FeePayment.student_id, func.sum(models.FeePayment.amount))
+        .filter(models.FeePayment.month == month, models.FeePayment.status == "paid")
+        .group_by(models.FeePayment.student_id)
+    )
+    ctx.progress(0.5, force=True)
+    students = ctx.db.query(models.Student.id, models.Student.roll_number, models.Student.first_name, models.Student.last_name, models.Student.class_id).order_by(models.Student.id).all()
+
+    path = ctx.result_path("csv")
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["student_id", "roll_number", "first_name", "last_name", "class_id", "paid", "due"])
+        for i, s in enumerate(students, 1):
+            amount = paid.get(s.id, 0.0)
+            if expected is None and amount > 0:
+                continue
+            if expected is not None and amount >= expected:
+                continue
+            writer.writerow([s.id, s.roll_number, s.first_name, s.last_name, s.class_id, amount, None if expected is None else expected - amount])
+            if i % CHUNK_SIZE == 0:
+                ctx.progress(0.5 + 0.5 * i / len(students))
+    return path
+
+@job_kind("student_import", max_concurrency=1)
+def student_import(ctx: JobContext, params: dict) -> str:
+    """Bulk-create students from ``rows`` (StudentCreate fields plus optional ``user_id``)."""
+    rows = params.get("rows") or []
+    created, errors = 0, []
+    for start in range(0, len(rows), CHUNK_SIZE):
+        for line, row in enumerate(rows[start:start + CHUNK_SIZE], start + 1):
+            try:
+                student = schemas.StudentCreate(**row)
+            except ValidationError as exc:
+                errors.append({"row": line, "errors": exc.errors(include_url=False, include_context=False)})
+                continue
+            ctx.db.add(models.Student(**student.dict(), user_id=row.get("user_id")))
+            created += 1
+        ctx.db.commit()
+        ctx.progress((start + CHUNK_SIZE) / len(rows))
+
+    path = ctx.result_path("json")
+    with open(path, "w") as f:
+        json.dump({"created": created, "errors": errors}, f, default=str)
+    return path
@@ -1,35 +1,28 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from app import models, schemas
-from app.database import get_db
+from app.database import current_tenant, get_db
 from app.config import settings
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired
-from fastapi_mail import ConnectionConfig
 from fastapi_users.password import PasswordHelper
 from app.middleware import role_required
 from app.dependencies import get_current_user # Import get_current_user from dependencies
+from app.outbox import enqueue_email
+from app import tokens
 from typing import Optional # Import Optional
+from functools import lru_cache
 
 auth_router = APIRouter()
 
 # Removed SECRET_KEY, ALGORITHM, oauth2_scheme as they are now in app.dependencies
 
-s = URLSafeTimedSerializer(settings.SECRET_KEY)
-
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.EMAIL_USERNAME,
-    MAIL_PASSWORD=settings.EMAIL_PASSWORD,
-    MAIL_FROM=settings.EMAIL_FROM,
-    MAIL_PORT=settings.EMAIL_PORT,
-    MAIL_SERVER=settings.EMAIL_HOST,
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True
-)
+# Built on first use rather than at import time
+@lru_cache
+def get_serializer() -> URLSafeTimedSerializer:
+    return URLSafeTimedSerializer(settings.SECRET_KEY)
 
 password_helper = PasswordHelper() # Instantiate PasswordHelper
 
@@ -40,6 +33,9 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
+    if current_tenant.get() is not None:
+        # Binds the token to the school it was issued by
+        to_encode["tid"] = current_tenant.get()
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm="HS256") # Use settings.SECRET_KEY and hardcode ALGORITHM
     return encoded_jwt
 
@@ -80,8 +76,7 @@ async def register(
     )
     
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    db.flush() # Assigns new_user.id without committing
 
     # If registering a student, create the student entry
     if user.role == models.Role.student and student_data:
@@ -95,15 +90,27 @@ async def register(
             admission_date=student_data.admission_date
         )
         db.add(new_student)
-        db.commit()
-        db.refresh(new_student)
+
+    # Verification mail goes through the outbox in the same transaction as the user
+    if settings.USE_EMAIL_VERIFICATION:
+        token = get_serializer().dumps(new_user.email, salt='email-confirm')
+        enqueue_email(
+            db,
+            recipient=new_user.email,
+            subject="Verify your email",
+            body=f"Hello {new_user.name},\n\nPlease verify your email address:\n{settings.APP_BASE_URL}/verify-email/{token}\n",
+            dedupe_key=f"verify-email:{new_user.id}",
+        )
+
+    db.commit()
+    db.refresh(new_user)
 
     return new_user
 
 @auth_router.get("/verify-email/{token}")
 async def verify_email(token: str, db: Session = Depends(get_db)):
     try:
-        email = s.loads(token, salt='email-confirm', max_age=3600)
+        email = get_serializer().loads(token, salt='email-confirm', max_age=3600)
     except SignatureExpired:
         raise HTTPException(status_code=400, detail="Token expired")
     
@@ -125,11 +132,42 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    refresh_token, family_id = tokens.issue_refresh_token(db, user)
+    db.commit()
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": user.email, "fam": family_id}, expires_delta=access_token_expires
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@auth_router.post("/token/refresh", response_model=schemas.Token)
+def refresh_access_token(body: schemas.RefreshTokenRequest, db: Session = Depends(get_db)):
+    # No password check here: a sha256 + primary-key lookup instead of bcrypt
+    try:
+        user, refresh_token, family_id = tokens.rotate_refresh_token(db, body.refresh_token)
+    except tokens.InvalidRefreshToken:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": user.email, "fam": family_id}, expires_delta=access_token_expires
+    )
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@auth_router.post("/token/revoke", status_code=status.HTTP_204_NO_CONTENT)
+def revoke_refresh_token(body: schemas.RefreshTokenRequest, db: Session = Depends(get_db)):
+    try:
+        tokens.revoke_token(db, body.refresh_token)
+    except tokens.InvalidRefreshToken:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return
 
 @auth_router.get("/protected", dependencies=[Depends(role_required([models.Role.teacher]))])
 async def protected_route(current_user: models.User = Depends(get_current_user)):
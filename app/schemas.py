@@ -1,4 +1,5 @@
 from pydantic import BaseModel, EmailStr
+from typing import Any
 from datetime import datetime, date
 from app.models import Role
 
@@ -21,6 +22,29 @@ class User(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: str | None = None
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
+class BatchOperation(BaseModel):
+    id: str | None = None # echoed back so clients can match results
+    method: str
+    path: str # may carry a query string
+    body: Any = None
+
+class BatchRequest(BaseModel):
+    operations: list[BatchOperation]
+    atomic: bool = False
+
+class BatchResult(BaseModel):
+    id: str | None = None
+    status: int
+    body: Any = None
+
+class BatchResponse(BaseModel):
+    results: list[BatchResult]
+    committed: bool
 
 class TransactionBase(BaseModel):
     name: str
@@ -49,7 +73,7 @@ class StudentCreate(BaseModel):
 
 class StudentRead(StudentCreate):
     id: int
-    user_id: int
+    user_id: int | None = None # students imported in bulk may not have a login yet
 
     class Config:
         from_attributes = True
@@ -62,10 +86,28 @@ class SchoolClassCreate(BaseModel):
 
 class SchoolClassRead(SchoolClassCreate):
     id: int
+    teacher_id: int | None = None # classes seeded by create_admin.py have no teacher
+
+    class Config:
+        from_attributes = True
+
+class SubjectRead(BaseModel):
+    id: int
+    name: str
 
     class Config:
         from_attributes = True
 
+# Expanded read models; relations are only present when requested via ?include=
+class StudentExpanded(StudentRead):
+    school_class: SchoolClassRead | None = None
+    user: User | None = None
+
+class SchoolClassExpanded(SchoolClassRead):
+    students: list[StudentRead] | None = None
+    teacher: User | None = None
+    subjects: list[SubjectRead] | None = None
+
 # Attendance Schemas
 class AttendanceCreate(BaseModel):
     student_id: int
@@ -79,6 +121,31 @@ class AttendanceRead(AttendanceCreate):
     class Config:
         from_attributes = True
 
+class AttendanceMark(BaseModel):
+    student_id: int
+    present: bool
+
+class AttendanceBulkCreate(BaseModel):
+    date: date
+    marked_by: int
+    records: list[AttendanceMark]
+
+class AttendanceBulkResult(BaseModel):
+    created: int
+
+class AttendanceAlert(BaseModel):
+    student_id: int
+    first_name: str | None = None
+    last_name: str | None = None
+    class_id: int | None = None
+    streak: int
+    window_days: int
+    window_present: int
+    rate: float
+    reason: str
+    flagged_since: date | None = None
+    last_date: date | None = None
+
 # FeePayment Schemas
 class FeePaymentCreate(BaseModel):
     student_id: int
@@ -151,3 +218,148 @@ class AnnouncementRead(AnnouncementCreate):
 
     class Config:
         from_attributes = True
+
+class AnnouncementUnread(BaseModel):
+    unread: int
+    last_read_id: int | None = None
+
+class AnnouncementReadUpTo(BaseModel):
+    announcement_id: int | None = None # default: the latest announcement
+
+class AuditEntry(BaseModel):
+    id: int
+    occurred_at: datetime
+    entity: str
+    entity_id: int | None = None
+    action: str
+    actor: str | None = None
+    changes: dict
+
+# Bulk operation Schemas; every filter field that is set must match (AND)
+class StudentFilter(BaseModel):
+    ids: list[int] | None = None
+    class_id: int | None = None
+
+class StudentBulkValues(BaseModel):
+    class_id: int | None = None
+    admission_date: date | None = None
+
+class StudentBulkUpdate(BaseModel):
+    filter: StudentFilter
+    values: StudentBulkValues
+    dry_run: bool = False
+
+class StudentBulkDelete(BaseModel):
+    filter: StudentFilter
+    dry_run: bool = False
+
+class FeePaymentFilter(BaseModel):
+    ids: list[int] | None = None
+    student_ids: list[int] | None = None
+    class_id: int | None = None
+    month: str | None = None
+    status: str | None = None
+
+class FeePaymentBulkStatus(BaseModel):
+    filter: FeePaymentFilter
+    status: str
+    remarks: str | None = None
+    dry_run: bool = False
+
+class FeePaymentBulkDelete(BaseModel):
+    filter: FeePaymentFilter
+    dry_run: bool = False
+
+class BulkResult(BaseModel):
+    affected: int # rows changed, or rows that would change when dry_run
+    dry_run: bool
+
+# Bank statement ingest Schemas
+class StatementRowIssue(BaseModel):
+    line: int
+    reason: str
+
+class StatementReport(BaseModel):
+    rows: int
+    matched: int # inserted + duplicates
+    inserted: int
+    duplicates: int # already ingested by an earlier upload
+    unmatched: int
+    unmatched_rows: list[StatementRowIssue] # first few hundred only
+    duplicate_lines: list[int]
+
+# Tenancy Schemas
+class TenantSummary(BaseModel):
+    tenant: str
+    students: int | None = None
+    classes: int | None = None
+    users: int | None = None
+    fees_paid: float | None = None
+    fees_pending: float | None = None
+    error: str | None = None
+
+# Job Schemas
+class JobRead(BaseModel):
+    id: str
+    kind: str
+    status: str
+    progress: float
+    error: str | None = None
+    cancel_requested: bool
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    result_url: str | None = None
+
+    class Config:
+        from_attributes = True
+
+# Search Schemas
+class SearchResult(BaseModel):
+    entity: str
+    id: int
+    title: str
+    snippet: str
+    rank: float
+
+class SearchResults(BaseModel):
+    items: list[SearchResult]
+    limit: int
+    offset: int
+
+# Finance Schemas
+class FinanceMonth(BaseModel):
+    month: str
+    totals: dict[str, float] # by normalised transaction type
+    income: float
+    expense: float
+    net: float
+    closing_balance: float
+
+class FinanceStatement(BaseModel):
+    start: str
+    end: str
+    opening_balance: float
+    months: list[FinanceMonth]
+    totals: dict[str, float]
+    income: float
+    expense: float
+    net: float
+    closing_balance: float
+
+class BalanceSheet(BaseModel):
+    as_of: str
+    cash_balance: float
+    income_to_date: float
+    expense_to_date: float
+    totals_to_date: dict[str, float]
+    unclassified_types: list[str] # types that count in totals but not in the balance
+
+class FinanceVerifyReport(BaseModel):
+    rows_scanned: int
+    chunks: int
+    months: int
+    snapshot_mismatches: list[dict]
+    balance_mismatches: list[dict]
+    consistent: bool
+    repaired: bool = False
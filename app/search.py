@@ -0,0 +1,210 @@
+import re
+from typing import Iterable, List
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.database import get_db
+from app.dependencies import get_current_user
+
+search_router = APIRouter()
+
+# SQLite keeps documents in an FTS5 table keyed by rowid = id * 4 + code, so
+# updates and deletes are rowid lookups instead of scans over UNINDEXED columns.
+# Postgres keeps them in search_documents with a GIN-indexed tsvector.
+ENTITY_CODES = {"student": 1, "user": 2, "announcement": 3}
+SEARCHABLE = {models.Student: "student", models.User: "user", models.Announcement: "announcement"}
+INDEXED_FIELDS = {
+    "student": {"first_name", "last_name", "roll_number", "user_id"},
+    "user": {"name", "email"},
+    "announcement": {"title", "message", "audience"},
+}
+
+# Which document scopes each role may see; "staff" covers student and user records
+ROLE_SCOPES = {
+    models.Role.admin: ["staff", "all", "teachers", "parents", "students"],
+    models.Role.teacher: ["staff", "all", "teachers"],
+    models.Role.parent: ["all", "parents"],
+    models.Role.student: ["all", "students"],
+}
+
+SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+    "entity UNINDEXED, entity_id UNINDEXED, scope UNINDEXED, owner_id UNINDEXED, title, body, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+POSTGRES_DDL = (
+    "CREATE TABLE IF NOT EXISTS search_documents ("
+    "entity VARCHAR(16) NOT NULL, entity_id INTEGER NOT NULL, scope VARCHAR(16) NOT NULL, owner_id INTEGER, "
+    "title TEXT NOT NULL, body TEXT NOT NULL, "
+    "document tsvector GENERATED ALWAYS AS (setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')) STORED, "
+    "PRIMARY KEY (entity, entity_id))",
+    "CREATE INDEX IF NOT EXISTS ix_search_documents_document ON search_documents USING gin (document)",
+)
+
+def ensure_index(connection):
+    """Create the search table for the connected dialect (alembic does this in deployments)."""
+    if connection.dialect.name == "postgresql":
+        for ddl in POSTGRES_DDL:
+            connection.execute(text(ddl))
+    else:
+        connection.execute(text(SQLITE_DDL))
+
+def _document(obj) -> dict:
+    entity = SEARCHABLE[type(obj)]
+    if entity == "student":
+        return dict(entity=entity, entity_id=obj.id, scope="staff", owner_id=obj.user_id,
+                    title=f"{obj.first_name or ''} {obj.last_name or ''}".strip(), body=obj.roll_number or "")
+    if entity == "user":
+        return dict(entity=entity, entity_id=obj.id, scope="staff", owner_id=obj.id,
+                    title=obj.name or "", body=obj.email or "")
+    return dict(entity=entity, entity_id=obj.id, scope=obj.audience or "all", owner_id=None,
+                title=obj.title or "", body=obj.message or "")
+
+def index_documents(connection, docs: List[dict]):
+    if not docs:
+        return
+    if connection.dialect.name == "postgresql":
+        connection.execute(text(
+            "INSERT INTO search_documents (entity, entity_id, scope, owner_id, title, body) "
+            "VALUES (:entity, :entity_id, :scope, :owner_id, :title, :body) "
+            "ON CONFLICT (entity, entity_id) DO UPDATE SET scope = excluded.scope, "
+            "owner_id = excluded.owner_id, title = excluded.title, body = excluded.body"
+        ), docs)
+        return
+    rows = [dict(doc, rowid=doc["entity_id"] * 4 + ENTITY_CODES[doc["entity"]]) for doc in docs]
+    connection.execute(text("DELETE FROM search_index WHERE rowid = :rowid"), rows)
+    connection.execute(text(
+        "INSERT INTO search_index (rowid, entity, entity_id, scope, owner_id, title, body) "
+        "VALUES (:rowid, :entity, :entity_id, :scope, :owner_id, :title, :body)"
+    ), rows)
+
+def remove_documents(connection, entity: str, ids: Iterable[int]):
+    ids = list(ids)
+    if not ids:
+        return
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("DELETE FROM search_documents WHERE entity = :entity AND entity_id = :entity_id"),
+                           [{"entity": entity, "entity_id": i} for i in ids])
+    else:
+        connection.execute(text("DELETE FROM search_index WHERE rowid = :rowid"),
+                           [{"rowid": i * 4 + ENTITY_CODES[entity]} for i in ids])
+
+@event.listens_for(Session, "after_flush")
+def _sync_search_index(session, flush_context):
+    docs, removed = [], {}
+    for obj in list(session.new) + list(session.dirty):
+        entity = SEARCHABLE.get(type(obj))
+        if entity is None:
+            continue
+        if obj in session.dirty and not _indexed_fields_changed(obj, entity):
+            continue
+        docs.append(_document(obj))
+    for obj in session.deleted:
+        entity = SEARCHABLE.get(type(obj))
+        if entity is not None:
+            removed.setdefault(entity, []).append(obj.id)
+    if not docs and not removed:
+        return
+    connection = session.connection()
+    index_documents(connection, docs)
+    for entity, ids in removed.items():
+        remove_documents(connection, entity, ids)
+
+def _indexed_fields_changed(obj, entity: str) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in INDEXED_FIELDS[entity])
+
+def rebuild_index(db: Session, chunk_size: int = 2000) -> int:
+    """Re-index every searchable row; used after restores and bulk loads."""
+    connection = db.connection()
+    connection.execute(text("DELETE FROM search_documents" if connection.dialect.name == "postgresql" else "DELETE FROM search_index"))
+    total = 0
+    for model in SEARCHABLE:
+        for chunk in _chunks(db.query(model).yield_per(chunk_size), chunk_size):
+            index_documents(connection, [_document(obj) for obj in chunk])
+            total += len(chunk)
+    db.commit()
+    return total
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _tokens(q: str) -> List[str]:
+    return re.findall(r"\w+", q.lower())
+
+def search(db: Session, q: str, user: models.User, entities: List[str], limit: int, offset: int) -> List[dict]:
+    tokens = _tokens(q)
+    if not tokens or not entities:
+        return []
+    scopes = ROLE_SCOPES[user.role]
+    params = {"user_id": user.id, "limit": limit, "offset": offset}
+    scope_params = {f"scope{i}": scope for i, scope in enumerate(scopes)}
+    entity_params = {f"entity{i}": entity for i, entity in enumerate(entities)}
+    params.update(scope_params)
+    params.update(entity_params)
+    scope_sql = ", ".join(f":{name}" for name in scope_params)
+    entity_sql = ", ".join(f":{name}" for name in entity_params)
+
+    if db.get_bind().dialect.name == "postgresql":
+        params["q"] = " & ".join(f"{token}:*" for token in tokens)
+        sql = (
+            "SELECT entity, entity_id, title, body, ts_rank(document, query) AS rank "
+            "FROM search_documents, to_tsquery('simple', :q) AS query "
+            f"WHERE document @@ query AND (scope IN ({scope_sql}) OR owner_id = :user_id) AND entity IN ({entity_sql}) "
+            "ORDER BY rank DESC LIMIT :limit OFFSET :offset"
+        )
+    else:
+        # Every token is a prefix match; quoting keeps FTS5 operators in user input inert
+        params["q"] = " ".join(f'"{token}"*' for token in tokens)
+        sql = (
+            "SELECT entity, entity_id, title, body, bm25(search_index, 0, 0, 0, 0, 10.0, 1.0) AS rank "
+            "FROM search_index "
+            f"WHERE search_index MATCH :q AND (scope IN ({scope_sql}) OR owner_id = :user_id) AND entity IN ({entity_sql}) "
+            "ORDER BY rank LIMIT :limit OFFSET :offset"
+        )
+    rows = db.execute(text(sql), params)
+    return [
+        {"entity": entity, "id": int(entity_id), "title": title, "snippet": body[:200], "rank": float(rank)}
+        for entity, entity_id, title, body, rank in rows
+    ]
+
+@search_router.get("/search", response_model=schemas.SearchResults)
+async def search_endpoint(
+    q: str = Query(..., min_length=1, max_length=200),
+    types: str | None = Query(None, description="Comma-separated subset of student,user,announcement"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    entities = list(ENTITY_CODES)
+    if types:
+        entities = [t.strip() for t in types.split(",") if t.strip()]
+        unknown = set(entities) - set(ENTITY_CODES)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown search types: {sorted(unknown)}")
+    items = search(db, q, current_user, entities, limit, offset)
+    return {"items": items, "limit": limit, "offset": offset}
+
+if __name__ == "__main__":
+    # `python -m app.search rebuild`
+    import sys
+    from app.database import SessionLocal, get_engine
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python -m app.search rebuild")
+    get_engine()
+    session = SessionLocal()
+    try:
+        print(f"Indexed {rebuild_index(session)} documents.")
+    finally:
+        session.close()
@@ -0,0 +1,48 @@
+import json
+from typing import Iterable, List, Sequence
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+
+try:
+    import orjson
+except ImportError: # optional; falls back to the stdlib encoder
+    orjson = None
+
+def _default(value):
+    # Enums (Role) and dates for the stdlib fallback; orjson handles both natively
+    if hasattr(value, "value"):
+        return value.value
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode()
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+def parse_fields(fields: str | None, read_schema) -> List[str]:
+    """Validate ?fields=a,b against the read schema; defaults to every field."""
+    allowed = list(read_schema.model_fields)
+    if not fields:
+        return allowed
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = set(names) - set(allowed)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields {sorted(unknown)}. Must be among {allowed}")
+    return names
+
+def select_columns(model, field_names: Sequence[str]):
+    """SELECT only the requested columns; rows come back as plain tuples, not ORM objects."""
+    return select(*[getattr(model, name) for name in field_names])
+
+def rows_to_dicts(field_names: Sequence[str], rows: Iterable[tuple]) -> List[dict]:
+    return [dict(zip(field_names, row)) for row in rows]
+
+def column_rows_response(db, statement, field_names: Sequence[str]) -> FastJSONResponse:
+    # Skips identity-map hydration and pydantic validation entirely
+    return FastJSONResponse(rows_to_dicts(field_names, db.execute(statement)))
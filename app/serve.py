@@ -0,0 +1,97 @@
+import gc
+import importlib.util
+import logging
+import os
+
+from gunicorn.app.base import BaseApplication
+from uvicorn.workers import UvicornWorker
+
+from app.config import get_settings, settings
+
+logger = logging.getLogger(__name__)
+
+# Production entry point: `python -m app.serve`. gunicorn supervises uvicorn
+# workers; the app is imported once in the master and forked, so workers
+# share its memory copy-on-write. Engines, pools and background threads are
+# only created in each worker's lifespan, never in the master.
+
+def available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+def cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0)) # honours CPU pinning / container cpusets
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def worker_count() -> int:
+    # Handlers do their DB work inline, so one process per core keeps every core busy
+    return settings.SERVE_WORKERS or cores()
+
+def thread_count() -> int:
+    # Sync endpoints and run_in_threadpool calls; mostly waiting on the database
+    return settings.SERVE_THREADS or max(8, 4 * cores())
+
+class Worker(UvicornWorker):
+    # uvloop and httptools are optional C extensions; fall back to the pure-Python stack without them
+    CONFIG_KWARGS = {
+        "loop": "uvloop" if available("uvloop") else "asyncio",
+        "http": "httptools" if available("httptools") else "h11",
+        "lifespan": "on", # a failing startup kills the worker instead of serving without it
+    }
+
+class Server(BaseApplication):
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from main import app
+        # Everything imported so far lives for the life of the process; moving it
+        # out of the collector's generations stops gc passes in the workers from
+        # touching (and so copying) those pages
+        gc.collect()
+        gc.freeze()
+        return app
+
+def options(bind: str | None = None, workers: int | None = None, max_requests: int | None = None) -> dict:
+    return {
+        "bind": bind or settings.SERVE_BIND,
+        "workers": workers or worker_count(),
+        "worker_class": "app.serve.Worker",
+        "preload_app": True,
+        # Recycle workers to cap slow memory growth; jitter keeps them from restarting together
+        "max_requests": settings.SERVE_MAX_REQUESTS if max_requests is None else max_requests,
+        "max_requests_jitter": settings.SERVE_MAX_REQUESTS_JITTER,
+        # SIGTERM: stop accepting, finish in-flight requests and run the lifespan shutdown
+        "graceful_timeout": settings.SERVE_GRACEFUL_TIMEOUT_SECONDS,
+        "timeout": settings.SERVE_WORKER_TIMEOUT_SECONDS,
+        "keepalive": settings.SERVE_KEEPALIVE_SECONDS,
+        "forwarded_allow_ips": settings.SERVE_FORWARDED_ALLOW_IPS,
+        "accesslog": "-" if settings.SERVE_ACCESS_LOG else None,
+    }
+
+def run(bind: str | None = None, workers: int | None = None, max_requests: int | None = None):
+    # Derived sizes go through the environment so the workers' settings agree with the master's
+    os.environ["SERVE_THREADS"] = str(thread_count())
+    get_settings.cache_clear()
+    config = options(bind, workers, max_requests)
+    logger.info("Serving on %s with %d workers x %d threads, loop=%s, http=%s", config["bind"], config["workers"],
+                settings.SERVE_THREADS, Worker.CONFIG_KWARGS["loop"], Worker.CONFIG_KWARGS["http"])
+    Server(config).run()
+
+if __name__ == "__main__":
+    # `python -m app.serve [--bind 0.0.0.0:8000] [--workers N] [--max-requests N]`
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m app.serve")
+    parser.add_argument("--bind")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--max-requests", type=int, help="restart a worker after this many requests; 0 disables")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    run(args.bind, args.workers, args.max_requests)
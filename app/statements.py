@@ -0,0 +1,199 @@
+import codecs
+import csv
+import hashlib
+import re
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, List
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.database import dialect_insert, get_db
+from app.middleware import role_required
+
+statement_router = APIRouter()
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ROWS = 500 # per category; counts are always complete
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%m/%d/%Y")
+# Lower-cased header -> canonical column; banks disagree on naming. Aliases are
+# listed best first: a file with both "Reference" and "Description" reads the
+# reference column.
+COLUMN_ALIASES = {
+    "date": "date", "value date": "date", "transaction date": "date", "posting date": "date",
+    "amount": "amount", "credit": "amount", "deposit": "amount",
+    "reference": "reference", "description": "reference", "narration": "reference", "details": "reference",
+    "roll_number": "roll_number", "roll number": "roll_number", "roll": "roll_number",
+    "student_id": "student_id",
+    "month": "month",
+    "transaction_id": "transaction_id", "bank reference": "transaction_id", "txn id": "transaction_id",
+}
+ALIAS_RANK = {alias: rank for rank, alias in enumerate(COLUMN_ALIASES)}
+
+class StatementError(ValueError):
+    pass
+
+class StudentIndex:
+    """Roll number -> student ids, built with one query per upload."""
+
+    def __init__(self, db: Session):
+        self.ids = set()
+        self.by_roll: Dict[str, List[int]] = defaultdict(list)
+        for student_id, roll_number in db.execute(select(models.Student.id, models.Student.roll_number)):
+            self.ids.add(student_id)
+            if roll_number:
+                self.by_roll[roll_number.strip().upper()].append(student_id)
+
+    def match(self, row: dict) -> tuple:
+        """Returns (student_id, None) or (None, reason)."""
+        if row.get("student_id"):
+            try:
+                student_id = int(row["student_id"])
+            except ValueError:
+                return None, "invalid student_id"
+            return (student_id, None) if student_id in self.ids else (None, "unknown student_id")
+        if row.get("roll_number"):
+            return self._unique(self.by_roll.get(row["roll_number"].strip().upper(), []))
+        # Free-text reference: any token that is a known roll number
+        candidates = {sid for token in re.findall(r"[A-Za-z0-9-]+", row.get("reference") or "")
+                      for sid in self.by_roll.get(token.upper(), [])}
+        return self._unique(list(candidates))
+
+    @staticmethod
+    def _unique(candidates: List[int]) -> tuple:
+        if not candidates:
+            return None, "no matching student"
+        if len(candidates) > 1:
+            return None, "ambiguous student"
+        return candidates[0], None
+
+def _parse_date(value: str) -> date:
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt).date()
+        except ValueError:
+            continue
+    raise StatementError(f"unrecognised date {value!r}")
+
+def _parse_amount(value: str) -> float:
+    try:
+        return float(value.replace(",", "").strip())
+    except ValueError:
+        raise StatementError(f"invalid amount {value!r}")
+
+def _columns(header: List[str]) -> List[str | None]:
+    """Canonical column per header cell; of several cells aliasing one column, the best-ranked one is read."""
+    names = [name.strip().lower() for name in header]
+    chosen: Dict[str, int] = {}
+    for position, name in enumerate(names):
+        column = COLUMN_ALIASES.get(name)
+        if column is not None and (column not in chosen or ALIAS_RANK[name] < ALIAS_RANK[names[chosen[column]]]):
+            chosen[column] = position
+    by_position = {position: column for column, position in chosen.items()}
+    return [by_position.get(position) for position in range(len(names))]
+
+def read_statement(lines: Iterable[str]) -> Iterator[tuple]:
+    """Yield (line_number, row) with canonical column names, one CSV line at a time."""
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        raise StatementError("empty statement")
+    columns = _columns(header)
+    missing = {"date", "amount"} - set(columns)
+    if missing:
+        raise StatementError(f"missing columns {sorted(missing)}")
+    for values in reader:
+        if not any(v.strip() for v in values):
+            continue
+        yield reader.line_num, {column: value for column, value in zip(columns, values) if column}
+
+def statement_key(row: dict, occurrence: int) -> str:
+    # The bank's own id when present; otherwise the row's content plus how many
+    # identical rows preceded it, so re-uploading a file matches row for row
+    if row.get("transaction_id"):
+        basis = f"txn|{row['transaction_id'].strip()}"
+    else:
+        basis = "|".join([row.get("date", ""), row.get("amount", ""), row.get("reference", ""),
+                          row.get("roll_number", ""), row.get("student_id", ""), str(occurrence)])
+    return hashlib.sha256(basis.encode()).hexdigest()
+
+def ingest_statement(db: Session, lines: Iterable[str], status: str = "paid") -> dict:
+    index = StudentIndex(db)
+    report = {"rows": 0, "inserted": 0, "duplicates": 0, "unmatched": 0, "unmatched_rows": [], "duplicate_lines": []}
+    occurrences: Dict[str, int] = defaultdict(int)
+    pending: List[tuple] = []
+
+    def note(category: str, item):
+        if len(report[category]) < MAX_REPORTED_ROWS:
+            report[category].append(item)
+
+    def flush():
+        fresh, seen = [], set()
+        for _, payment in pending:
+            if payment["statement_key"] not in seen:
+                seen.add(payment["statement_key"])
+                fresh.append(payment)
+        # Keys already stored, by an earlier upload or one running alongside, are skipped by the insert
+        statement = (dialect_insert(db.connection(), models.FeePayment)
+                     .on_conflict_do_nothing(index_elements=["statement_key"])
+                     .returning(models.FeePayment.statement_key))
+        inserted = set(db.scalars(statement, fresh))
+        db.commit()
+        report["inserted"] += len(inserted)
+        for line, payment in pending:
+            if payment["statement_key"] in inserted:
+                inserted.discard(payment["statement_key"]) # later lines with the same key are duplicates
+            else:
+                report["duplicates"] += 1
+                note("duplicate_lines", line)
+        pending.clear()
+
+    for line, row in read_statement(lines):
+        report["rows"] += 1
+        content = tuple(sorted(row.items()))
+        occurrences[content] += 1
+        try:
+            payment_date = _parse_date(row.get("date", ""))
+            amount = _parse_amount(row.get("amount", ""))
+        except StatementError as exc:
+            report["unmatched"] += 1
+            note("unmatched_rows", {"line": line, "reason": str(exc)})
+            continue
+        student_id, reason = index.match(row)
+        if student_id is None:
+            report["unmatched"] += 1
+            note("unmatched_rows", {"line": line, "reason": reason})
+            continue
+        pending.append((line, {
+            "student_id": student_id,
+            "amount": amount,
+            "month": (row.get("month") or "").strip() or payment_date.strftime("%Y-%m"),
+            "payment_date": payment_date,
+            "status": status,
+            "remarks": (row.get("reference") or "").strip()[:255] or None,
+            "statement_key": statement_key(row, occurrences[content]),
+        }))
+        if len(pending) >= BATCH_SIZE:
+            flush()
+    if pending:
+        flush()
+    report["matched"] = report["inserted"] + report["duplicates"]
+    return report
+
+@statement_router.post("/fee_payments/statement", response_model=schemas.StatementReport, dependencies=[Depends(role_required([models.Role.admin, models.Role.teacher]))])
+async def upload_statement(
+    file: UploadFile = File(..., description="CSV with date and amount plus roll_number, student_id or reference"),
+    status: str = Query("paid"),
+    db: Session = Depends(get_db)
+):
+    # The spooled upload is decoded and parsed line by line, never read whole
+    lines = codecs.getreader("utf-8-sig")(file.file, errors="replace")
+    try:
+        return await run_in_threadpool(ingest_statement, db, lines, status)
+    except (StatementError, csv.Error) as exc:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(exc))
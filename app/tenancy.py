@@ -0,0 +1,107 @@
+import argparse
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.config import settings
+from app.database import TENANT_ID, current_tenant, list_tenants, session_for, tenant_database
+from app.middleware import role_required
+
+logger = logging.getLogger(__name__)
+
+tenancy_router = APIRouter()
+
+class TenantMismatch(Exception):
+    pass
+
+def tenant_from_host(host: str | None) -> str | None:
+    suffix = settings.TENANT_HOST_SUFFIX.lower()
+    if not host or not suffix:
+        return None
+    hostname = host.split(":", 1)[0].lower()
+    if not hostname.endswith(suffix):
+        return None
+    name = hostname[:-len(suffix)]
+    return name if TENANT_ID.fullmatch(name) else None
+
+def resolve_tenant(host: str | None, claims: dict | None) -> str | None:
+    """The token's signed tid claim wins; a school Host header must agree with it."""
+    host_tenant = tenant_from_host(host)
+    if claims is None:
+        return host_tenant
+    claim = claims.get("tid")
+    if host_tenant is not None and claim != host_tenant:
+        raise TenantMismatch()
+    return claim
+
+def fan_out(fn: Callable[[Session], object], tenant_ids: List[str] | None = None, max_workers: int = 8) -> Dict[str, dict]:
+    """Run fn(session) against every tenant database concurrently; one failure doesn't sink the rest."""
+    tenant_ids = list_tenants() if tenant_ids is None else tenant_ids
+
+    def run(tenant: str):
+        db = session_for(tenant)
+        try:
+            return {"result": fn(db), "error": None}
+        except Exception as exc:
+            logger.exception("Fan-out to tenant %s failed", tenant)
+            return {"result": None, "error": str(exc)}
+        finally:
+            db.close()
+
+    if not tenant_ids:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tenant_ids))) as pool:
+        return dict(zip(tenant_ids, pool.map(run, tenant_ids)))
+
+def school_summary(db: Session) -> dict:
+    fees = dict(db.query(models.FeePayment.status, func.coalesce(func.sum(models.FeePayment.amount), 0)).group_by(models.FeePayment.status))
+    return {
+        "students": db.query(func.count(models.Student.id)).scalar(),
+        "classes": db.query(func.count(models.SchoolClass.id)).scalar(),
+        "users": db.query(func.count(models.User.id)).scalar(),
+        "fees_paid": float(fees.get("paid", 0)),
+        "fees_pending": float(fees.get("pending", 0)),
+    }
+
+def _require_control_plane():
+    # Cross-school endpoints only exist for admins of the default database
+    if current_tenant.get() is not None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+@tenancy_router.get("/tenants/summary", response_model=List[schemas.TenantSummary], dependencies=[Depends(_require_control_plane), Depends(role_required([models.Role.admin]))])
+async def tenants_summary():
+    results = await run_in_threadpool(fan_out, school_summary)
+    return [{"tenant": tenant, **(outcome["result"] or {}), "error": outcome["error"]} for tenant, outcome in results.items()]
+
+def migrate(tenant: str, revision: str = "head"):
+    """Create or upgrade a tenant database with alembic (`-x tenant=<id>`)."""
+    from alembic import command
+    from alembic.config import Config
+    url, _ = tenant_database(tenant)
+    if url.startswith("sqlite:///"):
+        os.makedirs(os.path.dirname(os.path.abspath(url[len("sqlite:///"):])), exist_ok=True)
+    config = Config("alembic.ini")
+    config.cmd_opts = argparse.Namespace(x=[f"tenant={tenant}"])
+    command.upgrade(config, revision)
+
+if __name__ == "__main__":
+    # `python -m app.tenancy list`, `... create <id>`, `... upgrade-all`
+    import sys
+    args = sys.argv[1:]
+    if args == ["list"]:
+        print("\n".join(list_tenants()) or "No tenants.")
+    elif len(args) == 2 and args[0] == "create":
+        migrate(args[1])
+    elif args == ["upgrade-all"]:
+        for tenant_id in list_tenants():
+            print(f"Upgrading {tenant_id}")
+            migrate(tenant_id)
+    else:
+        sys.exit("usage: python -m app.tenancy list | create <id> | upgrade-all")
@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import secrets
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+
+from sqlalchemy import delete, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+from app.database import session_for, tenants
+
+logger = logging.getLogger(__name__)
+
+# Refresh tokens look like "<family_id>.<secret>". Only sha256(secret) is stored,
+# so checking one costs a hash and a primary-key lookup instead of bcrypt.
+# The hashes of the last ROTATED_HISTORY rotated-away secrets are kept too, to
+# tell a replayed token from a guessed one.
+
+ROTATED_HISTORY = 16
+
+class InvalidRefreshToken(Exception):
+    pass
+
+def _hash(secret: str) -> str:
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+def _was_rotated(row: models.RefreshToken, token_hash: str) -> bool:
+    return any(hmac.compare_digest(old, token_hash) for old in (row.rotated_hashes or "").split())
+
+def _push_rotated(row: models.RefreshToken) -> str:
+    return " ".join([row.token_hash, *(row.rotated_hashes or "").split()][:ROTATED_HISTORY])
+
+def _split(token: str) -> Tuple[str, str]:
+    family_id, _, secret = token.partition(".")
+    if not family_id or not secret:
+        raise InvalidRefreshToken()
+    return family_id, secret
+
+def issue_refresh_token(db: Session, user: models.User) -> Tuple[str, str]:
+    """Start a new session family; returns (refresh_token, family_id). Caller commits."""
+    family_id, secret = uuid.uuid4().hex, secrets.token_urlsafe(32)
+    db.add(models.RefreshToken(
+        family_id=family_id,
+        user_id=user.id,
+        token_hash=_hash(secret),
+        expires_at=datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    return f"{family_id}.{secret}", family_id
+
+def rotate_refresh_token(db: Session, token: str) -> Tuple[models.User, str, str]:
+    """Exchange a refresh token for a new one in the same family.
+
+    Presenting a secret that was already rotated away means the token leaked
+    (or was replayed), so the whole family is revoked. A secret the family
+    never issued is just rejected: the family id alone is not a credential.
+    """
+    family_id, secret = _split(token)
+    row = db.query(models.RefreshToken).filter(models.RefreshToken.family_id == family_id).first()
+    if row is None or row.revoked_at is not None or row.expires_at < datetime.utcnow():
+        raise InvalidRefreshToken()
+    presented = _hash(secret)
+    if not hmac.compare_digest(row.token_hash, presented):
+        if _was_rotated(row, presented):
+            revoke_family(db, family_id)
+            db.commit()
+            logger.warning("Refresh token reuse detected; revoked family %s", family_id)
+        raise InvalidRefreshToken()
+
+    user = db.query(models.User).filter(models.User.id == row.user_id).first()
+    if user is None or not user.is_active:
+        raise InvalidRefreshToken()
+
+    new_secret = secrets.token_urlsafe(32)
+    # Conditional on the old hash so two concurrent refreshes can't both rotate
+    result = db.execute(
+        update(models.RefreshToken)
+        .where(models.RefreshToken.family_id == family_id, models.RefreshToken.token_hash == row.token_hash)
+        .values(token_hash=_hash(new_secret), rotated_hashes=_push_rotated(row), generation=models.RefreshToken.generation + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.rollback()
+        raise InvalidRefreshToken()
+    db.commit()
+    return user, f"{family_id}.{new_secret}", family_id
+
+def revoke_family(db: Session, family_id: str):
+    db.execute(
+        update(models.RefreshToken)
+        .where(models.RefreshToken.family_id == family_id, models.RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    revocations.add(family_id)
+
+def revoke_token(db: Session, token: str):
+    # The current or a recently rotated token can end the session; the family id
+    # alone (the `fam` claim of every access token) cannot
+    family_id, secret = _split(token)
+    row = db.query(models.RefreshToken).filter(models.RefreshToken.family_id == family_id).first()
+    presented = _hash(secret)
+    if row is None or not (hmac.compare_digest(row.token_hash, presented) or _was_rotated(row, presented)):
+        raise InvalidRefreshToken()
+    revoke_family(db, family_id)
+    db.commit()
+
+class RevocationSet:
+    """Revoked session families, mirrored in memory so access-token checks never hit the DB."""
+
+    def __init__(self):
+        self._families: Dict[str, datetime] = {} # family_id -> revoked_at
+        self._lock = threading.Lock()
+        self._synced_at: datetime | None = None
+
+    def add(self, family_id: str):
+        with self._lock:
+            self._families[family_id] = datetime.utcnow()
+
+    def is_revoked(self, family_id: str | None) -> bool:
+        return family_id is not None and family_id in self._families
+
+    def sync(self, *sessions: Session):
+        """Pull recent revocations from each database (one per school under tenancy)."""
+        now = datetime.utcnow()
+        # An access token outlives its family's revocation by at most its own lifetime
+        cutoff = now - timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        since = cutoff if self._synced_at is None else max(cutoff, self._synced_at - timedelta(seconds=5))
+        revoked = {}
+        for db in sessions:
+            revoked.update(
+                db.query(models.RefreshToken.family_id, models.RefreshToken.revoked_at)
+                .filter(models.RefreshToken.revoked_at >= since)
+            )
+            # Keep the table compact: sessions a day past expiry or past any live access token
+            db.execute(delete(models.RefreshToken).where(
+                (models.RefreshToken.expires_at < now - timedelta(days=1))
+                | (models.RefreshToken.revoked_at < cutoff - timedelta(days=1))
+            ))
+            db.commit()
+        with self._lock:
+            self._families.update(revoked)
+            self._families = {family: at for family, at in self._families.items() if at >= cutoff}
+            self._synced_at = now
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self._sync_once)
+            except Exception:
+                logger.exception("Refresh token revocation sync failed")
+            await asyncio.sleep(settings.REFRESH_REVOCATION_SYNC_SECONDS)
+
+    def _sync_once(self):
+        sessions = [session_for(tenant) for tenant in tenants()]
+        try:
+            self.sync(*sessions)
+        finally:
+            for db in sessions:
+                db.close()
+
+revocations = RevocationSet()
@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
-from app import models, schemas
+from app import archive, models, schemas
 from app.database import get_db
+from app.groupcommit import save
 from app.routes import get_current_user
-from datetime import datetime, timedelta
+from app.serialization import rows_to_dicts
+from datetime import date, datetime, timedelta
 
 transaction_router = APIRouter()
 
@@ -13,15 +15,15 @@ def create_transaction(transaction: schemas.TransactionCreate, db: Session = Dep
     db_transaction = models.Transaction(**transaction.dict(), owner_id=current_user.id)
     if not db_transaction.date_created:
         db_transaction.date_created = datetime.utcnow()
-    db.add(db_transaction)
-    db.commit()
-    db.refresh(db_transaction)
-    return db_transaction
+    return save(db, db_transaction)
 
 @transaction_router.get("/transactions", response_model=List[schemas.Transaction])
-def read_transactions(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    transactions = db.query(models.Transaction).filter(models.Transaction.owner_id == current_user.id).offset(skip).limit(limit).all()
-    return transactions
+def read_transactions(skip: int = 0, limit: int = 100, date_from: date | None = None, date_to: date | None = None, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    # Archived academic years are only read when the date range reaches them
+    field_names = list(schemas.Transaction.model_fields)
+    statement = archive.ranged_select(db, models.Transaction, field_names, date_from, date_to,
+                                      lambda table: [table.c.owner_id == current_user.id])
+    return rows_to_dicts(field_names, db.execute(statement.offset(skip).limit(limit)))
 
 @transaction_router.get("/transactions/{transaction_id}", response_model=schemas.Transaction)
 def read_transaction(transaction_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
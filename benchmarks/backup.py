@@ -0,0 +1,100 @@
+"""Hot backup duration and its effect on concurrent write latency.
+
+Builds a scratch SQLite database of --rows attendance rows. --writers threads
+then commit single-row inserts (like POST /attendance/) and record their
+latency while nothing else runs, then while app.backup copies the database
+from a separate process (as the database_backup job does) with paced steps,
+then while it copies in one step (BACKUP_PAGES_PER_STEP=-1).
+
+    python benchmarks/backup.py --rows 500000 --writers 4
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BACKUP = r"""
+import json, sys
+from app import backup
+print(json.dumps(backup.backup(directory=sys.argv[1], compress=sys.argv[2] == "1")))
+"""
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--think-ms", type=float, default=5, help="pause between a writer's commits")
+    parser.add_argument("--baseline-seconds", type=float, default=3)
+    parser.add_argument("--compress", action="store_true")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{workdir}/bench.db")
+    for key, value in {"SECRET_KEY": "bench", "EMAIL_USERNAME": "bench", "EMAIL_PASSWORD": "bench",
+                       "EMAIL_FROM": "bench@example.com", "BACKEND_CORS_ORIGINS": "*"}.items():
+        env.setdefault(key, value)
+    os.environ.update(env)
+
+    from datetime import date, timedelta
+    from sqlalchemy import insert
+    from app import models
+    from app.database import Base, SessionLocal, get_engine
+
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        rows = [{"student_id": i % 3000 + 1, "date": date(2024, 1, 1) + timedelta(days=i // 3000), "present": bool(i % 7),
+                 "marked_by": 1} for i in range(args.rows)]
+        for start in range(0, len(rows), 50000):
+            connection.execute(insert(models.Attendance), rows[start:start + 50000])
+    print(f"database: {os.path.getsize(f'{workdir}/bench.db') / 1e6:.1f} MB, {args.writers} writers")
+
+    def measure(during=None):
+        latencies, stop = [], threading.Event()
+
+        def writer():
+            while not stop.is_set():
+                started = time.perf_counter()
+                db = SessionLocal()
+                try:
+                    db.add(models.Attendance(student_id=1, date=date(2030, 1, 1), present=True, marked_by=1))
+                    db.commit()
+                finally:
+                    db.close()
+                latencies.append(time.perf_counter() - started)
+                time.sleep(args.think_ms / 1000)
+
+        threads = [threading.Thread(target=writer) for _ in range(args.writers)]
+        for thread in threads:
+            thread.start()
+        result = during() if during else time.sleep(args.baseline_seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        quantiles = statistics.quantiles(latencies, n=100)
+        return result, f"{len(latencies):>6} commits  p50 {quantiles[49] * 1000:6.1f} ms  p99 {quantiles[98] * 1000:7.1f} ms  max {max(latencies) * 1000:7.1f} ms"
+
+    def run_backup(extra_env: dict):
+        out = subprocess.run([sys.executable, "-c", BACKUP, os.path.join(workdir, "backups"), "1" if args.compress else "0"],
+                             cwd=ROOT, env={**env, **extra_env}, capture_output=True, text=True, check=True)
+        return json.loads(out.stdout)
+
+    _, line = measure()
+    print(f"{'no backup':>22}: {line}")
+    for label, extra in (("paced backup", {}), ("single-step backup", {"BACKUP_PAGES_PER_STEP": "-1"})):
+        manifest, line = measure(lambda: run_backup(extra))
+        print(f"{label:>22}: {line}")
+        print(f"{'':>22}  copy {manifest['copy_seconds']:.2f}s, total {manifest['total_seconds']:.2f}s, {manifest['steps']} steps, "
+              f"{manifest['restarts']} restarts, longest step {manifest['longest_step_seconds'] * 1000:.1f} ms"
+              + f", final step {manifest['final_pages_per_step']} pages")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Single-row insert throughput under concurrent load, with and without group commit.
+
+Each of --clients threads inserts --rows attendance rows into a scratch SQLite
+database, the way concurrent POST /attendance/ requests do:
+  * direct: add, commit, refresh per row (the default write path)
+  * grouped: app.groupcommit.GroupCommitter, one transaction per window
+
+    python benchmarks/group_commit.py --clients 32 --rows 200 --window-ms 2
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--rows", type=int, default=200, help="rows per client")
+    parser.add_argument("--window-ms", type=float, default=2.0)
+    parser.add_argument("--max-batch", type=int, default=200)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+    for key, value in {"SECRET_KEY": "bench", "EMAIL_USERNAME": "bench", "EMAIL_PASSWORD": "bench",
+                       "EMAIL_FROM": "bench@example.com", "BACKEND_CORS_ORIGINS": "*"}.items():
+        os.environ.setdefault(key, value)
+
+    from sqlalchemy import func, select
+    from app import metrics, models
+    from app.database import Base, SessionLocal, get_engine
+    from app.groupcommit import GroupCommitter
+
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+
+    def attendance(client: int, i: int):
+        return models.Attendance(student_id=client + 1, date=date(2024, 1, 1), present=bool(i % 5), marked_by=1)
+
+    def direct(client: int):
+        for i in range(args.rows):
+            db = SessionLocal()
+            try:
+                obj = attendance(client, i)
+                db.add(obj)
+                db.commit()
+                db.refresh(obj)
+            finally:
+                db.close()
+
+    committer = GroupCommitter(window_ms=args.window_ms, max_batch=args.max_batch)
+    committer.start()
+
+    def grouped(client: int):
+        for i in range(args.rows):
+            assert committer.submit(attendance(client, i)).result().id is not None
+
+    total = args.clients * args.rows
+    print(f"{args.clients} clients x {args.rows} rows, window {args.window_ms} ms, max batch {args.max_batch}")
+    for label, fn in (("direct", direct), ("grouped", grouped)):
+        threads = [threading.Thread(target=fn, args=(client,)) for client in range(args.clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        print(f"{label:8} {total / elapsed:>10,.0f} inserts/s  ({elapsed:.2f}s)")
+    committer.stop()
+
+    batches = metrics.snapshot().get(("group_commit_batches_total", ()), 0)
+    if batches:
+        print(f"grouped: {total / batches:.1f} rows per transaction over {batches:.0f} transactions")
+    with engine.connect() as connection:
+        assert connection.scalar(select(func.count()).select_from(models.Attendance)) == 2 * total
+
+if __name__ == "__main__":
+    main()
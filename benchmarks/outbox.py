@@ -0,0 +1,93 @@
+"""Outbox delivery throughput against a local stand-in SMTP server.
+
+Queues N messages in a scratch SQLite database and drains them with
+``deliver_batch`` over one pooled connection.
+
+    python benchmarks/outbox.py --messages 5000 --batch-size 100
+"""
+import argparse
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    # Just enough of RFC 5321 for smtplib: accepts and discards every message
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.reply("220 sink ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 sink")
+            elif command == "DATA":
+                self.reply("354 end with <CRLF>.<CRLF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self.server.received += 1
+                self.reply("250 queued")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    received = 0
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    sink = SMTPSink(("127.0.0.1", 0), SMTPSinkHandler)
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+
+    workdir = tempfile.mkdtemp()
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{workdir}/bench.db",
+        "EMAIL_HOST": "127.0.0.1",
+        "EMAIL_PORT": str(sink.server_address[1]),
+        "EMAIL_USE_SSL": "false",
+        "EMAIL_USE_CREDENTIALS": "false",
+    })
+    for key, value in {"SECRET_KEY": "bench", "EMAIL_USERNAME": "bench", "EMAIL_PASSWORD": "bench",
+                       "EMAIL_FROM": "bench@example.com", "BACKEND_CORS_ORIGINS": "*"}.items():
+        os.environ.setdefault(key, value)
+
+    from app.database import Base, SessionLocal, get_engine
+    from app.outbox import SMTPConnection, deliver_batch, enqueue_many
+
+    Base.metadata.create_all(bind=get_engine())
+    db = SessionLocal()
+    enqueue_many(db, ((f"user{i}@example.com", "Fee reminder", f"Reminder #{i}", f"bench:{i}") for i in range(args.messages)))
+    db.commit()
+
+    smtp = SMTPConnection()
+    started = time.perf_counter()
+    total = 0
+    while True:
+        sent, failed = deliver_batch(db, smtp, batch_size=args.batch_size)
+        if sent + failed == 0:
+            break
+        total += sent
+    elapsed = time.perf_counter() - started
+    smtp.close()
+    db.close()
+
+    print(f"delivered {total} messages ({sink.received} received by sink) in {elapsed:.2f}s: {total / elapsed:,.0f} msg/s")
+
+if __name__ == "__main__":
+    main()
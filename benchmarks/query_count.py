@@ -0,0 +1,115 @@
+"""Check that ?include= expansions issue a constant number of queries.
+
+Seeds a scratch SQLite database at two sizes and counts the statements
+executed by list_classes / list_students for every include combination.
+Exits non-zero if any count grows with the number of rows.
+
+    python benchmarks/query_count.py
+
+tests/test_query_count.py runs the same counts under pytest.
+"""
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SIZES = (2, 20) # total classes after each seeding: N, then 10 x N
+STUDENTS_PER_CLASS = 5
+
+def include_cases():
+    """(endpoint, include) for every include combination of list_classes and list_students."""
+    from app.api_routes import CLASS_INCLUDES, STUDENT_INCLUDES, list_classes, list_students
+
+    return [
+        (endpoint, ",".join(c) or None)
+        for endpoint, allowed in ((list_classes, CLASS_INCLUDES), (list_students, STUDENT_INCLUDES))
+        for n in range(len(allowed) + 1)
+        for c in itertools.combinations(sorted(allowed), n)
+    ]
+
+def prepare(engine):
+    from app.database import Base
+    from app.search import ensure_index
+
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        ensure_index(connection) # students and users are indexed on flush
+
+def seed(db, classes: int, tag: str):
+    from app import models
+
+    subjects = [models.Subject(name=f"Subject {i}-{tag}") for i in range(5)]
+    for c in range(classes):
+        teacher = models.User(name=f"t{tag}-{c}", email=f"t{tag}-{c}@example.com", hashed_password="x", role=models.Role.teacher)
+        school_class = models.SchoolClass(name=str(c), section="A", teacher=teacher, subjects=subjects)
+        db.add(school_class)
+        for s in range(STUDENTS_PER_CLASS):
+            user = models.User(name=f"s{tag}-{c}-{s}", email=f"s{tag}-{c}-{s}@example.com", hashed_password="x", role=models.Role.student)
+            db.add(models.Student(first_name="A", last_name="B", date_of_birth=date(2010, 1, 1), admission_date=date(2020, 1, 1),
+                                  roll_number=str(s), school_class=school_class, user=user))
+    db.commit()
+
+def query_counts(sizes=SIZES) -> dict:
+    """{(endpoint, include): [statements executed at each size]} on the configured database."""
+    from sqlalchemy import event
+    from app.api_routes import list_students
+    from app.database import SessionLocal, get_engine
+
+    engine = get_engine()
+    statements = []
+
+    def record(*args):
+        statements.append(args[2])
+
+    def count(endpoint, include) -> int:
+        db = SessionLocal()
+        try:
+            statements.clear()
+            # Called directly, so every Query() parameter needs an explicit value
+            extra = {"fields": None} if endpoint is list_students else {}
+            asyncio.run(endpoint(include=include, db=db, **extra))
+            return len(statements)
+        finally:
+            db.close()
+
+    cases = include_cases()
+    counts = {}
+    seeded = 0
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        for size in sizes:
+            db = SessionLocal()
+            try:
+                seed(db, size - seeded, tag=str(size))
+            finally:
+                db.close()
+            seeded = size
+            for case in cases:
+                counts.setdefault(case, []).append(count(*case))
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return counts
+
+def main():
+    workdir = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+    for key, value in {"SECRET_KEY": "bench", "EMAIL_USERNAME": "bench", "EMAIL_PASSWORD": "bench",
+                       "EMAIL_FROM": "bench@example.com", "BACKEND_CORS_ORIGINS": "*"}.items():
+        os.environ.setdefault(key, value)
+
+    from app.database import get_engine
+
+    prepare(get_engine())
+    failed = False
+    for (endpoint, include), counts in query_counts().items():
+        ok = len(set(counts)) == 1
+        failed |= not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {endpoint.__name__}(include={include}): queries {counts}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Replay captured production traffic (app.capture) against a local build.
+
+Reads the traffic-*.jsonl.gz files written with TRAFFIC_CAPTURE_ENABLED and
+sends every request to --target at its original offset from the first one,
+divided by --speed (--speed 0 sends them as fast as --concurrency allows).
+Captured tokens are never replayed: each role in --credentials logs in once
+and requests run with their role's token. Authenticated requests that did not
+record a role use --default-role. POST /token is replayed with the first
+credentials; /token/refresh and /token/revoke are skipped.
+
+The report lists, per route, the replayed latency percentiles next to the
+captured ones, the statuses that differ from production, server errors and
+transport failures. --save keeps the report; --baseline compares against a
+saved one (e.g. the previous build replaying the same capture).
+
+    python benchmarks/replay.py traffic/ --target http://127.0.0.1:8000 \\
+        --credentials admin=admin@school.np:secret --credentials teacher=t@school.np:secret --speed 4
+"""
+import argparse
+import asyncio
+import glob
+import gzip
+import json
+import os
+import statistics
+import time
+from collections import Counter, defaultdict
+
+import httpx
+
+SKIPPED = ("/token/refresh", "/token/revoke")
+
+def load(paths: list, limit: int | None) -> list:
+    files = []
+    for path in paths:
+        files += sorted(glob.glob(os.path.join(path, "traffic-*.jsonl.gz"))) if os.path.isdir(path) else [path]
+    records = []
+    for path in files:
+        with gzip.open(path, "rt") as f:
+            records += [json.loads(line) for line in f if line.strip()]
+    # Lines are written as requests finish; replay them in arrival order
+    records.sort(key=lambda record: record["t"])
+    return records[:limit] if limit else records
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    if len(values) == 1:
+        return {"p50": values[0], "p95": values[0], "p99": values[0]}
+    q = statistics.quantiles(values, n=100)
+    return {"p50": round(q[49], 2), "p95": round(q[94], 2), "p99": round(q[98], 2)}
+
+async def login(http: httpx.AsyncClient, credentials: dict) -> dict:
+    tokens = {}
+    for role, (username, password) in credentials.items():
+        response = await http.post("/token", data={"username": username, "password": password})
+        response.raise_for_status()
+        tokens[role] = response.json()["access_token"]
+    return tokens
+
+def build(record: dict, tokens: dict, credentials: dict, args) -> dict | None:
+    """httpx request arguments for a record, or None if it can't be replayed."""
+    headers = {k: v for k, v in record["headers"].items() if k != "host" or args.keep_host}
+    request = {"method": record["method"], "url": record["path"], "headers": headers}
+    if record["query"]:
+        request["url"] += "?" + record["query"]
+    if record["path"] == "/token":
+        if not credentials:
+            return None
+        username, password = next(iter(credentials.values()))
+        request["data"] = {"username": username, "password": password}
+        headers.pop("content-type", None)
+        return request
+    if record["body_kind"] == "omitted":
+        return None
+    if record["body_kind"] == "json":
+        request["content"] = json.dumps(record["body"])
+    elif record["body_kind"] == "form":
+        request["content"] = record["body"]
+    role = record.get("role") or (args.default_role if record.get("authenticated") else None)
+    if role is not None:
+        if role not in tokens:
+            return None
+        headers["authorization"] = f"Bearer {tokens[role]}"
+    return request
+
+async def replay(records: list, args) -> dict:
+    credentials = {}
+    for entry in args.credentials:
+        role, _, rest = entry.partition("=")
+        username, _, password = rest.partition(":")
+        credentials[role] = (username, password)
+    results = defaultdict(lambda: {"latency": [], "captured": [], "statuses": Counter(), "mismatches": Counter(),
+                                   "server_errors": 0, "transport_errors": 0})
+    skipped, lags = Counter(), []
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.target, limits=limits, timeout=args.timeout) as http:
+        tokens = await login(http, credentials)
+        semaphore = asyncio.Semaphore(args.concurrency)
+        t0, started = records[0]["t"], time.monotonic()
+
+        async def send(record: dict):
+            if record["path"] in SKIPPED:
+                skipped["token refresh/revoke"] += 1
+                return
+            request = build(record, tokens, credentials, args)
+            if request is None:
+                skipped["no body or credentials"] += 1
+                return
+            if args.speed:
+                delay = (record["t"] - t0) / args.speed - (time.monotonic() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            result = results[f"{record['method']} {record['route'] or record['path']}"]
+            async with semaphore:
+                if args.speed:
+                    # How far behind schedule the request went out (client or target saturated)
+                    lags.append(max(time.monotonic() - started - (record["t"] - t0) / args.speed, 0) * 1000)
+                sent = time.perf_counter()
+                try:
+                    response = await http.request(**request)
+                except httpx.HTTPError:
+                    result["transport_errors"] += 1
+                    return
+                result["latency"].append((time.perf_counter() - sent) * 1000)
+            result["captured"].append(record["duration_ms"])
+            result["statuses"][str(response.status_code)] += 1
+            result["server_errors"] += response.status_code >= 500
+            if response.status_code != record["status"]:
+                result["mismatches"][f"{record['status']}->{response.status_code}"] += 1
+
+        await asyncio.gather(*(send(record) for record in records))
+        elapsed = time.monotonic() - started
+    routes = {
+        route: {
+            "count": len(r["latency"]) + r["transport_errors"],
+            "replayed_ms": percentiles(r["latency"]),
+            "captured_ms": percentiles(r["captured"]),
+            "statuses": dict(r["statuses"]),
+            "mismatches": dict(r["mismatches"]),
+            "server_errors": r["server_errors"],
+            "transport_errors": r["transport_errors"],
+        }
+        for route, r in sorted(results.items())
+    }
+    return {"requests": len(records), "elapsed_seconds": round(elapsed, 2), "speed": args.speed,
+            "skipped": dict(skipped), "schedule_lag_ms": percentiles(lags), "routes": routes}
+
+def fmt(value) -> str:
+    return f"{value:8.1f}" if value is not None else f"{'-':>8}"
+
+def print_report(report: dict, baseline: dict | None):
+    print(f"{report['requests']} captured requests replayed in {report['elapsed_seconds']}s at speed {report['speed'] or 'max'}; "
+          f"skipped {report['skipped'] or 0}; schedule lag p99 {report['schedule_lag_ms']['p99']} ms")
+    header = f"{'route':<48}{'n':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'prod p50':>9}{'prod p99':>9}"
+    print(header + ("  base p99" if baseline else "") + "  differences")
+    for route, r in report["routes"].items():
+        line = f"{route[:47]:<48}{r['count']:>6}" + "".join(
+            " " + fmt(r["replayed_ms"][key]) for key in ("p50", "p95", "p99")
+        ) + " " + fmt(r["captured_ms"]["p50"]) + " " + fmt(r["captured_ms"]["p99"])
+        if baseline:
+            base = baseline["routes"].get(route)
+            line += "  " + fmt(base["replayed_ms"]["p99"] if base else None)
+        notes = [f"status {change} x{n}" for change, n in r["mismatches"].items()]
+        if r["server_errors"]:
+            notes.append(f"{r['server_errors']} 5xx")
+        if r["transport_errors"]:
+            notes.append(f"{r['transport_errors']} failed")
+        if baseline and route in baseline["routes"]:
+            # Error diff against the previous build, not just production
+            before = baseline["routes"][route]["statuses"]
+            changed = {status: n - before.get(status, 0) for status, n in r["statuses"].items() if n != before.get(status, 0)}
+            if changed:
+                notes.append(f"vs baseline {changed}")
+        print(line + "  " + "; ".join(notes))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="+", help="capture files or directories")
+    parser.add_argument("--target", default="http://127.0.0.1:8000")
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression; 0 replays as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--credentials", action="append", default=[], metavar="ROLE=USER:PASSWORD")
+    parser.add_argument("--default-role", default="admin", help="for authenticated requests that recorded no role")
+    parser.add_argument("--keep-host", action="store_true", help="send the captured Host header (host-based tenancy)")
+    parser.add_argument("--read-only", action="store_true", help="replay GET requests only")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--save", help="write the report as JSON")
+    parser.add_argument("--baseline", help="a report saved with --save to compare against")
+    args = parser.parse_args()
+
+    records = load(args.paths, args.limit)
+    if args.read_only:
+        records = [record for record in records if record["method"] == "GET"]
+    if not records:
+        parser.error("no captured requests found")
+    report = asyncio.run(replay(records, args))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Search latency over a synthetic roster.
+
+Loads N students into a scratch SQLite database, then times prefix queries
+through ``app.search.search`` as an admin and as a parent.
+
+    python benchmarks/search.py --students 100000 --queries 500
+"""
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+    for key, value in {"SECRET_KEY": "bench", "EMAIL_USERNAME": "bench", "EMAIL_PASSWORD": "bench",
+                       "EMAIL_FROM": "bench@example.com", "BACKEND_CORS_ORIGINS": "*"}.items():
+        os.environ.setdefault(key, value)
+
+    from app import models
+    from app.database import Base, SessionLocal, get_engine
+    from app.search import ensure_index, search
+
+    rng = random.Random(7)
+    syllables = ["ra", "mesh", "an", "ita", "su", "jan", "pra", "kash", "bi", "nod", "sa", "ri", "ta", "hari", "gita"]
+    def name():
+        return "".join(rng.choice(syllables) for _ in range(rng.randint(2, 3))).capitalize()
+
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        ensure_index(connection)
+
+    db = SessionLocal()
+    started = time.perf_counter()
+    for start in range(0, args.students, 5000):
+        db.add_all(
+            models.Student(first_name=name(), last_name=name(), roll_number=f"{rng.randint(1, 60)}{rng.choice(string.ascii_uppercase)}{i}")
+            for i in range(start, min(start + 5000, args.students))
+        )
+        db.commit()
+    print(f"loaded {args.students} students (indexed via ORM events) in {time.perf_counter() - started:.1f}s")
+
+    admin = models.User(id=1, role=models.Role.admin)
+    parent = models.User(id=2, role=models.Role.parent)
+    words = [rng.choice(syllables)[:2] + rng.choice(syllables)[:1] for _ in range(args.queries)]
+    for label, user in (("admin", admin), ("parent", parent)):
+        timings = []
+        for word in words:
+            t0 = time.perf_counter()
+            search(db, word, user, ["student", "user", "announcement"], limit=20, offset=0)
+            timings.append((time.perf_counter() - t0) * 1000)
+        timings.sort()
+        print(f"{label:>7}: p50 {statistics.median(timings):.2f} ms  p95 {timings[int(len(timings) * 0.95)]:.2f} ms  max {timings[-1]:.2f} ms")
+    db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Compare list-endpoint serialisation paths in rows per second.
+
+Seeds a scratch SQLite database with attendance rows and times
+  * orm:     ORM objects -> pydantic AttendanceRead -> stdlib json
+  * columns: column tuples -> dicts -> app.serialization.dumps (orjson if installed)
+plus the gzip'd size of the full payload.
+
+    python benchmarks/serialization.py [rows]
+"""
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    workdir = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+    for key, value in {"SECRET_KEY": "bench", "EMAIL_USERNAME": "bench", "EMAIL_PASSWORD": "bench",
+                       "EMAIL_FROM": "bench@example.com", "BACKEND_CORS_ORIGINS": "*"}.items():
+        os.environ.setdefault(key, value)
+
+    from app import models, schemas
+    from app.database import Base, SessionLocal, get_engine
+    from app.serialization import dumps, orjson, parse_fields, rows_to_dicts, select_columns
+
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+    start = date(2020, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(models.Attendance.__table__.insert(), [
+            {"student_id": i % 500 + 1, "date": start + timedelta(days=i // 500), "present": bool(i % 7), "marked_by": 1}
+            for i in range(rows)
+        ])
+
+    def orm_path():
+        db = SessionLocal()
+        try:
+            records = db.query(models.Attendance).all()
+            return json.dumps([schemas.AttendanceRead.model_validate(r).model_dump(mode="json") for r in records]).encode()
+        finally:
+            db.close()
+
+    def column_path(fields=None):
+        db = SessionLocal()
+        try:
+            names = parse_fields(fields, schemas.AttendanceRead)
+            return dumps(rows_to_dicts(names, db.execute(select_columns(models.Attendance, names))))
+        finally:
+            db.close()
+
+    print(f"{rows} attendance rows, encoder: {'orjson' if orjson else 'stdlib json'}")
+    for label, fn in (("orm", orm_path), ("columns", column_path), ("columns ?fields=student_id,present", lambda: column_path("student_id,present"))):
+        fn() # warm up
+        best, body = float("inf"), b""
+        for _ in range(3):
+            started = time.perf_counter()
+            body = fn()
+            best = min(best, time.perf_counter() - started)
+        print(f"{label:34} {rows / best:>12,.0f} rows/s  {len(body) / 1024:>8.0f} KiB  gzip {len(gzip.compress(body, 5)) / 1024:>6.0f} KiB")
+
+if __name__ == "__main__":
+    main()
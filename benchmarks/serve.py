@@ -0,0 +1,103 @@
+"""Throughput and latency of `python -m app.serve` against a plain `uvicorn main:app`.
+
+Both servers run against the configured database (environment / .env) on
+their own ports. Each gets --seconds of load from --clients concurrent
+keep-alive connections spread over --processes client processes, all
+requesting --path with an admin token.
+
+    python benchmarks/serve.py --clients 64 --seconds 15 --path /classes/
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def wait_ready(base: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base}/openapi.json", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{base} did not come up")
+
+async def drive(base: str, path: str, token: str, clients: int, seconds: float) -> tuple:
+    latencies, errors = [], 0
+    deadline = time.monotonic() + seconds
+
+    async def client(http: httpx.AsyncClient):
+        nonlocal errors
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await http.get(path)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base, headers={"Authorization": f"Bearer {token}"}, limits=limits, timeout=30) as http:
+        await asyncio.gather(*(client(http) for _ in range(clients)))
+    return latencies, errors
+
+def client_process(args):
+    return asyncio.run(drive(*args))
+
+def measure(label: str, command: list, port: int, args) -> dict:
+    base = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    try:
+        wait_ready(base)
+        token = httpx.post(f"{base}/token", data={"username": args.username, "password": args.password}).json()["access_token"]
+        per_process = max(1, args.clients // args.processes)
+        with multiprocessing.Pool(args.processes) as pool:
+            client_process((base, args.path, token, per_process, 2)) # warm-up
+            results = pool.map(client_process, [(base, args.path, token, per_process, args.seconds)] * args.processes)
+    finally:
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait(timeout=60)
+    latencies = sorted(l for result in results for l in result[0])
+    errors = sum(result[1] for result in results)
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {"label": label, "rps": len(latencies) / args.seconds, "p50": quantiles[49] * 1000,
+            "p95": quantiles[94] * 1000, "p99": quantiles[98] * 1000, "errors": errors}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path", default="/classes/")
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--processes", type=int, default=2, help="client processes generating the load")
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--workers", type=int, help="app.serve workers (default: SERVE_WORKERS / core count)")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin_password")
+    args = parser.parse_args()
+
+    serve = [sys.executable, "-m", "app.serve", "--bind", "127.0.0.1:8702"]
+    if args.workers:
+        serve += ["--workers", str(args.workers)]
+    runs = [
+        ("uvicorn main:app", [sys.executable, "-m", "uvicorn", "main:app", "--port", "8701", "--no-access-log"], 8701),
+        ("app.serve", serve, 8702),
+    ]
+    print(f"GET {args.path}: {args.clients} connections over {args.processes} processes, {args.seconds:.0f}s each")
+    for label, command, port in runs:
+        r = measure(label, command, port, args)
+        print(f"{r['label']:>18}: {r['rps']:>8,.0f} req/s  p50 {r['p50']:7.1f} ms  p95 {r['p95']:7.1f} ms  "
+              f"p99 {r['p99']:7.1f} ms  errors {r['errors']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Time-to-first-request for a cold worker process.
+
+Each run starts a fresh interpreter (as a gunicorn worker would), imports
+``main``, runs the lifespan startup and serves one request in-process.
+
+    python benchmarks/startup.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = r"""
+import json, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    t2 = time.perf_counter()
+    client.get("/openapi.json")
+    t3 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "startup": t2 - t1, "first_request": t3 - t2, "total": t3 - t0}))
+"""
+
+def run_once():
+    out = subprocess.run([sys.executable, "-c", WORKER], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    samples = [run_once() for _ in range(args.runs)]
+    for key in ("import", "startup", "first_request", "total"):
+        values = [s[key] * 1000 for s in samples]
+        print(f"{key:>14}: median {statistics.median(values):8.1f} ms  min {min(values):8.1f} ms  max {max(values):8.1f} ms")
+
+if __name__ == "__main__":
+    main()
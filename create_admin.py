@@ -66,4 +66,8 @@ def create_admin_user():
                     print(f"Associated {subject_name} with Class {class_name}.")
 
 if __name__ == "__main__":
+    import sys
+    from app.database import current_tenant
+    if len(sys.argv) > 1:
+        current_tenant.set(sys.argv[1]) # `python create_admin.py <school>` seeds a tenant database
     create_admin_user()
@@ -1,38 +1,161 @@
+import asyncio
+import anyio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, status
 from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
 from app.routes import auth_router
 from app.transactions import transaction_router
 from app.api_routes import api_router # Import api_router
-from app.database import engine, Base
-from app.models import User
+from app.finance import finance_router
+from app.database import current_tenant, get_engine, get_tenant_engines, tenant_exists_async
+from app.outbox import OutboxWorker
+from app import audit, capture, groupcommit, idempotency, jobs, ownership
+from app.search import search_router
+from app.metrics import metrics_router
+from app.batch import batch_router
+from app.statements import statement_router
+from app.tenancy import TenantMismatch, resolve_tenant, tenancy_router
+from app.ownership import ownership_router
+from app.audit import audit_router
+from app.loopmonitor import LoopMonitorMiddleware, loop_monitor, loop_monitor_router
+from app.admission import AdmissionControlMiddleware
+from app.idempotency import IdempotencyMiddleware
+from app.capture import TrafficCaptureMiddleware
+from app.tokens import revocations
 from jose import JWTError, jwt
 from app.config import settings
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_ipaddr
 from slowapi.errors import RateLimitExceeded
 
-Base.metadata.create_all(bind=engine)
+PUBLIC_PATHS = ["/register", "/token", "/token/refresh", "/token/revoke", "/docs", "/openapi.json"]
 
-limiter = Limiter(key_func=get_ipaddr, default_limits=["5/minute"])
-app = FastAPI()
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema is managed by alembic (`alembic upgrade head`); startup only
+    # resolves settings and opens the engine once per worker process.
+    get_engine()
+    if settings.SERVE_THREADS:
+        # Threadpool for sync endpoints; app.serve sizes it from the core count
+        anyio.to_thread.current_default_thread_limiter().total_tokens = settings.SERVE_THREADS
+    # Parent -> children and class -> roster, streamed from the students table once
+    await asyncio.to_thread(ownership.get_index)
+    revocation_sync = asyncio.create_task(revocations.run())
+    ownership_refresh = asyncio.create_task(ownership.run())
+    idempotency_purge = asyncio.create_task(idempotency.run())
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    outbox_worker = None
+    if settings.OUTBOX_WORKER_ENABLED:
+        outbox_worker = OutboxWorker()
+        outbox_worker.start()
+    if settings.JOB_DISPATCHER_ENABLED:
+        jobs.dispatcher = jobs.JobDispatcher()
+        jobs.dispatcher.start()
+    if settings.AUDIT_ENABLED:
+        audit.writer = audit.AuditWriter()
+        audit.writer.start()
+    if settings.GROUP_COMMIT_ENABLED:
+        groupcommit.committer = groupcommit.GroupCommitter()
+        groupcommit.committer.start()
+    if settings.TRAFFIC_CAPTURE_ENABLED:
+        capture.writer = capture.CaptureWriter()
+        capture.writer.start()
+    yield
+    # Background threads are stopped in worker threads, side by side, so their
+    # drains don't block the event loop (or wait on each other) during shutdown
+    capture_writer, capture.writer = capture.writer, None
+
+    def drain_writes():
+        if groupcommit.committer is not None:
+            # New inserts commit directly from here on; queued ones are drained
+            committer, groupcommit.committer = groupcommit.committer, None
+            committer.stop()
+        if audit.writer is not None:
+            # After the committer, whose commits hand it records; later commits write theirs inline
+            writer, audit.writer = audit.writer, None
+            writer.stop()
+
+    def stop_dispatcher():
+        if jobs.dispatcher is not None:
+            jobs.dispatcher.stop()
+            jobs.dispatcher = None
+
+    stops = [drain_writes, stop_dispatcher]
+    if capture_writer is not None:
+        stops.append(capture_writer.stop)
+    if outbox_worker is not None:
+        stops.append(outbox_worker.stop)
+    await asyncio.gather(*(asyncio.to_thread(stop) for stop in stops))
+    revocation_sync.cancel()
+    ownership_refresh.cancel()
+    idempotency_purge.cancel()
+    loop_monitor.stop()
+    get_tenant_engines().dispose()
+    get_engine().dispose()
 
-@app.middleware("http")
 async def auth_middleware(request: Request, call_next):
-    if request.url.path not in ["/register", "/token", "/docs", "/openapi.json"] and not request.url.path.startswith("/verify-email"):
+    payload = None
+    if request.url.path not in PUBLIC_PATHS and not request.url.path.startswith("/verify-email"):
         try:
             token = request.headers["Authorization"].split(" ")[1]
             payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
             username: str = payload.get("sub")
 
-            if username is None:
+            if username is None or revocations.is_revoked(payload.get("fam")):
                 return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"detail": "Could not validate credentials"})
-        except (JWTError, KeyError):
+        except (JWTError, KeyError, IndexError):
             return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"detail": "Could not validate credentials"})
+    request.state.claims = payload # keys idempotent replays to the caller
+    audit.current_actor.set(payload.get("sub") if payload else None)
+    if settings.TENANCY_ENABLED:
+        try:
+            tenant = resolve_tenant(request.headers.get("host"), payload)
+        except TenantMismatch:
+            return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"detail": "Could not validate credentials"})
+        if tenant is not None:
+            if not await tenant_exists_async(tenant):
+                return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"detail": "Unknown school"})
+            current_tenant.set(tenant)
     response = await call_next(request)
     return response
 
-app.include_router(auth_router)
-app.include_router(transaction_router)
-app.include_router(api_router) # Include api_router
\ No newline at end of file
+def create_app() -> FastAPI:
+    limiter = Limiter(key_func=get_ipaddr, default_limits=["5/minute"])
+    app = FastAPI(lifespan=lifespan)
+    app.state.limiter = limiter
+    app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+    if settings.LOOP_MONITOR_ENABLED:
+        # Innermost: registers the task that actually runs the endpoint
+        app.add_middleware(LoopMonitorMiddleware)
+    if settings.IDEMPOTENCY_ENABLED:
+        # Inside GZip so stored responses don't depend on the first request's Accept-Encoding
+        app.add_middleware(IdempotencyMiddleware)
+    # Inside auth_middleware, so it sees the endpoint's complete body rather than a stream
+    app.add_middleware(GZipMiddleware, minimum_size=settings.GZIP_MINIMUM_SIZE)
+    app.middleware("http")(auth_middleware)
+    if settings.ADMISSION_CONTROL_ENABLED:
+        # Added last so it is outermost: shed requests never reach auth or routing
+        app.add_middleware(AdmissionControlMiddleware)
+    if settings.TRAFFIC_CAPTURE_ENABLED:
+        # Outside admission control, so the capture also shows what was shed
+        app.add_middleware(TrafficCaptureMiddleware)
+
+    app.include_router(auth_router)
+    app.include_router(transaction_router)
+    # Before api_router: /school_transactions/statement would otherwise match /school_transactions/{id}
+    app.include_router(finance_router)
+    app.include_router(api_router) # Include api_router
+    app.include_router(jobs.jobs_router)
+    app.include_router(search_router)
+    app.include_router(metrics_router)
+    app.include_router(batch_router)
+    app.include_router(statement_router)
+    app.include_router(tenancy_router)
+    app.include_router(loop_monitor_router)
+    app.include_router(ownership_router)
+    app.include_router(audit_router)
+    return app
+
+app = create_app()
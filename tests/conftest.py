@@ -0,0 +1,40 @@
+import pytest
+
+from app.config import get_settings
+from app.database import get_engine, get_tenant_engines
+
+TEST_ENV = {
+    "SECRET_KEY": "test",
+    "EMAIL_USERNAME": "test",
+    "EMAIL_PASSWORD": "test",
+    "EMAIL_FROM": "test@example.com",
+    "BACKEND_CORS_ORIGINS": "*",
+}
+
+def _clear_caches():
+    # Settings and engines are built on first use and cached for the process
+    get_settings.cache_clear()
+    get_tenant_engines.cache_clear()
+    get_engine.cache_clear()
+
+@pytest.fixture(scope="module")
+def database(tmp_path_factory):
+    """A scratch SQLite database with the full schema, for one test module.
+
+    The environment is restored and the cached settings and engine are dropped
+    afterwards, so nothing leaks into the other modules of the session.
+    """
+    from benchmarks.query_count import prepare
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path_factory.mktemp('db')}/test.db")
+        for key, value in TEST_ENV.items():
+            monkeypatch.setenv(key, value)
+        _clear_caches()
+        engine = get_engine()
+        prepare(engine)
+        try:
+            yield engine
+        finally:
+            engine.dispose()
+            _clear_caches()
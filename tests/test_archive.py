@@ -0,0 +1,33 @@
+from datetime import date
+
+from sqlalchemy import select
+
+from app import archive, models
+from app.database import SessionLocal
+
+FIELDS = ["id", "payment_date", "amount"]
+
+def _payment(day: date, amount: float) -> models.FeePayment:
+    return models.FeePayment(student_id=1, amount=amount, month=day.strftime("%Y-%m"), payment_date=day, status="paid")
+
+def test_pages_over_live_and_archived_rows_are_stable(database):
+    db = SessionLocal()
+    try:
+        db.add(models.SchoolInfo(school_name="Test", academic_year="2025-2026"))
+        db.add_all([_payment(date(2025, 5, day), day) for day in (1, 2)])
+        # Highest ids, so once they are archived SQLite hands the same ids to new live rows
+        db.add_all([_payment(date(2023, 6, day), 100 + day) for day in (1, 2, 3)])
+        db.commit()
+        archive.archive_year(db, "2023-2024", ["fee_payments"], pause=0, log=lambda message: None)
+        db.add_all([_payment(date(2025, 4, day), 200 + day) for day in (1, 2, 3)])
+        db.commit()
+
+        statement = archive.ranged_select(db, models.FeePayment, FIELDS, date(2023, 1, 1), date(2025, 12, 31))
+        everything = db.execute(statement).all()
+        assert len({row.id for row in everything}) < len(everything) # ids collide across tables
+        pages = [db.execute(statement.offset(skip).limit(2)).all() for skip in range(0, len(everything), 2)]
+        assert [row for page in pages for row in page] == everything
+        assert [row.payment_date for row in everything] == sorted(row.payment_date for row in everything)
+        assert len(everything) == 8 and len(db.execute(select(models.FeePayment)).all()) == 5
+    finally:
+        db.close()
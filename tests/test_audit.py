@@ -0,0 +1,35 @@
+"""Writes that bypass the unit of work still leave an audit trail."""
+from datetime import date
+
+from sqlalchemy import select
+
+from app import models
+from app.database import SessionLocal
+from app.statements import ingest_statement
+
+STATEMENT = [
+    "Date,Amount,Roll Number,Reference\n",
+    "2025-04-02,1500,AUD-1,April fees\n",
+    "2025-04-03,250.50,AUD-1,Bus\n",
+]
+
+def test_statement_ingest_is_audited(database):
+    db = SessionLocal()
+    try:
+        user = models.User(name="Audit Student", email="audit-student@example.com", hashed_password="x", role=models.Role.student)
+        student = models.Student(first_name="A", last_name="B", date_of_birth=date(2010, 1, 1), admission_date=date(2020, 1, 1),
+                                 roll_number="AUD-1", user=user)
+        db.add(student)
+        db.commit()
+
+        report = ingest_statement(db, STATEMENT)
+        assert report["inserted"] == 2
+        payments = db.scalars(select(models.FeePayment).where(models.FeePayment.student_id == student.id)).all()
+        entries = db.scalars(select(models.AuditLog).where(models.AuditLog.entity == "fee_payments", models.AuditLog.action == "insert")).all()
+        assert sorted(e.entity_id for e in entries) == sorted(p.id for p in payments)
+
+        # A re-upload inserts nothing, so it records nothing
+        assert ingest_statement(db, STATEMENT)["duplicates"] == 2
+        assert len(db.scalars(select(models.AuditLog).where(models.AuditLog.entity == "fee_payments")).all()) == 2
+    finally:
+        db.close()
@@ -0,0 +1,20 @@
+"""?include= expansions on the list endpoints issue a constant number of queries.
+
+Counts the statements list_classes / list_students execute for every include
+combination with N and then 10 x N classes; benchmarks/query_count.py seeds
+and counts, and prints the same numbers.
+"""
+import pytest
+
+from benchmarks.query_count import SIZES, include_cases, query_counts
+
+CASES = include_cases()
+
+@pytest.fixture(scope="module")
+def counts(database):
+    return query_counts()
+
+@pytest.mark.parametrize("endpoint,include", CASES, ids=[f"{e.__name__}-{i}" for e, i in CASES])
+def test_query_count_is_constant(counts, endpoint, include):
+    small, large = counts[(endpoint, include)]
+    assert small == large, f"{endpoint.__name__}(include={include}) ran {small} queries for {SIZES[0]} classes, {large} for {SIZES[1]}"
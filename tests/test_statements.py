@@ -0,0 +1,11 @@
+from app.statements import read_statement
+
+def test_reference_column_beats_description():
+    lines = ["Description,Date,Amount,Reference,Narration\n", "Fees,2025-04-02,1500,R-7 April,NEFT\n"]
+    (_, row), = read_statement(lines)
+    assert row == {"date": "2025-04-02", "amount": "1500", "reference": "R-7 April"}
+
+def test_first_of_equal_aliases_is_read():
+    lines = ["Date,Amount,Details,Details\n", "2025-04-02,1500,first,second\n"]
+    (_, row), = read_statement(lines)
+    assert row["reference"] == "first"
@@ -0,0 +1,35 @@
+import asyncio
+import json
+
+import pytest
+
+from app.api_routes import list_students
+from app.database import SessionLocal
+from benchmarks.query_count import seed
+
+def _list(**params):
+    db = SessionLocal()
+    try:
+        # Called directly, so every Query() parameter needs an explicit value
+        return asyncio.run(list_students(db=db, **{"include": None, "fields": None, **params}))
+    finally:
+        db.close()
+
+@pytest.fixture(scope="module")
+def students(database):
+    db = SessionLocal()
+    try:
+        seed(db, 1, tag="students")
+    finally:
+        db.close()
+
+def test_fields_trim_expanded_students(students):
+    rows = json.loads(_list(include="class,user", fields="id,roll_number").body)
+    assert rows
+    for row in rows:
+        assert set(row) == {"id", "roll_number", "school_class", "user"}
+        assert set(row["school_class"]) >= {"id", "name"}
+
+def test_expanded_students_without_fields_are_complete(students):
+    rows = _list(include="class")
+    assert rows and {"first_name", "school_class"} <= rows[0].model_fields_set